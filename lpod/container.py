@@ -42,6 +42,62 @@ from utils import _get_abspath  #, obsolete
 from scriptutils import printwarn
 
 
+def _save_zip(file, parts, files=None):
+    """Save a Zip ODF to the file from the parts, bytes by path (None if
+    deleted), and from the files, paths on disk by part path, copied without
+    loading them in memory. The mimetype is written first and uncompressed,
+    the manifest last.
+    """
+    if files is None:
+        files = {}
+    compression = ZIP_DEFLATED
+    try:
+        filezip = ZipFile(file, 'w', compression=compression)
+    except RuntimeError:
+        # No zlib module
+        compression = ZIP_STORED
+        filezip = ZipFile(file, 'w', compression=compression)
+    # Parts to save, except manifest at the end
+    part_names = parts.keys() + files.keys()
+    try:
+        part_names.remove(ODF_MANIFEST)
+    except ValueError:
+        printwarn("missing '%s'" % ODF_MANIFEST)
+    # "Pretty-save" parts in some order
+    # mimetype requires to be first and uncompressed
+    filezip.compression = ZIP_STORED
+    try:
+        filezip.writestr('mimetype', parts['mimetype'])
+        filezip.compression = compression
+        part_names.remove('mimetype')
+    except:
+        printwarn("missing 'mimetype'")
+    # XML parts
+    for path in ODF_CONTENT, ODF_META, ODF_SETTINGS, ODF_STYLES:
+        if path in files:
+            filezip.write(files[path], path)
+        elif path in parts:
+            filezip.writestr(path, parts[path])
+        else:
+            printwarn("missing '%s'" % path)
+            continue
+        part_names.remove(path)
+    # Everything else
+    for path in part_names:
+        if path in files:
+            filezip.write(files[path], path)
+            continue
+        data = parts[path]
+        if data is None:
+            # Deleted
+            continue
+        filezip.writestr(path, data)
+    # Manifest
+    filezip.writestr(ODF_MANIFEST, parts[ODF_MANIFEST])
+    filezip.close()
+
+
+
 class odf_container(object):
     """Representation of the ODF file.
     """
@@ -174,52 +230,6 @@ class odf_container(object):
         return zipfile.read(path)
 
 
-    def __save_zip(self, file):
-        """Save a Zip ODF from the available parts.
-        """
-        # Parts were loaded by "save"
-        parts = self.__parts
-        compression = ZIP_DEFLATED
-        try:
-            filezip = ZipFile(file, 'w', compression=compression)
-        except RuntimeError:
-            # No zlib module
-            compression = ZIP_STORED
-            filezip = ZipFile(file, 'w', compression=compression)
-        # Parts to save, except manifest at the end
-        part_names = parts.keys()
-        try:
-            part_names.remove(ODF_MANIFEST)
-        except KeyError:
-            printwarn("missing '%s'" % ODF_MANIFEST)
-        # "Pretty-save" parts in some order
-        # mimetype requires to be first and uncompressed
-        filezip.compression = ZIP_STORED
-        try:
-            filezip.writestr('mimetype', parts['mimetype'])
-            filezip.compression = compression
-            part_names.remove('mimetype')
-        except:
-            printwarn("missing 'mimetype'")
-        # XML parts
-        for path in ODF_CONTENT, ODF_META, ODF_SETTINGS, ODF_STYLES:
-            if path not in parts:
-                printwarn("missing '%s'" % path)
-                continue
-            filezip.writestr(path, parts[path])
-            part_names.remove(path)
-        # Everything else
-        for path in part_names:
-            data = parts[path]
-            if data is None:
-                # Deleted
-                continue
-            filezip.writestr(path, data)
-        # Manifest
-        filezip.writestr(ODF_MANIFEST, parts[ODF_MANIFEST])
-        filezip.close()
-
-
     def __get_folder_parts(self):
         """Get the list of members in the ODF folder.
         """
@@ -360,10 +370,28 @@ class odf_container(object):
         return part
 
 
+    def open_part(self, path):
+        """Get a file-like object to read a part of the ODF. Unlike get_part,
+        the bytes of a zipped or folder part are not loaded in memory nor
+        cached. A part already loaded or modified is read from the cache.
+        """
+        if path in self.__parts:
+            return StringIO(self.get_part(path))
+        if self.__packaging == 'zip':
+            zipfile = self.__get_zipfile()
+            return zipfile.open(path)
+        elif self.__packaging == 'folder':
+            return open(os.path.join(self.__data, path), 'rb')
+        return StringIO(self.__get_xml_part(path))
+
+
     def set_part(self, path, data):
         """Replace or add a new part.
         """
         self.__parts[path] = data
+        if self.__packaging == 'folder':
+            # Keep the new data until the file changes on disk
+            self.__parts_ts[path] = self.__get_folder_part_timestamp(path)
 
 
     def del_part(self, path):
@@ -475,7 +503,8 @@ class odf_container(object):
             dest_file = target
         # Serialize
         if packaging == 'zip':
-            self.__save_zip(dest_file)
+            # Parts were loaded above
+            _save_zip(dest_file, parts)
         elif packaging == 'flat':
             self.__save_xml(dest_file)
         else: # folder
@@ -27,6 +27,7 @@
 # Import from the Standard Library
 from datetime import datetime, timedelta
 from decimal import Decimal
+from re import compile
 
 
 DATE_FORMAT = '%Y-%m-%d'
@@ -39,6 +40,16 @@ DATETIME_FORMAT_MICRO = DATETIME_FORMAT + '.%f'
 DURATION_FORMAT = 'PT%02dH%02dM%02dS'
 
 
+# The formats written by the ODF applications, decoded without strptime
+_ISO_DATETIME = compile(r'(\d{4})-(\d\d)-(\d\d)'
+                        r'(?:T(\d\d):(\d\d):(\d\d)(?:\.(\d{1,6}))?Z?)?$')
+
+
+# Decoded dates by text, dates repeat a lot in spreadsheets
+_date_cache = {}
+_DATE_CACHE_SIZE = 4096
+
+
 
 class Boolean(object):
 
@@ -94,6 +105,39 @@ class DateTime(object):
 
 
 
+def _decode_date_value(data):
+    """Decode the value of "office:date-value", a date or a date and time,
+    like Date.decode or DateTime.decode would, but faster. Results are
+    memorized.
+    """
+    value = _date_cache.get(data)
+    if value is not None:
+        return value
+    match = _ISO_DATETIME.match(data)
+    if match is None:
+        # Let strptime decide
+        if 'T' in data:
+            value = DateTime.decode(data)
+        else:
+            value = Date.decode(data)
+    else:
+        year, month, day, hour, minute, second, micro = match.groups()
+        if hour is None:
+            value = datetime(int(year), int(month), int(day))
+        else:
+            if micro is None:
+                micro = 0
+            else:
+                micro = int(micro.ljust(6, '0'))
+            value = datetime(int(year), int(month), int(day), int(hour),
+                             int(minute), int(second), micro)
+    if len(_date_cache) >= _DATE_CACHE_SIZE:
+        _date_cache.clear()
+    _date_cache[data] = value
+    return value
+
+
+
 class Duration(object):
     """ISO 8601 format.
     """
@@ -30,6 +30,7 @@
 # Import from the Standard Library
 import sys
 import os
+from collections import OrderedDict
 from copy import deepcopy
 from mimetypes import guess_type
 from operator import itemgetter
@@ -41,7 +42,7 @@ from const import ODF_CONTENT, ODF_META, ODF_SETTINGS, ODF_STYLES
 from const import ODF_MANIFEST
 from container import odf_get_container, odf_new_container, odf_container
 from content import odf_content
-from manifest import odf_manifest
+from manifest import odf_manifest, odf_create_file_entry
 from meta import odf_meta
 from style import odf_style, odf_master_page, odf_font_style, odf_page_layout
 from style import registered_styles
@@ -121,6 +122,8 @@ class odf_document(object):
         self.__xmlparts = {}
         # Cache of the body
         self.__body = None
+        # Index of the named ranges of the body, kept with the document
+        self.__named_range_registry = None
 
 
     #
@@ -210,10 +213,84 @@ class odf_document(object):
         """
         if self.__body is None:
             content = self.get_part(ODF_CONTENT)
-            self.__body = content.get_body()
+            self.__body = body = content.get_body()
+            self.__named_range_registry = body._get_named_range_registry()
         return self.__body
 
 
+    def iter_table_values(self, name_or_index, coord=None, get_type=False,
+                          expand=True):
+        """Iterate through the rows of Python values of a table, given by its
+        name or its position. Unless the content was already loaded, it is
+        parsed incrementally and each row is released once read: the content
+        tree is never built, and big spreadsheets are read in constant memory.
+
+        If expand is False, repetitions are reported instead of expanded: each
+        item is a tuple (list of (value, repeated), repeated).
+
+        Arguments:
+
+            name_or_index -- unicode or int
+
+            coord -- str or tuple of int : coordinates of area (no negative
+                     value)
+
+            get_type -- boolean
+
+            expand -- boolean
+
+        Return: iterator of lists, or of (list of tuples, int)
+        """
+        # FIXME cyclic import
+        from streaming import iter_table_values, _iter_table_runs
+
+        if ODF_CONTENT not in self.__xmlparts:
+            source = self.container.open_part(ODF_CONTENT)
+            try:
+                for values in iter_table_values(source, name_or_index,
+                        coord=coord, get_type=get_type, expand=expand):
+                    yield values
+            finally:
+                source.close()
+            return
+        # The content is loaded, and maybe modified
+        body = self.get_body()
+        if isinstance(name_or_index, (int, long)):
+            table = body.get_table(position=name_or_index)
+        else:
+            table = body.get_table(name=name_or_index)
+        if table is None:
+            raise ValueError, 'table "%s" not found' % name_or_index
+        if expand:
+            for values in table.iter_values(coord=coord, get_type=get_type):
+                yield values
+        else:
+            for values in _iter_table_runs(table, coord=coord,
+                    get_type=get_type):
+                yield values
+
+
+    def read_sheets(self, header=True, index_col=None):
+        """Return the tables of the document as pandas DataFrames, in an
+        ordered dict by table name. pandas must be installed.
+
+        See ``odf_table.to_dataframe``.
+
+        Arguments:
+
+            header -- boolean, True if the first rows hold the column names
+
+            index_col -- int or unicode, the column to use as index
+
+        Return: OrderedDict of pandas.DataFrame
+        """
+        sheets = OrderedDict()
+        for table in self.get_body().get_tables():
+            sheets[table.get_name()] = table.to_dataframe(header=header,
+                    index_col=index_col)
+        return sheets
+
+
     def get_formatted_text(self, rst_mode=False):
         # For the moment, only "type='text'"
         type = self.get_type()
@@ -348,50 +425,65 @@ class odf_document(object):
 
         Return: str
         """
-        name = None
-        close_after = False
-        # Folder for added files (FIXME hard-coded and copied)
-        manifest = self.get_part(ODF_MANIFEST)
-        medias = manifest.get_paths()
+        return self.add_files([path_or_file])[0]
 
-        if type(path_or_file) is unicode or type(path_or_file) is str:
-            path_or_file = path_or_file.encode('utf_8')
-            handler = open(path_or_file, 'rb')
-            name = path_or_file
-            close_after = True
-        else:
-            handler = path_or_file
-            name = getattr(_file, 'name')
-        name = os.path.basename(name)
-        # Generate a safe portable name
-        uuid = str(uuid4())
-        if name is None:
-            name = uuid
-            media_type = ''
-        else:
-            root, extension = os.path.splitext(name)
-            extension = extension.lower()
-            name = root + extension
-            media_type, encoding = guess_type(name)
-            # Check this name is already used in the document
-            fullpath = 'Pictures/%s' % name
-            if fullpath in medias:
-                root = '%s_%s' % (root, uuid)
-                name = root + extension
-                media_type, encoding = guess_type(name)
 
-        if manifest.get_media_type('Pictures/') is None:
-            manifest.add_full_path('Pictures/')
+    def add_files(self, paths_or_files):
+        """Insert files from paths or file-like objects in the container, the
+        manifest being read and updated once for all of them. Return the full
+        paths to reference them in the content, in the same order.
 
-        full_path = os.path.join('Pictures', name)
-        self.container.set_part(full_path, handler.read())
+        Arguments:
+
+            paths_or_files -- list of str or file-like
 
+        Return: list of str
+        """
+        # Folder for added files (FIXME hard-coded and copied)
+        manifest = self.get_part(ODF_MANIFEST)
+        medias = set(manifest.get_paths())
+        entries = []
+        if 'Pictures/' not in medias:
+            entries.append(odf_create_file_entry('Pictures/', ''))
+        result = []
+        for path_or_file in paths_or_files:
+            close_after = False
+            if type(path_or_file) is unicode or type(path_or_file) is str:
+                path_or_file = path_or_file.encode('utf_8')
+                handler = open(path_or_file, 'rb')
+                name = path_or_file
+                close_after = True
+            else:
+                handler = path_or_file
+                name = getattr(handler, 'name', None)
+            # Generate a safe portable name
+            uuid = str(uuid4())
+            if name is None:
+                name = uuid
+                media_type = ''
+            else:
+                name = os.path.basename(name)
+                root, extension = os.path.splitext(name)
+                extension = extension.lower()
+                name = root + extension
+                media_type, encoding = guess_type(name)
+                # Check this name is already used in the document
+                fullpath = 'Pictures/%s' % name
+                if fullpath in medias:
+                    root = '%s_%s' % (root, uuid)
+                    name = root + extension
+                    media_type, encoding = guess_type(name)
+            full_path = os.path.join('Pictures', name)
+            self.container.set_part(full_path, handler.read())
+            # Close file
+            if close_after:
+                handler.close()
+            medias.add(full_path)
+            entries.append(odf_create_file_entry(full_path, media_type))
+            result.append(full_path)
         # Update manifest
-        manifest.add_full_path(full_path, media_type)
-        # Close file
-        if close_after:
-            handler.close()
-        return full_path
+        manifest.get_root().extend(entries)
+        return result
 
 
     def clone(self):
@@ -408,10 +500,16 @@ class odf_document(object):
                 for key, value in self.__xmlparts.iteritems():
                     xmlparts[key] = value.clone()
                 setattr(clone, name, xmlparts)
+            elif name == '_odf_document__named_range_registry':
+                # Made again for the body of the clone
+                setattr(clone, name, None)
             else:
                 value = getattr(self, name)
                 value = deepcopy(value)
                 setattr(clone, name, value)
+        body = clone.__body
+        if body is not None:
+            clone.__named_range_registry = body._get_named_range_registry()
         return clone
 
 
@@ -28,8 +28,10 @@
 
 # Import from the Standard Library
 import sys
+from collections import OrderedDict
 from copy import deepcopy
 import re
+from weakref import WeakValueDictionary
 
 # Import from lxml
 from lxml.etree import fromstring, tostring, Element, _Element
@@ -240,6 +242,155 @@ def _debug_element(native_element):
 
 
 
+_xpath_document_body = _find_query_in_cache('/*/office:body/*[1]')
+# Where the schema allows the named expressions: in the body and the tables
+_xpath_named_expressions = _find_query_in_cache(
+        'table:named-expressions | table:table/table:named-expressions')
+_named_range_tag = '{%s}named-range' % ODF_NAMESPACES['table']
+_table_tag = '{%s}table' % ODF_NAMESPACES['table']
+_table_name = '{%s}name' % ODF_NAMESPACES['table']
+_cell_range_address = '{%s}cell-range-address' % ODF_NAMESPACES['table']
+
+# The named range registries of the spreadsheet bodies, by id of the native
+# body. A registry lives as long as its document, or an element, keeps a
+# reference to it.
+_named_range_registries = WeakValueDictionary()
+
+
+
+class _named_range_registry(object):
+    """Index of the named ranges of a spreadsheet body by their name, and of
+    the tables they refer to. The named ranges are parsed and the tables
+    resolved once. Changes made through the named range API are recorded,
+    other changes to the named expressions of the body and of its tables are
+    detected at lookup time.
+    """
+
+    def __init__(self, body):
+        # Keep the native body alive so its id is not reused
+        self.body = body
+        # name -> (odf_named_range, cell range address)
+        self.ranges = None
+        # The named expressions elements and their size when indexed
+        self.parents = []
+        self.size = 0
+        # table name -> native table
+        self.tables = None
+
+
+    def __get_size(self):
+        return sum(len(parent) for parent in self.parents)
+
+
+    def __index(self, parents):
+        ranges = OrderedDict()
+        for parent in parents:
+            for element in parent.iterchildren(_named_range_tag):
+                named_range = _make_odf_element(element)
+                if named_range.name not in ranges:
+                    ranges[named_range.name] = (named_range,
+                            element.get(_cell_range_address))
+        self.ranges = ranges
+        self.parents = parents
+        self.size = self.__get_size()
+
+
+    def update(self):
+        """Index the named ranges again if some were added or removed
+        behind the back of the registry. The named expressions elements are
+        looked up each time, in the body and its tables only.
+        """
+        if self.ranges is None:
+            return
+        parents = _xpath_named_expressions(self.body)
+        if parents != self.parents or self.__get_size() != self.size:
+            self.__index(parents)
+
+
+    def __get_entry(self, name):
+        entry = self.ranges.get(name)
+        if entry is None:
+            return None
+        named_range, address = entry
+        element = named_range._get_native()
+        if element.getparent() is None or element.get(_table_name) != name:
+            return False
+        current = element.get(_cell_range_address)
+        if current != address:
+            # Moved through another element, parse it again
+            named_range = _make_odf_element(element)
+            self.ranges[name] = (named_range, current)
+        return named_range
+
+
+    def get_named_range(self, name):
+        if self.ranges is not None:
+            self.update()
+            named_range = self.__get_entry(name)
+            if named_range:
+                return named_range
+        # Not indexed yet, or renamed or replaced without the API
+        self.__index(_xpath_named_expressions(self.body))
+        return self.__get_entry(name)
+
+
+    def get_named_ranges(self):
+        if self.ranges is None:
+            self.__index(_xpath_named_expressions(self.body))
+        else:
+            self.update()
+        result = []
+        for name in self.ranges.keys():
+            named_range = self.__get_entry(name)
+            if named_range is False:
+                self.__index(_xpath_named_expressions(self.body))
+                return [named_range for named_range, address
+                        in self.ranges.itervalues()]
+            result.append(named_range)
+        return result
+
+
+    def add(self, named_range):
+        """Record the named range, just appended to the body.
+        """
+        if self.ranges is None:
+            return
+        element = named_range._get_native()
+        self.ranges.pop(named_range.name, None)
+        self.ranges[named_range.name] = (named_range,
+                                         element.get(_cell_range_address))
+        self.parents = _xpath_named_expressions(self.body)
+        self.size = self.__get_size()
+
+
+    def remove(self, name):
+        """Forget the named range, just deleted from the body.
+        """
+        if self.ranges is None:
+            return
+        self.ranges.pop(name, None)
+        self.parents = _xpath_named_expressions(self.body)
+        self.size = self.__get_size()
+
+
+    def get_table(self, name):
+        """Return the table of the given name, looked up in the tables of the
+        body indexed once, or None if not found.
+        """
+        tables = self.tables
+        element = tables.get(name) if tables is not None else None
+        if (element is None or element.getparent() is not self.body
+                or element.get(_table_name) != name):
+            tables = self.tables = {}
+            for table in self.body.iterchildren(_table_tag):
+                tables.setdefault(table.get(_table_name), table)
+            element = tables.get(name)
+        if element is None:
+            return _make_odf_element(self.body).get_table(name=name)
+        return _make_odf_element(element)
+
+
+
 class odf_text(unicode):
     """Representation of an XML text node. Created to hide the specifics of
     lxml in searching text nodes using XPath.
@@ -588,6 +739,17 @@ class odf_element(object):
             return _make_odf_element(result[0])
         return None
 
+    def _get_elements_range2(self, xpath_instance, start, end):
+        element = self.__element
+        result = xpath_instance(element, start=start+1, end=end+1)
+        return [_make_odf_element(e) for e in result]
+
+    def _get_native(self):
+        """Return the lxml element, for building many sub elements at
+        once without a wrapper for each.
+        """
+        return self.__element
+
     def get_attributes(self):
         attributes = {}
         element = self.__element
@@ -597,6 +759,14 @@ class odf_element(object):
         return attributes
 
 
+    def _get_attribute_values(self, names):
+        """Return the raw values of the attributes, given with their URI as
+        "{uri}name", in a single pass. Missing attributes are None.
+        """
+        get = self.__element.get
+        return [get(name) for name in names]
+
+
     def get_attribute(self, name):
         element = self.__element
         uri, name = _decode_qname(name)
@@ -1359,7 +1529,10 @@ class odf_element(object):
     def get_document_body(self):
         """Return the document body : 'office:body'
         """
-        return self.get_element('//office:body/*[1]')
+        result = _xpath_document_body(self.__element)
+        if not result:
+            return None
+        return _make_odf_element(result[0])
 
 
     def replace_document_body(self, new_body):
@@ -1798,14 +1971,27 @@ class odf_element(object):
     # Named Range
     #
 
+    def _get_named_range_registry(self):
+        """Return the registry of the named ranges of this body, shared by
+        all the elements of the body, and kept alive by the document and by
+        this element.
+        """
+        body = self.__element
+        registry = _named_range_registries.get(id(body))
+        # The id of a dead body may be reused by another one
+        if registry is None or registry.body is not body:
+            registry = _named_range_registry(body)
+            _named_range_registries[id(body)] = registry
+        self.__named_range_registry = registry
+        return registry
+
+
     def get_named_ranges(self):
         """Return all the tables named ranges.
 
         Return: list of odf_named_range
         """
-        named_ranges = self.get_elements(
-                        'descendant::table:named-expressions/table:named-range')
-        return named_ranges
+        return self._get_named_range_registry().get_named_ranges()
 
 
     def get_named_range(self, name):
@@ -1817,12 +2003,7 @@ class odf_element(object):
 
         Return: odf_named_range
         """
-        named_range = self.get_elements(
-        'descendant::table:named-expressions/table:named-range[@table:name="%s"][1]' % name)
-        if named_range:
-            return named_range[0]
-        else:
-            return None
+        return self._get_named_range_registry().get_named_range(name)
 
 
     def append_named_range(self, named_range):
@@ -1836,6 +2017,8 @@ class odf_element(object):
         if self.get_tag() != 'office:spreadsheet':
             raise ValueError("Element is no 'office:spreadsheet' : %s" %
                              self.get_tag())
+        registry = self._get_named_range_registry()
+        registry.update()
         named_expressions = self.get_element('table:named-expressions')
         if not named_expressions:
             named_expressions = odf_create_element('table:named-expressions')
@@ -1846,6 +2029,7 @@ class odf_element(object):
         if current:
             named_expressions.delete(current)
         named_expressions.append(named_range)
+        registry.add(named_range)
 
 
     def delete_named_range(self, name):
@@ -1858,15 +2042,17 @@ class odf_element(object):
         if self.get_tag() != 'office:spreadsheet':
             raise ValueError("Element is no 'office:spreadsheet' : %s" %
                              self.get_tag())
-        named_range = self.get_named_range(name)
+        registry = self._get_named_range_registry()
+        named_range = registry.get_named_range(name)
         if not named_range:
             return
+        named_expressions = named_range.get_parent()
         named_range.delete()
-        named_expressions = self.get_element('table:named-expressions')
         element = named_expressions.__element
         children = len(element.getchildren())
         if not children:
-            self.delete(named_expressions)
+            named_expressions.delete()
+        registry.remove(name)
 
     #
     # Notes
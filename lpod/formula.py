@@ -0,0 +1,958 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2009-2013 Ars Aperta, Itaapy, Pierlis, Talend.
+#
+# This file is part of Lpod (see: http://lpod-project.net).
+# Lpod is free software; you can redistribute it and/or modify it under
+# the terms of either:
+#
+# a) the GNU General Public License as published by the Free Software
+#    Foundation, either version 3 of the License, or (at your option)
+#    any later version.
+#    Lpod is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#    You should have received a copy of the GNU General Public License
+#    along with Lpod.  If not, see <http://www.gnu.org/licenses/>.
+#
+# b) the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+
+# Import from the Standard Library
+import re
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from heapq import heapify, heappop, heappush
+
+# Import from lpod
+from table import _alpha_to_digit, _convert_coordinates
+
+
+# Cell attributes of the previous result, removed before writing a new one
+_value_attributes = ('office:value-type', 'office:boolean-value',
+        'office:value', 'office:date-value', 'office:string-value',
+        'office:time-value', 'office:currency')
+
+# "Day 0" of the spreadsheet applications
+_epoch = datetime(1899, 12, 30)
+
+# Error displayed by the spreadsheet applications for circular references
+_circular_error = u"Err:522"
+
+_token_re = re.compile(ur'''
+      (?P<space>\s+)
+    | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    | (?P<string>"(?:[^"]|"")*")
+    | (?P<reference>\[(?:[^\]']|'(?:[^']|'')*')*\])
+    | (?P<name>[^\W\d][\w.]*)
+    | (?P<operator><>|<=|>=|[-+*/^&=<>%();])
+    ''', re.VERBOSE | re.UNICODE)
+
+_address_re = re.compile(ur'''^\$?(?:'(?P<quoted>(?:[^']|'')*)'|
+                                    (?P<sheet>[^.']*))
+                               \.\$?(?P<column>[A-Za-z]+)\$?(?P<row>\d+)$''',
+                         re.VERBOSE | re.UNICODE)
+
+
+
+class FormulaError(Exception):
+    """Error while evaluating a formula. The code is the value displayed in
+    the cell, e.g. "#DIV/0!".
+    """
+
+    def __init__(self, code):
+        Exception.__init__(self, code)
+        self.code = code
+
+
+
+class _Area(list):
+    """Values of a cell range, as a list of rows.
+    """
+
+    def iter_values(self):
+        for row in self:
+            for value in row:
+                yield value
+
+
+
+#
+# Parser
+#
+
+def _tokenize(expression):
+    tokens = []
+    position = 0
+    length = len(expression)
+    while position < length:
+        match = _token_re.match(expression, position)
+        if match is None:
+            raise ValueError, 'unexpected character at "%s"' % (
+                    expression[position:])
+        position = match.end()
+        kind = match.lastgroup
+        if kind == 'space':
+            continue
+        tokens.append((kind, match.group(kind)))
+    tokens.append((None, None))
+    return tokens
+
+
+
+def _parse_address(address):
+    match = _address_re.match(address)
+    if match is None:
+        raise ValueError, 'unsupported reference "%s"' % address
+    sheet = match.group('quoted')
+    if sheet is not None:
+        sheet = sheet.replace("''", "'")
+    else:
+        sheet = match.group('sheet') or None
+    x = _alpha_to_digit(match.group('column').upper())
+    y = int(match.group('row')) - 1
+    return sheet, x, y
+
+
+
+def _parse_reference(reference):
+    parts = []
+    quoted = False
+    start = 0
+    for i, c in enumerate(reference):
+        if c == "'":
+            quoted = not quoted
+        elif c == ':' and not quoted:
+            parts.append(reference[start:i])
+            start = i + 1
+    parts.append(reference[start:])
+    if len(parts) == 1:
+        sheet, x, y = _parse_address(parts[0])
+        return ('ref', sheet, x, y)
+    elif len(parts) == 2:
+        sheet, x, y = _parse_address(parts[0])
+        # The sheet of the end is the one of the start
+        _, z, t = _parse_address(parts[1])
+        return ('range', sheet, min(x, z), min(y, t), max(x, z), max(y, t))
+    raise ValueError, 'unsupported reference "%s"' % reference
+
+
+
+class _Parser(object):
+    """Recursive descent parser of the OpenFormula expressions. Nodes are
+    tuples whose first item is the kind of node.
+    """
+
+    def __init__(self, expression):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+
+
+    def parse(self):
+        node = self.parse_comparison()
+        if self.peek()[0] is not None:
+            raise ValueError, 'unexpected "%s"' % self.peek()[1]
+        return node
+
+
+    def peek(self):
+        return self.tokens[self.position]
+
+
+    def next(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+
+    def expect(self, value):
+        kind, token = self.next()
+        if kind != 'operator' or token != value:
+            raise ValueError, '"%s" expected' % value
+
+
+    def parse_binary(self, operators, parse_operand):
+        node = parse_operand()
+        while True:
+            kind, token = self.peek()
+            if kind != 'operator' or token not in operators:
+                return node
+            self.next()
+            node = ('op', token, node, parse_operand())
+
+
+    def parse_comparison(self):
+        return self.parse_binary(('=', '<>', '<', '>', '<=', '>='),
+                self.parse_concatenation)
+
+
+    def parse_concatenation(self):
+        return self.parse_binary(('&',), self.parse_additive)
+
+
+    def parse_additive(self):
+        return self.parse_binary(('+', '-'), self.parse_multiplicative)
+
+
+    def parse_multiplicative(self):
+        return self.parse_binary(('*', '/'), self.parse_power)
+
+
+    def parse_power(self):
+        return self.parse_binary(('^',), self.parse_unary)
+
+
+    def parse_unary(self):
+        kind, token = self.peek()
+        if kind == 'operator' and token in ('-', '+'):
+            self.next()
+            node = self.parse_unary()
+            if token == '-':
+                return ('neg', node)
+            return node
+        return self.parse_percent()
+
+
+    def parse_percent(self):
+        node = self.parse_primary()
+        while self.peek() == ('operator', '%'):
+            self.next()
+            node = ('percent', node)
+        return node
+
+
+    def parse_primary(self):
+        kind, token = self.next()
+        if kind == 'number':
+            return ('value', Decimal(token))
+        elif kind == 'string':
+            return ('value', token[1:-1].replace('""', '"'))
+        elif kind == 'reference':
+            return _parse_reference(token[1:-1])
+        elif kind == 'name':
+            name = token.upper()
+            if self.peek() == ('operator', '('):
+                self.next()
+                if name not in _functions:
+                    raise ValueError, 'unsupported function "%s"' % token
+                return ('call', name, self.parse_arguments())
+            elif name in ('TRUE', 'FALSE'):
+                return ('value', name == 'TRUE')
+            return ('name', token)
+        elif kind == 'operator' and token == '(':
+            node = self.parse_comparison()
+            self.expect(')')
+            return node
+        raise ValueError, 'unexpected "%s"' % token
+
+
+    def parse_arguments(self):
+        arguments = []
+        if self.peek() == ('operator', ')'):
+            self.next()
+            return arguments
+        while True:
+            # Empty argument, e.g. "IF(A1;;1)"
+            if self.peek() in (('operator', ';'), ('operator', ')')):
+                arguments.append(('value', None))
+            else:
+                arguments.append(self.parse_comparison())
+            kind, token = self.next()
+            if (kind, token) == ('operator', ')'):
+                return arguments
+            if (kind, token) != ('operator', ';'):
+                raise ValueError, '";" or ")" expected'
+
+
+
+def parse_formula(formula):
+    """Parse the formula of a cell, in the OpenFormula syntax, e.g.
+    "of:=SUM([.A1:.B3])*2" or the older "oooc:=" one.
+
+    Raise ValueError for other syntaxes, or functions and references not
+    supported by the evaluator.
+
+    Arguments:
+
+        formula -- unicode
+
+    Return: tuple, the root of the syntax tree
+    """
+    if formula.startswith('='):
+        expression = formula[1:]
+    elif ':=' in formula:
+        prefix, expression = formula.split(':=', 1)
+        if prefix not in ('of', 'oooc'):
+            raise ValueError, 'unsupported formula syntax "%s"' % prefix
+    else:
+        raise ValueError, 'not a formula: "%s"' % formula
+    return _Parser(expression).parse()
+
+
+
+#
+# Conversions
+#
+
+def _to_number(value):
+    if value is None:
+        return Decimal(0)
+    if isinstance(value, bool):
+        return Decimal(int(value))
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, (int, long)):
+        return Decimal(value)
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    if isinstance(value, datetime):
+        delta = value - _epoch
+        return (Decimal(delta.days)
+                + Decimal(delta.seconds) / Decimal(86400))
+    if isinstance(value, date):
+        return Decimal((value - _epoch.date()).days)
+    if isinstance(value, timedelta):
+        return (Decimal(value.days)
+                + Decimal(value.seconds) / Decimal(86400))
+    if isinstance(value, _Area):
+        return _to_number(_to_scalar(value))
+    try:
+        return Decimal(value.strip())
+    except (InvalidOperation, AttributeError):
+        raise FormulaError(u"#VALUE!")
+
+
+
+def _to_text(value):
+    value = _to_scalar(value)
+    if value is None:
+        return u""
+    if isinstance(value, bool):
+        return value and u"TRUE" or u"FALSE"
+    if isinstance(value, Decimal):
+        return unicode(_to_result(value))
+    return unicode(value)
+
+
+
+def _to_boolean(value):
+    value = _to_scalar(value)
+    if isinstance(value, basestring):
+        upper = value.upper()
+        if upper in (u"TRUE", u"FALSE"):
+            return upper == u"TRUE"
+        raise FormulaError(u"#VALUE!")
+    return _to_number(value) != 0
+
+
+
+def _to_scalar(value):
+    """Implicit intersection is not supported, only single cell ranges.
+    """
+    if isinstance(value, _Area):
+        if len(value) == 1 and len(value[0]) == 1:
+            return value[0][0]
+        raise FormulaError(u"#VALUE!")
+    return value
+
+
+
+def _to_result(value):
+    """Python value to store in the cell.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, Decimal) and value == value.to_integral_value():
+        return int(value)
+    return value
+
+
+
+def _compare(left, right):
+    """Compare values the way spreadsheets do: numbers are lower than texts,
+    lower than booleans. Texts are case-insensitive, an empty cell is 0 or an
+    empty text.
+    """
+    def rank(value):
+        if isinstance(value, bool):
+            return 2
+        if isinstance(value, basestring):
+            return 1
+        return 0
+    if left is None:
+        left = u"" if isinstance(right, basestring) else 0
+    if right is None:
+        right = u"" if isinstance(left, basestring) else 0
+    left_rank = rank(left)
+    right_rank = rank(right)
+    if left_rank != right_rank:
+        return cmp(left_rank, right_rank)
+    if left_rank == 1:
+        return cmp(left.lower(), right.lower())
+    if left_rank == 2:
+        return cmp(left, right)
+    return cmp(_to_number(left), _to_number(right))
+
+
+
+#
+# Functions
+#
+
+def _iter_numbers(arguments):
+    """Numbers of the arguments. Texts and empty cells of ranges are ignored,
+    as in spreadsheets.
+    """
+    for argument in arguments:
+        if isinstance(argument, _Area):
+            for value in argument.iter_values():
+                if value is None or isinstance(value, basestring):
+                    continue
+                yield _to_number(value)
+        else:
+            yield _to_number(argument)
+
+
+
+def _sum(arguments):
+    return sum(_iter_numbers(arguments), Decimal(0))
+
+
+
+def _average(arguments):
+    numbers = list(_iter_numbers(arguments))
+    if not numbers:
+        raise FormulaError(u"#DIV/0!")
+    return sum(numbers, Decimal(0)) / len(numbers)
+
+
+
+def _min(arguments):
+    numbers = list(_iter_numbers(arguments))
+    if not numbers:
+        return Decimal(0)
+    return min(numbers)
+
+
+
+def _max(arguments):
+    numbers = list(_iter_numbers(arguments))
+    if not numbers:
+        return Decimal(0)
+    return max(numbers)
+
+
+
+def _count(arguments):
+    count = 0
+    for argument in arguments:
+        if isinstance(argument, _Area):
+            for value in argument.iter_values():
+                if value is not None and not isinstance(value, basestring):
+                    count += 1
+        else:
+            try:
+                _to_number(argument)
+                count += 1
+            except FormulaError:
+                pass
+    return Decimal(count)
+
+
+
+def _abs(arguments):
+    if len(arguments) != 1:
+        raise FormulaError(u"Err:511")
+    return abs(_to_number(arguments[0]))
+
+
+
+def _round(arguments):
+    if len(arguments) not in (1, 2):
+        raise FormulaError(u"Err:511")
+    number = _to_number(arguments[0])
+    digits = 0
+    if len(arguments) == 2:
+        digits = int(_to_number(arguments[1]))
+    return number.quantize(Decimal(1).scaleb(-digits),
+                           rounding=ROUND_HALF_UP)
+
+
+
+def _and(arguments):
+    result = True
+    for argument in arguments:
+        if isinstance(argument, _Area):
+            values = [v for v in argument.iter_values() if v is not None]
+        else:
+            values = [argument]
+        for value in values:
+            result = _to_boolean(value) and result
+    return result
+
+
+
+def _or(arguments):
+    result = False
+    for argument in arguments:
+        if isinstance(argument, _Area):
+            values = [v for v in argument.iter_values() if v is not None]
+        else:
+            values = [argument]
+        for value in values:
+            result = _to_boolean(value) or result
+    return result
+
+
+
+def _not(arguments):
+    if len(arguments) != 1:
+        raise FormulaError(u"Err:511")
+    return not _to_boolean(arguments[0])
+
+
+
+def _vlookup(arguments):
+    if len(arguments) not in (3, 4):
+        raise FormulaError(u"Err:511")
+    lookup, area, column = arguments[:3]
+    lookup = _to_scalar(lookup)
+    if not isinstance(area, _Area):
+        raise FormulaError(u"#VALUE!")
+    column = int(_to_number(column))
+    if column < 1 or not area or column > len(area[0]):
+        raise FormulaError(u"#REF!")
+    if len(arguments) == 4 and arguments[3] is not None:
+        sorted = _to_boolean(arguments[3])
+    else:
+        sorted = True
+    found = None
+    for row in area:
+        order = _compare(row[0], lookup)
+        if sorted:
+            if order > 0:
+                break
+            found = row
+        elif order == 0 and row[0] is not None:
+            found = row
+            break
+    if found is None:
+        raise FormulaError(u"#N/A")
+    return found[column - 1]
+
+
+
+# IF is evaluated apart, only one of its branches is
+_functions = {
+        'ABS': _abs,
+        'AND': _and,
+        'AVERAGE': _average,
+        'COUNT': _count,
+        'IF': None,
+        'MAX': _max,
+        'MIN': _min,
+        'NOT': _not,
+        'OR': _or,
+        'ROUND': _round,
+        'SUM': _sum,
+        'VLOOKUP': _vlookup}
+
+
+
+def _compute(operator, left, right):
+    if operator == '&':
+        return _to_text(left) + _to_text(right)
+    if operator in ('=', '<>', '<', '>', '<=', '>='):
+        order = _compare(_to_scalar(left), _to_scalar(right))
+        return {'=': order == 0, '<>': order != 0, '<': order < 0,
+                '>': order > 0, '<=': order <= 0, '>=': order >= 0}[operator]
+    left = _to_number(left)
+    right = _to_number(right)
+    if operator == '+':
+        return left + right
+    elif operator == '-':
+        return left - right
+    elif operator == '*':
+        return left * right
+    elif operator == '/':
+        if right == 0:
+            raise FormulaError(u"#DIV/0!")
+        return left / right
+    # "^"
+    try:
+        return left ** right
+    except (InvalidOperation, ZeroDivisionError):
+        raise FormulaError(u"#NUM!")
+
+
+
+#
+# Engine
+#
+
+class odf_formula_engine(object):
+    """Evaluate the formulas of the tables of a spreadsheet, for the common
+    subset of OpenFormula: arithmetic, comparisons, "&", references to cells
+    and ranges of any table, named ranges, and the functions SUM, AVERAGE,
+    MIN, MAX, COUNT, IF, VLOOKUP, AND, OR, NOT, ABS and ROUND.
+
+    A dependency graph of the cells is built once, so changing a value only
+    recalculates the formulas downstream of it. Results are stored as typed
+    values in the cells, next to their formula. Formulas out of this subset
+    are left untouched with their last computed value.
+
+    Example::
+
+        >>> engine = odf_formula_engine(document)
+        >>> engine.set_value(u"Input", 'B2', 42)
+    """
+
+    def __init__(self, document):
+        if hasattr(document, 'get_body'):
+            body = document.get_body()
+        else:
+            body = document
+        self.body = body
+        self.__tables = {}
+        # Syntax tree of each formula cell, by (table name, x, y)
+        self.__formulas = {}
+        # Precedents of each formula cell: (cells, areas)
+        self.__precedents = {}
+        # Formula cells depending on each cell
+        self.__cell_dependents = {}
+        # (area, formula cell) pairs, by table name
+        self.__area_dependents = {}
+        self.__unsupported = []
+        for table in body.get_tables():
+            name = table.get_name()
+            self.__tables[name] = table
+            for first_y, last_y, row in table._iter_row_spans():
+                for first_x, last_x, cell in row._iter_cell_spans():
+                    formula = cell.get_formula()
+                    if formula is None:
+                        continue
+                    for y in xrange(first_y, last_y + 1):
+                        for x in xrange(first_x, last_x + 1):
+                            self.__register((name, x, y), formula)
+
+
+    #
+    # Private API
+    #
+
+    def __get_table(self, name):
+        table = self.__tables.get(name)
+        if table is None:
+            raise FormulaError(u"#REF!")
+        return table
+
+
+    def __get_named_area(self, name, table_name):
+        named_range = self.body.get_named_range(name)
+        if named_range is None or named_range.crange is None:
+            raise FormulaError(u"#NAME?")
+        x, y, z, t = named_range.crange
+        return (named_range.table_name, x, y, z, t)
+
+
+    def __collect(self, node, table_name, cells, areas):
+        kind = node[0]
+        if kind == 'ref':
+            cells.add((node[1] or table_name, node[2], node[3]))
+        elif kind == 'range':
+            areas.append((node[1] or table_name,) + node[2:])
+        elif kind == 'name':
+            try:
+                areas.append(self.__get_named_area(node[1], table_name))
+            except FormulaError:
+                pass
+        elif kind in ('neg', 'percent'):
+            self.__collect(node[1], table_name, cells, areas)
+        elif kind == 'op':
+            self.__collect(node[2], table_name, cells, areas)
+            self.__collect(node[3], table_name, cells, areas)
+        elif kind == 'call':
+            for argument in node[2]:
+                self.__collect(argument, table_name, cells, areas)
+
+
+    def __register(self, key, formula):
+        try:
+            tree = parse_formula(formula)
+        except ValueError:
+            self.__unsupported.append(key)
+            return
+        cells = set()
+        areas = []
+        self.__collect(tree, key[0], cells, areas)
+        self.__formulas[key] = tree
+        self.__precedents[key] = (cells, areas)
+        for cell in cells:
+            self.__cell_dependents.setdefault(cell, set()).add(key)
+        for area in areas:
+            self.__area_dependents.setdefault(area[0], []).append(
+                    (area[1:], key))
+
+
+    def __unregister(self, key):
+        if key in self.__unsupported:
+            self.__unsupported.remove(key)
+        if key not in self.__formulas:
+            return
+        del self.__formulas[key]
+        cells, areas = self.__precedents.pop(key)
+        for cell in cells:
+            self.__cell_dependents[cell].discard(key)
+        for area in areas:
+            self.__area_dependents[area[0]].remove((area[1:], key))
+
+
+    def __get_dependents(self, key):
+        table_name, x, y = key
+        dependents = set(self.__cell_dependents.get(key, ()))
+        for (left, top, right, bottom), dependent in \
+                self.__area_dependents.get(table_name, ()):
+            if left <= x <= right and top <= y <= bottom:
+                dependents.add(dependent)
+        return dependents
+
+
+    def __get_order(self, keys):
+        """Order the formula cells so that each one comes after the cells it
+        depends on. Cells in a circular reference, or depending on one, are
+        returned apart.
+        """
+        keys = set(keys)
+        dependents = {}
+        counts = dict.fromkeys(keys, 0)
+        for key in keys:
+            dependents[key] = self.__get_dependents(key) & keys
+            for dependent in dependents[key]:
+                counts[dependent] += 1
+        ready = [key for key in keys if counts[key] == 0]
+        heapify(ready)
+        order = []
+        while ready:
+            key = heappop(ready)
+            order.append(key)
+            for dependent in dependents[key]:
+                counts[dependent] -= 1
+                if counts[dependent] == 0:
+                    heappush(ready, dependent)
+        circular = keys.difference(order)
+        return order, circular
+
+
+    def __get_cell_value(self, table_name, x, y):
+        table = self.__get_table(table_name)
+        return table.get_value((x, y))
+
+
+    def __get_area(self, table_name, x, y, z, t):
+        table = self.__get_table(table_name)
+        return _Area(table.get_values((x, y, z, t)))
+
+
+    def __evaluate(self, node, table_name):
+        kind = node[0]
+        if kind == 'value':
+            return node[1]
+        elif kind == 'ref':
+            return self.__get_cell_value(node[1] or table_name, node[2],
+                                         node[3])
+        elif kind == 'range':
+            return self.__get_area(node[1] or table_name, *node[2:])
+        elif kind == 'name':
+            return self.__get_area(*self.__get_named_area(node[1],
+                                                          table_name))
+        elif kind == 'neg':
+            return -_to_number(self.__evaluate(node[1], table_name))
+        elif kind == 'percent':
+            return _to_number(self.__evaluate(node[1], table_name)) / 100
+        elif kind == 'op':
+            left = self.__evaluate(node[2], table_name)
+            right = self.__evaluate(node[3], table_name)
+            return _compute(node[1], left, right)
+        # Function call
+        name, arguments = node[1], node[2]
+        if name == 'IF':
+            if len(arguments) not in (1, 2, 3):
+                raise FormulaError(u"Err:511")
+            condition = self.__evaluate(arguments[0], table_name)
+            if _to_boolean(condition):
+                if len(arguments) < 2:
+                    return True
+                return self.__evaluate(arguments[1], table_name)
+            if len(arguments) < 3:
+                return False
+            return self.__evaluate(arguments[2], table_name)
+        values = [self.__evaluate(argument, table_name)
+                  for argument in arguments]
+        return _functions[name](values)
+
+
+    def __set_result(self, key, value):
+        table_name, x, y = key
+        table = self.__tables[table_name]
+        cell = table.get_cell((x, y), keep_repeated=False)
+        formula = cell.get_formula()
+        for name in _value_attributes:
+            try:
+                cell.del_attribute(name)
+            except KeyError:
+                pass
+        cell.set_value(value, formula=formula)
+        table.set_cell((x, y), cell)
+
+
+    def __update(self, keys):
+        """Recalculate the given formula cells, and everything downstream.
+        """
+        affected = set()
+        queue = list(keys)
+        while queue:
+            key = queue.pop()
+            if key in affected:
+                continue
+            if key in self.__formulas:
+                affected.add(key)
+            queue.extend(self.__get_dependents(key))
+        order, circular = self.__get_order(affected)
+        for key in order:
+            try:
+                value = self.__evaluate(self.__formulas[key], key[0])
+                value = _to_result(_to_scalar(value))
+            except FormulaError, e:
+                value = e.code
+            self.__set_result(key, value)
+        for key in circular:
+            self.__set_result(key, _circular_error)
+        return order + sorted(circular)
+
+
+    def __get_key(self, table_name, coord):
+        self.__get_table(table_name)
+        x, y = _convert_coordinates(coord)[:2]
+        return (table_name, x, y)
+
+
+    #
+    # Public API
+    #
+
+    def get_formula_cells(self):
+        """Get the coordinates of the formula cells that can be evaluated.
+
+        Return: list of (unicode, int, int)
+        """
+        return sorted(self.__formulas)
+
+
+    def get_unsupported_cells(self):
+        """Get the coordinates of the formula cells whose syntax, functions
+        or references are not supported. They are never recalculated.
+
+        Return: list of (unicode, int, int)
+        """
+        return sorted(self.__unsupported)
+
+
+    def get_dependents(self, table_name, coord):
+        """Get the coordinates of the formula cells to recalculate when the
+        given cell changes, in the order of recalculation.
+
+        Arguments:
+
+            table_name -- unicode
+
+            coord -- (int, int) or str
+
+        Return: list of (unicode, int, int)
+        """
+        key = self.__get_key(table_name, coord)
+        affected = set()
+        queue = list(self.__get_dependents(key))
+        while queue:
+            dependent = queue.pop()
+            if dependent not in affected:
+                affected.add(dependent)
+                queue.extend(self.__get_dependents(dependent))
+        order, circular = self.__get_order(affected)
+        return order + sorted(circular)
+
+
+    def recalculate(self, changes=None):
+        """Recalculate the formulas depending on the changed cells, given as
+        (table name, coordinates) pairs, or all the formulas if None.
+
+        Arguments:
+
+            changes -- list of (unicode, (int, int) or str)
+
+        Return: list of (unicode, int, int) of the recalculated cells
+        """
+        if changes is None:
+            return self.__update(self.__formulas.keys())
+        keys = []
+        for table_name, coord in changes:
+            key = self.__get_key(table_name, coord)
+            keys.extend(self.__get_dependents(key))
+        return self.__update(keys)
+
+
+    def set_value(self, table_name, coord, value, cell_type=None,
+                  currency=None, style=None):
+        """Set the value of the cell like odf_table.set_value, then
+        recalculate the formulas depending on it.
+
+        Arguments:
+
+            table_name -- unicode
+
+            coord -- (int, int) or str
+
+            value -- Python type
+
+            cell_type -- 'boolean', 'currency', 'date', 'float', 'percentage',
+                         'string' or 'time'
+
+            currency -- three-letter str
+
+            style -- unicode
+
+        Return: list of (unicode, int, int) of the recalculated cells
+        """
+        key = self.__get_key(table_name, coord)
+        self.__unregister(key)
+        table = self.__tables[table_name]
+        table.set_value(key[1:], value, cell_type=cell_type,
+                        currency=currency, style=style)
+        return self.__update(self.__get_dependents(key))
+
+
+    def set_formula(self, table_name, coord, formula):
+        """Set the formula of the cell, then compute it and the formulas
+        depending on it.
+
+        Arguments:
+
+            table_name -- unicode
+
+            coord -- (int, int) or str
+
+            formula -- unicode, e.g. u"of:=[.A1]*2"
+
+        Return: list of (unicode, int, int) of the recalculated cells
+        """
+        key = self.__get_key(table_name, coord)
+        self.__unregister(key)
+        table = self.__tables[table_name]
+        cell = table.get_cell(key[1:], keep_repeated=False)
+        cell.set_formula(formula)
+        table.set_cell(key[1:], cell)
+        self.__register(key, formula)
+        return self.__update([key])
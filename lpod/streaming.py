@@ -0,0 +1,557 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2009-2013 Ars Aperta, Itaapy, Pierlis, Talend.
+#
+# This file is part of Lpod (see: http://lpod-project.net).
+# Lpod is free software; you can redistribute it and/or modify it under
+# the terms of either:
+#
+# a) the GNU General Public License as published by the Free Software
+#    Foundation, either version 3 of the License, or (at your option)
+#    any later version.
+#    Lpod is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#    You should have received a copy of the GNU General Public License
+#    along with Lpod.  If not, see <http://www.gnu.org/licenses/>.
+#
+# b) the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+
+# Import from the Standard Library
+import os
+from tempfile import mkstemp
+from xml.sax.saxutils import escape
+
+# Import from lxml
+from lxml.etree import iterparse, xmlfile, QName
+
+# Import from lpod
+from __init__ import __version__
+from const import ODF_CONTENT, ODF_META, ODF_SETTINGS, ODF_STYLES
+from const import ODF_MANIFEST
+from container import _save_zip
+from document import odf_new_document
+from element import ODF_NAMESPACES, _decode_qname
+from table import odf_cell, odf_column, odf_create_column
+from table import _convert_coordinates
+from utils import _encode_value_and_type, isiterable
+
+
+_attribute_entities = {'"': '&quot;', '\n': '&#10;', '\r': '&#13;',
+                       '\t': '&#9;'}
+
+
+
+def _qname(qname):
+    return QName(*_decode_qname(qname))
+
+
+
+_table_tag = _qname('table:table').text
+_column_tag = _qname('table:table-column').text
+_row_tag = _qname('table:table-row').text
+_cell_tags = (_qname('table:table-cell').text,
+              _qname('table:covered-table-cell').text)
+_table_name = _qname('table:name').text
+_rows_repeated = _qname('table:number-rows-repeated').text
+_columns_repeated = _qname('table:number-columns-repeated').text
+
+
+
+def _encode_attributes(attributes):
+    return u''.join([u' %s="%s"' % (name, escape(unicode(value),
+                                                 _attribute_entities))
+                     for name, value in attributes if value is not None])
+
+
+
+def _encode_cell(value, style=None, repeated=None):
+    """Serialize the Python value as a table cell, the same way
+    odf_create_cell would encode it.
+    """
+    if isinstance(value, odf_cell):
+        return value.serialize().decode('utf-8')
+    attributes, text = _encode_value_and_type(value)
+    if repeated is not None and repeated > 1:
+        attributes.insert(0, ('table:number-columns-repeated', repeated))
+    if style is not None:
+        attributes.append(('table:style-name', style))
+    attributes = _encode_attributes(attributes)
+    if text is None:
+        return u'<table:table-cell%s/>' % attributes
+    return u'<table:table-cell%s><text:p>%s</text:p></table:table-cell>' % (
+            attributes, escape(text))
+
+
+
+class odf_table_writer(object):
+    """Append-only table streamed to the "content.xml" of a spreadsheet
+    writer. Rows are serialized as soon as they are appended, nothing is kept
+    in memory.
+
+    Don't create it yourself, use ``odf_spreadsheet_writer.add_table``.
+    """
+
+    def __init__(self, writer, name, width=None, columns=None, style=None):
+        self.__file = writer._get_file()
+        self.__columns = columns
+        self.__columns_written = False
+        self.name = name
+        self.width = width
+        self.height = 0
+        attributes = {_qname('table:name'): name}
+        if style is not None:
+            attributes[_qname('table:style-name')] = style
+        self.__context = writer._get_xmlfile().element(_qname('table:table'),
+                attributes)
+        self.__context.__enter__()
+        self.__closed = False
+
+
+    def __write_columns(self):
+        columns = self.__columns
+        if columns is None:
+            columns = [odf_create_column(repeated=self.width or 1)]
+        elif not isinstance(columns, (list, tuple)):
+            columns = [columns]
+        for column in columns:
+            if not isinstance(column, odf_column):
+                raise TypeError, 'odf_column expected, not "%s"' % type(column)
+            self.__file.write(column.serialize())
+        self.__columns_written = True
+
+
+    def append_row(self, values, style=None, repeated=None):
+        """Append a row at the end of the table. Values are Python values,
+        encoded like ``odf_cell.set_value`` does, or already made odf_cell
+        to keep their style, formula, etc. Consecutive None values are stored
+        as a single repeated empty cell.
+
+        Arguments:
+
+            values -- iterable of Python types or odf_cell
+
+            style -- unicode
+
+            repeated -- int
+        """
+        if self.__closed:
+            raise ValueError, 'table "%s" is closed' % self.name
+        if not self.__columns_written:
+            if self.width is None:
+                values = list(values)
+                self.width = len(values)
+            self.__write_columns()
+        attributes = []
+        if repeated is not None and repeated > 1:
+            attributes.append(('table:number-rows-repeated', repeated))
+        else:
+            repeated = 1
+        if style is not None:
+            attributes.append(('table:style-name', style))
+        data = [u'<table:table-row%s>' % _encode_attributes(attributes)]
+        empty = 0
+        for value in values:
+            if value is None:
+                empty += 1
+                continue
+            if empty:
+                data.append(_encode_cell(None, repeated=empty))
+                empty = 0
+            data.append(_encode_cell(value))
+        if empty:
+            data.append(_encode_cell(None, repeated=empty))
+        data.append(u'</table:table-row>')
+        self.__file.write(u''.join(data).encode('utf-8'))
+        self.height += repeated
+
+
+    def extend_rows(self, rows):
+        """Append all the rows of values (or cells) of the iterable.
+
+        Arguments:
+
+            rows -- iterable of iterables of Python types or odf_cell
+        """
+        for values in rows:
+            self.append_row(values)
+
+
+    def close(self):
+        """Terminate the table. No more rows can be appended.
+        """
+        if self.__closed:
+            return
+        if not self.__columns_written:
+            self.__write_columns()
+        self.__context.__exit__(None, None, None)
+        self.__closed = True
+
+
+
+class odf_spreadsheet_writer(object):
+    """Write-only spreadsheet document whose tables are streamed row by row
+    to a temporary "content.xml", then packaged with the other parts of the
+    template. Memory use does not depend on the number of rows.
+
+    Styles must be inserted in ``self.document`` before the first table is
+    added, because automatic styles are written first.
+
+    Example::
+
+        >>> writer = odf_spreadsheet_writer('/tmp/big.ods')
+        >>> table = writer.add_table(u"Data")
+        >>> for record in cursor:
+        ...     table.append_row(record)
+        >>> writer.close()
+    """
+
+    def __init__(self, target, template='spreadsheet'):
+        self.target = target
+        self.document = odf_new_document(template)
+        self.__file = None
+        self.__path = None
+        self.__xmlfile = None
+        self.__contexts = []
+        self.__after_tables = []
+        self.__table = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.__discard()
+
+
+    def _get_file(self):
+        return self.__file
+
+
+    def _get_xmlfile(self):
+        return self.__xmlfile
+
+
+    def __start_content(self):
+        """Write everything of the template content before the tables.
+        """
+        handle, self.__path = mkstemp(suffix='.xml')
+        self.__file = os.fdopen(handle, 'wb')
+        xmlfile_context = xmlfile(self.__file, encoding='UTF-8',
+                buffered=False)
+        self.__xmlfile = xmlfile_context.__enter__()
+        self.__contexts.append(xmlfile_context)
+        self.__xmlfile.write_declaration()
+        content = self.document.get_part(ODF_CONTENT)
+        root = content.get_root()
+        body = content.get_body()
+        self.__enter_element(root)
+        for element in root.get_children():
+            if element.get_tag() == 'office:body':
+                break
+            self.__file.write(element.serialize())
+        self.__enter_element(body.get_parent())
+        self.__enter_element(body)
+        # Keep the order of the template around the (dropped) tables
+        before = True
+        for element in body.get_children():
+            if element.get_tag() == 'table:table':
+                before = False
+                continue
+            if before:
+                self.__file.write(element.serialize())
+            else:
+                self.__after_tables.append(element.serialize())
+
+
+    def __enter_element(self, element):
+        attributes = {}
+        for name, value in element.get_attributes().iteritems():
+            attributes[_qname(name)] = value
+        if not self.__contexts[1:]:
+            nsmap = ODF_NAMESPACES.copy()
+            del nsmap['xml']
+        else:
+            nsmap = None
+        context = self.__xmlfile.element(_qname(element.get_tag()),
+                attributes, nsmap=nsmap)
+        context.__enter__()
+        self.__contexts.append(context)
+
+
+    def __discard(self):
+        if self.__file is not None:
+            self.__file.close()
+            os.remove(self.__path)
+            self.__file = None
+
+
+    def add_table(self, name, width=None, columns=None, style=None):
+        """Start a new table at the end of the document, the previous one is
+        closed. If "width" is not given, the length of the first row is used
+        to declare the columns, unless "columns" gives the column elements.
+
+        Arguments:
+
+            name -- unicode
+
+            width -- int
+
+            columns -- odf_column or list of odf_column
+
+            style -- unicode
+
+        Return: odf_table_writer
+        """
+        if self.__file is None:
+            self.__start_content()
+        if self.__table is not None:
+            self.__table.close()
+        self.__table = odf_table_writer(self, name, width=width,
+                columns=columns, style=style)
+        return self.__table
+
+
+    def close(self):
+        """Terminate the last table and save the document at the target
+        path or file-like object.
+        """
+        if self.__file is None:
+            self.__start_content()
+        if self.__table is not None:
+            self.__table.close()
+            self.__table = None
+        for data in self.__after_tables:
+            self.__file.write(data)
+        while self.__contexts:
+            self.__contexts.pop().__exit__(None, None, None)
+        self.__file.close()
+        self.__file = None
+        try:
+            self.__save()
+        finally:
+            os.remove(self.__path)
+
+
+    def __save(self):
+        document = self.document
+        meta = document.get_part(ODF_META)
+        if not meta._generator_modified:
+            meta.set_generator(u"lpOD Python %s" % __version__)
+        target = self.target
+        close_after = False
+        if isinstance(target, basestring):
+            target = open(target, 'wb')
+            close_after = True
+        manifest = document.get_part(ODF_MANIFEST)
+        # Files added to the document are only known by the manifest
+        paths = document.get_parts()
+        for path in manifest.get_paths():
+            if path not in paths and path != '/' and not path.endswith('/'):
+                paths.append(path)
+        parts = {ODF_MANIFEST: manifest.serialize()}
+        for path in paths:
+            if path in (ODF_CONTENT, ODF_MANIFEST):
+                continue
+            if path in (ODF_META, ODF_SETTINGS, ODF_STYLES):
+                parts[path] = document.get_part(path).serialize()
+            else:
+                parts[path] = document.get_part(path)
+        _save_zip(target, parts, files={ODF_CONTENT: self.__path})
+        if close_after:
+            target.close()
+
+
+
+def _get_streaming_area(coord):
+    """Same coordinates as odf_table.get_values, but the size of the table is
+    unknown when streaming, so negative positions are not allowed.
+    """
+    if not coord:
+        return (0, 0, None, None)
+    if isiterable(coord):
+        coord = tuple(coord)
+        if len(coord) == 1:
+            coord = (None, coord[0], None, coord[0])
+        elif len(coord) == 2:
+            coord = (None, coord[0], None, coord[1])
+    else:
+        coord = _convert_coordinates(coord)
+        if len(coord) == 2:
+            coord = coord + coord
+    for position in coord:
+        if position is not None and position < 0:
+            raise ValueError, 'negative coordinates "%s" not supported' % (
+                    coord,)
+    x, y, z, t = coord
+    return (x or 0, y or 0, z, t)
+
+
+
+def _clip_runs(runs, x, z):
+    """Keep the part of the (value, repeated) runs between the positions x
+    and z (included).
+    """
+    result = []
+    start = 0
+    for value, repeated in runs:
+        end = start + repeated
+        low = max(start, x)
+        if z is None:
+            high = end
+        else:
+            high = min(end, z + 1)
+        if high > low:
+            result.append((value, high - low))
+        start = end
+        if z is not None and start > z:
+            break
+    return result
+
+
+
+def _iter_table_runs(table, coord=None, get_type=False):
+    """Iterate through the rows of values of a loaded table like
+    iter_table_values with expand=False: each item is a tuple (list of
+    (value, repeated), repeated), read from the repetitions of the cells and
+    rows, which are not expanded.
+    """
+    x, y, z, t = _get_streaming_area(coord)
+    if get_type:
+        empty = (None, None)
+    else:
+        empty = None
+    width = table.get_width()
+    for first, last, row in table._iter_row_spans(y, t):
+        runs = []
+        row_width = 0
+        for cell_first, cell_last, cell in row._iter_cell_spans():
+            runs.append((cell.get_value(get_type=get_type),
+                         cell_last - cell_first + 1))
+            row_width = cell_last + 1
+        if width > row_width:
+            runs.append((empty, width - row_width))
+        yield (_clip_runs(runs, x, z), last - first + 1)
+
+
+
+def _release(element):
+    """Free the memory of an element already read, and of its previous
+    siblings.
+    """
+    element.clear()
+    parent = element.getparent()
+    while element.getprevious() is not None:
+        del parent[0]
+
+
+
+def iter_table_values(source, name_or_index, coord=None, get_type=False,
+                      expand=True):
+    """Iterate through the rows of Python values of a table, parsing
+    incrementally the "content.xml" read from the source file-like object.
+    Each row is released once read, so the memory use does not depend on the
+    size of the table. Parsing stops at the end of the table, or of the area.
+
+    Values are decoded like odf_cell.get_value. Rows are completed with None
+    up to the width of the table, as with odf_table.iter_values.
+
+    If expand is False, repetitions are reported instead of expanded: each
+    item is a tuple (list of (value, repeated), repeated), so trailing empty
+    areas of millions of cells cost nothing.
+
+    Arguments:
+
+        source -- file-like object
+
+        name_or_index -- unicode or int
+
+        coord -- str or tuple of int : coordinates of area (no negative value)
+
+        get_type -- boolean
+
+        expand -- boolean
+
+    Return: iterator of lists, or of (list of tuples, int)
+    """
+    x, y, z, t = _get_streaming_area(coord)
+    if get_type:
+        empty = (None, None)
+    else:
+        empty = None
+    by_index = isinstance(name_or_index, (int, long))
+    found = False
+    index = -1
+    depth = 0
+    width = 0
+    position = 0
+    for event, element in iterparse(source, events=('start', 'end'),
+            tag=(_table_tag, _column_tag, _row_tag)):
+        tag = element.tag
+        if tag == _table_tag:
+            if event == 'start':
+                depth += 1
+                if depth == 1:
+                    index += 1
+                    if by_index:
+                        found = (index == name_or_index)
+                    else:
+                        found = (element.get(_table_name) == name_or_index)
+            else:
+                depth -= 1
+                if depth == 0:
+                    if found:
+                        return
+                    _release(element)
+            continue
+        # Rows of sub-tables belong to their cell
+        if event == 'start' or depth != 1:
+            continue
+        if not found:
+            if tag == _row_tag:
+                _release(element)
+            continue
+        if tag == _column_tag:
+            width += int(element.get(_columns_repeated) or 1)
+            continue
+        # Row of the table
+        first = position
+        position += int(element.get(_rows_repeated) or 1)
+        if t is not None and first > t:
+            return
+        if position > y:
+            if t is None:
+                last = position
+            else:
+                last = min(position, t + 1)
+            repeated = last - max(first, y)
+            runs = []
+            row_width = 0
+            for cell in element.iterchildren(*_cell_tags):
+                cell_repeated = int(cell.get(_columns_repeated) or 1)
+                runs.append((odf_cell(cell).get_value(get_type=get_type),
+                             cell_repeated))
+                row_width += cell_repeated
+            if width > row_width:
+                runs.append((empty, width - row_width))
+            runs = _clip_runs(runs, x, z)
+            if expand:
+                values = []
+                for value, cell_repeated in runs:
+                    values.extend([value] * cell_repeated)
+                for i in xrange(repeated):
+                    yield list(values)
+            else:
+                yield (runs, repeated)
+        _release(element)
+    if not found:
+        raise ValueError, 'table "%s" not found' % name_or_index
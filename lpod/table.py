@@ -29,16 +29,28 @@
 
 # Import from the Standard Library
 from cStringIO import StringIO
-from csv import reader, Sniffer
+from csv import reader, writer, Sniffer, QUOTE_ALL
 from textwrap import wrap
 from bisect import bisect_left, insort
+from difflib import SequenceMatcher
+from hashlib import md5
+from itertools import chain, islice, izip, izip_longest
+from contextlib import contextmanager
+from multiprocessing import Pool, cpu_count
 import string
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# Import from lxml
+from lxml.etree import Element, SubElement
 
 # Import from lpod
-from datatype import Boolean, Date, DateTime, Duration
+from datatype import Boolean, Date, DateTime, Duration, _decode_date_value
 from element import odf_create_element, register_element_class, odf_element
-from element import _xpath_compile
+from element import _xpath_compile, PREV_SIBLING, NEXT_SIBLING
+from element import ODF_NAMESPACES
 from utils import get_value, _set_value_and_type, isiterable   #, obsolete
+from utils import _encode_value_and_type
 
 
 
@@ -48,6 +60,15 @@ _xpath_column = _xpath_compile('table:table-column')
 _xpath_column_idx = _xpath_compile('(table:table-column)[$idx]')
 _xpath_cell = _xpath_compile('(table:table-cell|table:covered-table-cell)')
 _xpath_cell_idx = _xpath_compile('(table:table-cell|table:covered-table-cell)[$idx]')
+_xpath_row_range = _xpath_compile(
+        '(table:table-row)[position() >= $start and position() <= $end]')
+_xpath_column_range = _xpath_compile(
+        '(table:table-column)[position() >= $start and position() <= $end]')
+_xpath_cell_range = _xpath_compile(
+        '(table:table-cell|table:covered-table-cell)'
+        '[position() >= $start and position() <= $end]')
+_xpath_spanning_cell = _xpath_compile('table:table-cell'
+        '[@table:number-columns-spanned or @table:number-rows-spanned]')
 
 
 
@@ -174,43 +195,54 @@ def _convert_coordinates(obj):
 
 
 
+def _decode_csv_date(data):
+    # Two tests: "yyyy-mm-dd hh:mm:ss" or "yyyy-mm-ddThh:mm:ss"
+    return _decode_date_value(data.replace(' ', 'T'))
+
+
+
+def _decode_csv_boolean(data):
+    # "True" or "False" with a .lower
+    return Boolean.decode(data.lower())
+
+
+
+# Lines read to guess the CSV dialect and the types of the columns
+_CSV_SAMPLE_LINES = 100
+# Rows appended to the table at once
+_CSV_CHUNK_ROWS = 1000
+
+
+# The decoders tried in turn to load a text, a text is kept as is
+_csv_decoders = (int, float, _decode_csv_date, Duration.decode,
+                 _decode_csv_boolean)
+
+
+
+def _get_python_type(data):
+    """Return the first of the decoders accepting the data, or None for a
+    text.
+    """
+    for decoder in _csv_decoders:
+        try:
+            decoder(data)
+        except ValueError:
+            continue
+        return decoder
+    return None
+
+
+
 def _get_python_value(data, encoding):
     """Try and guess the most appropriate Python type to load the data, with
     regard to ODF types.
     """
     data = unicode(data, encoding)
-    # An int ?
-    try:
-        return int(data)
-    except ValueError:
-        pass
-    # A float ?
-    try:
-        return float(data)
-    except ValueError:
-        pass
-    # A Date ?
-    try:
-        return Date.decode(data)
-    except ValueError:
-        pass
-    # A DateTime ?
-    try:
-        # Two tests: "yyyy-mm-dd hh:mm:ss" or "yyyy-mm-ddThh:mm:ss"
-        return DateTime.decode(data.replace(' ', 'T'))
-    except ValueError:
-        pass
-    # A Duration ?
-    try:
-        return Duration.decode(data)
-    except ValueError:
-        pass
-    # A Boolean ?
-    try:
-        # "True" or "False" with a .lower
-        return Boolean.decode(data.lower())
-    except ValueError:
-        pass
+    for decoder in _csv_decoders:
+        try:
+            return decoder(data)
+        except ValueError:
+            pass
     # TODO Try some other types ?
     # So a text
     return data
@@ -376,6 +408,95 @@ def _delete_item_in_vault(position, vault, vault_scheme, vault_map_name):
 
 
 
+def _split_item_in_vault(position, vault, vault_scheme, vault_map_name):
+    """Split the repeated item (cell, row) covering the position in its vault
+    (row, table), so that an item starts at the position, updating the cache
+    map.
+
+    Return the ODF index of this item and the item, or the length of the map
+    and None if the position is after the last item.
+    """
+    vault_map = getattr(vault, vault_map_name)
+    odf_idx = _find_odf_idx(vault_map, position)
+    if odf_idx is None:
+        return len(vault_map), None
+    if odf_idx > 0:
+        before = vault_map[odf_idx - 1]
+    else:
+        before = -1
+    item = vault._get_element_idx2(vault_scheme, odf_idx)
+    if before + 1 == position:
+        return odf_idx, item
+    after_item = item.clone()
+    after_item._set_repeated(vault_map[odf_idx] - position + 1)
+    item._set_repeated(position - before - 1)
+    item.insert(after_item, xmlposition=NEXT_SIBLING)
+    vault._indexes[vault_map_name] = {}
+    setattr(vault, vault_map_name,
+            vault_map[:odf_idx] + [position - 1] + vault_map[odf_idx:])
+    return odf_idx + 1, after_item
+
+
+
+def _insert_items_in_vault(position, items, vault, vault_scheme,
+        vault_map_name):
+    """Insert the items (cells, rows) before the position in their vault
+    (row, table), the position being inside the vault. The cache map is
+    updated once.
+    """
+    odf_idx, current_item = _split_item_in_vault(position, vault,
+            vault_scheme, vault_map_name)
+    vault_map = getattr(vault, vault_map_name)
+    new_map = vault_map[:odf_idx]
+    last = position - 1
+    for item in items:
+        current_item.insert(item, xmlposition=PREV_SIBLING)
+        last += item.get_repeated() or 1
+        new_map.append(last)
+    inserted = last - position + 1
+    new_map.extend([(x + inserted) for x in vault_map[odf_idx:]])
+    vault._indexes[vault_map_name] = {}
+    setattr(vault, vault_map_name, new_map)
+
+
+
+def _delete_items_in_vault(start, end, vault, vault_scheme_range,
+        vault_map_name):
+    """Delete the items (cells, rows) from the start to the end positions
+    included in their vault (row, table). Repeated items at the boundaries
+    are shortened, and the cache map is updated once.
+    """
+    if end is not None and end < start:
+        raise ValueError, "end position %s is before start %s" % (end, start)
+    vault_map = getattr(vault, vault_map_name)
+    spans = list(_iter_map_spans(vault_map, start, end))
+    if not spans:
+        return
+    first_idx = spans[0][0]
+    last_idx = spans[-1][0]
+    items = vault._get_elements_range2(vault_scheme_range, first_idx,
+            last_idx)
+    new_map = vault_map[:first_idx]
+    last = new_map[-1] if new_map else -1
+    for item, (odf_idx, first, end) in zip(items, spans):
+        if odf_idx > 0:
+            before = vault_map[odf_idx - 1]
+        else:
+            before = -1
+        remaining = vault_map[odf_idx] - before - (end - first + 1)
+        if remaining:
+            item._set_repeated(remaining)
+            last += remaining
+            new_map.append(last)
+        else:
+            vault.delete(item)
+    deleted = spans[-1][2] - spans[0][1] + 1
+    new_map.extend([(x - deleted) for x in vault_map[last_idx + 1:]])
+    vault._indexes[vault_map_name] = {}
+    setattr(vault, vault_map_name, new_map)
+
+
+
 def _insert_map_once(map, odf_idx, repeated):
     """Add an item (cell or row) to the map
 
@@ -445,6 +566,214 @@ def _find_odf_idx(map, position):
 
 
 
+def _iter_map_spans(map, start=None, end=None):
+    """Yield (odf_idx, first position, last position) for the items of the
+    map covering the positions from start to end, clipped to them.
+    Repetitions are not expanded.
+    """
+    if start is None:
+        start = 0
+    odf_idx = _find_odf_idx(map, start)
+    if odf_idx is None:
+        return
+    if odf_idx > 0:
+        before = map[odf_idx - 1]
+    else:
+        before = -1
+    for odf_idx in xrange(odf_idx, len(map)):
+        first = before + 1
+        last = before = map[odf_idx]
+        if end is not None:
+            if first > end:
+                return
+            last = min(last, end)
+        yield odf_idx, max(first, start), last
+
+
+
+def _add_span(index, area):
+    """Add the area to the index of spans, in the list of each of its rows.
+    """
+    x, y, z, t = area
+    for yy in xrange(y, t + 1):
+        index.setdefault(yy, []).append(area)
+
+
+
+def _remove_span(index, area):
+    x, y, z, t = area
+    for yy in xrange(y, t + 1):
+        spans = index[yy]
+        spans.remove(area)
+        if not spans:
+            del index[yy]
+
+
+
+def _find_spans(index, area):
+    """Return the spans of the index intersecting the area, i.e. covering
+    at least one of its cells.
+    """
+    x, y, z, t = area
+    found = []
+    for yy in xrange(y, t + 1):
+        for span in index.get(yy, ()):
+            if span[0] <= z and span[2] >= x and span not in found:
+                found.append(span)
+    return found
+
+
+
+def _merge_items(spans, positions, make_item, make_filler):
+    """Return the list of the item elements once the new items are put at
+    the given sorted positions. The spans are the (first, last, element) of
+    the current elements, split around the new items. make_item(position,
+    element) builds the new item from the element covering the position, or
+    None past the last span, and make_filler(repeated) the empty items
+    between the last span and the new items.
+    """
+    items = []
+    i = 0
+    count = len(positions)
+    end = 0
+    for first, last, element in spans:
+        current = first
+        while i < count and positions[i] <= last:
+            position = positions[i]
+            if position > current:
+                piece = element.clone()
+                piece._set_repeated(position - current)
+                items.append(piece)
+            items.append(make_item(position, element))
+            current = position + 1
+            i += 1
+        if current == first:
+            items.append(element)
+        elif current <= last:
+            piece = element.clone()
+            piece._set_repeated(last - current + 1)
+            items.append(piece)
+        end = last + 1
+    for position in positions[i:]:
+        if position > end:
+            items.append(make_filler(position - end))
+        items.append(make_item(position, None))
+        end = position + 1
+    return items
+
+
+
+# Characters textwrap changes or breaks at
+_wrap_characters = frozenset(u'\t\n\x0b\x0c\r')
+
+
+
+def _wrap_rst_text(text, width):
+    """Return the lines of the text of a cell, wrapped to the width of the
+    column.
+    """
+    # Most texts hold on one line
+    if len(text) <= width and not _wrap_characters.intersection(text):
+        return [text]
+    lines = []
+    for part in text.split('\n'):
+        # Hack to handle correctly the lists or the directives
+        subsequent_indent = ''
+        part_lstripped = part.lstrip()
+        if (part_lstripped.startswith('-') or
+            part_lstripped.startswith('..')):
+            subsequent_indent = ' ' * (len(part) - len(part_lstripped) + 2)
+        wrapped_part = wrap(part, width=width,
+                            subsequent_indent=subsequent_indent)
+        if wrapped_part:
+            lines.extend(wrapped_part)
+        else:
+            lines.append('')
+    return lines
+
+
+
+def _make_rst_row(texts, cols_size, plain):
+    """Return the lines of a row of a reStructuredText simple table, each
+    ending with a new line.
+    """
+    if plain:
+        wrapped_row = [[text] for text in texts]
+    else:
+        wrapped_row = [_wrap_rst_text(text, size)
+                       for text, size in izip(texts, cols_size)]
+    result = []
+    for j in range(max([1] + [len(values) for values in wrapped_row])):
+        for i, size in enumerate(cols_size):
+            values = wrapped_row[i]
+            # An empty cell ?
+            if len(values) - 1 < j or not values[j]:
+                if i == 0 and j == 0:
+                    result.append(u'..')
+                    result.append(u' ' * (size - 1))
+                else:
+                    result.append(u' ' * (size + 1))
+                continue
+            # Not empty
+            value = values[j]
+            result.append(value)
+            result.append(u' ' * (size - len(value) + 1))
+        result.append(u'\n')
+    return u''.join(result)
+
+
+
+def _transpose_spans(row_spans, width, clone):
+    """Swap the rows and the columns of the (repeated, cell spans) of
+    rows, cell spans being the (first x, last x, cell) of the cells from 0
+    to width - 1. Return the (repeated, cells) of the new rows, one for each
+    run of columns cut the same way in every row. The cells of a row are
+    repeated as the row, moved in the first new row they go to unless
+    clone is True, cloned in the next ones.
+    """
+    breaks = set([0, width])
+    for repeated, cells in row_spans:
+        for first, last, cell in cells:
+            breaks.add(first)
+            breaks.add(last + 1)
+    breaks = [x for x in sorted(breaks) if x <= width]
+    runs = [(stop - start, []) for start, stop in zip(breaks, breaks[1:])]
+    for repeated, cells in row_spans:
+        i = 0
+        x = 0
+        used = None
+        for count, new_cells in runs:
+            while i < len(cells) and cells[i][1] < x:
+                i += 1
+            if i < len(cells) and cells[i][0] <= x:
+                source = cells[i][2]
+                if source is used:
+                    # Already moved and swapped
+                    cell = source.clone()
+                else:
+                    if clone:
+                        cell = source.clone()
+                    else:
+                        cell = used = source
+                    columns = cell.get_attribute('table:number-columns-spanned')
+                    rows = cell.get_attribute('table:number-rows-spanned')
+                    if columns != rows:
+                        for name, value in (
+                                ('table:number-rows-spanned', columns),
+                                ('table:number-columns-spanned', rows)):
+                            if value is None:
+                                cell.del_attribute(name)
+                            else:
+                                cell.set_attribute(name, value)
+                cell._set_repeated(repeated)
+            else:
+                cell = odf_create_cell(repeated=repeated)
+            new_cells.append(cell)
+            x += count
+    return runs
+
+
+
 def odf_create_cell(value=None, text=None, cell_type=None, currency=None,
         formula=None, repeated=None, style=None):
     """Create a cell element containing the given value. The textual
@@ -687,16 +1016,17 @@ class odf_cell(odf_element):
         return clone
 
 
-    def get_value(self, get_type=False):
+    def get_value(self, get_type=False, as_float=False):
         """Get the Python value that represent the cell.
 
         Possible return types are unicode, int, Decimal, datetime,
         timedelta.
         If get_type is True, returns a tuple (value, ODF type of value)
+        If as_float is True, numbers are float instead of Decimal.
 
         Return: Python type or tuple (python type, string)
         """
-        return get_value(self, get_type=get_type)
+        return get_value(self, get_type=get_type, as_float=as_float)
 
 
     def set_value(self, value, text=None, cell_type=None, currency=None,
@@ -1099,17 +1429,19 @@ class odf_row(odf_element):
                 repeated = juska - before
                 before = juska
                 for i in xrange(repeated or 1):
-                    if x <= end:
-                        if cell is None:
-                            cell = odf_create_cell()
-                        else:
-                            cell = cell.clone()
-                            if repeated > 1 or (x == start and start > 0):
-                                cell.set_repeated(None)
-                        cell.y = self.y
-                        cell.x = x
-                        x += 1
-                        yield cell
+                    if x > end:
+                        # Don't walk the repetitions after the end
+                        return
+                    if cell is None:
+                        cell = odf_create_cell()
+                    else:
+                        cell = cell.clone()
+                        if repeated > 1 or (x == start and start > 0):
+                            cell.set_repeated(None)
+                    cell.y = self.y
+                    cell.x = x
+                    x += 1
+                    yield cell
 
 
     def get_cells(self, coord=None, style=None, content=None,
@@ -1315,8 +1647,20 @@ class odf_row(odf_element):
 
 
     def extend_cells(self, cells=[]):
+        """Append all the cells at the end of the row at once. Repeated
+        cells are accepted. The cells are not cloned.
+
+        Arguments:
+
+            cells -- list of odf_cell
+        """
         self.extend(cells)
-        self._compute_row_cache()
+        # Extend the cache
+        rmap = self._rmap
+        last = rmap[-1] if rmap else -1
+        for cell in cells:
+            last += cell.get_repeated() or 1
+            rmap.append(last)
 
 
     def append_cell(self, cell=None, clone=True, _repeated=None):
@@ -1368,7 +1712,7 @@ class odf_row(odf_element):
 
 
     def get_values(self, coord=None, cell_type=None,
-                   complete=False, get_type=False):
+                   complete=False, get_type=False, as_float=False):
         """Shortcut to get the cell values in this row.
 
         Filter by cell_type, with cell_type 'all' will retrieve cells of any
@@ -1386,6 +1730,8 @@ class odf_row(odf_element):
         Filter by coordinates will retrieve the amount of cells defined by
         coordinates with None for empty cells, except when using cell_type.
 
+        If as_float is True, numbers are float instead of Decimal.
+
 
         Arguments:
 
@@ -1398,6 +1744,8 @@ class odf_row(odf_element):
 
             get_type -- boolean
 
+            as_float -- boolean
+
         Return: list of Python types, or list of tuples.
         """
         if coord:
@@ -1407,22 +1755,24 @@ class odf_row(odf_element):
             z = None
         if cell_type:
             cell_type = cell_type.lower().strip()
-            values = []
-            for cell in self.traverse(start = x, end = z):
+        if get_type:
+            empty = (None, None)
+        else:
+            empty = None
+        values = []
+        # Repeated cells are decoded once
+        for first, last, cell in self._iter_cell_spans(x, z):
+            repeated = last - first + 1
+            if cell_type:
                 # Filter the cells by cell_type
                 ctype = cell.get_type()
                 if not ctype or not (ctype == cell_type or cell_type == 'all'):
                     if complete:
-                        if get_type:
-                            values.append((None, None))
-                        else:
-                            values.append(None)
+                        values.extend([empty] * repeated)
                     continue
-                values.append(cell.get_value(get_type = get_type))
-            return values
-        else:
-            return [ cell.get_value(get_type = get_type)
-                                for cell in self.traverse(start = x, end = z) ]
+            value = cell.get_value(get_type=get_type, as_float=as_float)
+            values.extend([value] * repeated)
+        return values
 
 
     def set_cells(self, cells=[], start=0, clone=True):
@@ -1524,6 +1874,45 @@ class odf_row(odf_element):
         return True
 
 
+    def _iter_cell_spans(self, start=None, end=None):
+        """Yield (first x, last x, cell) for the cell elements covering the
+        positions from start to end. Cells are neither cloned nor expanded.
+        """
+        cells = self._get_cells()
+        for idx, first, last in _iter_map_spans(self._rmap, start, end):
+            yield first, last, cells[idx]
+
+
+    def _replace_cells(self, x, cells):
+        """Replace the cells of the row from the position x by the given
+        cells, not cloned. Repeated cells at the edges of the area are split,
+        so the cells around it are kept.
+        """
+        width = sum((cell.get_repeated() or 1) for cell in cells)
+        row_width = self.get_width()
+        if x < row_width:
+            _delete_items_in_vault(x, x + width - 1, self, _xpath_cell_range,
+                    '_rmap')
+            if x < self.get_width():
+                _insert_items_in_vault(x, cells, self, _xpath_cell_idx,
+                        '_rmap')
+                return
+        elif x > row_width:
+            self.extend_cells([odf_create_cell(repeated=x - row_width)])
+        self.extend_cells(cells)
+
+
+    def _get_used_width(self):
+        """Return the width of the row without its trailing cells with no
+        value, styled or not. Repetitions are read in the cache, not expanded.
+        """
+        cells = self._get_cells()
+        for idx in xrange(len(cells) - 1, -1, -1):
+            if not cells[idx].is_empty(aggressive=True):
+                return self._rmap[idx] + 1
+        return 0
+
+
 
 class odf_row_group(odf_element):
     """Class to group rows with common properties.
@@ -1639,12 +2028,19 @@ class odf_table(odf_element):
     #
     def __init__(self, native_element, cache=None):
         odf_element.__init__(self, native_element, cache)
-        # parse the whole table for repeated rows, if cache not already provided
-        if cache is None:
-            self._compute_table_cache()
         self._indexes={}
         self._indexes['_cmap'] = {}
         self._indexes['_tmap'] = {}
+        # Index of the rows by key, see build_index
+        self._indexes['_keys'] = None
+        # Cell spans by row, see get_span_at
+        self._indexes['_spans'] = None
+        self._key_column = None
+        # Cells written by row while in a batch, see batch
+        self._batch = None
+        # parse the whole table for repeated rows, if cache not already provided
+        if cache is None:
+            self._compute_table_cache()
 
 
     _append = odf_element.append
@@ -1791,6 +2187,8 @@ class odf_table(odf_element):
 
 
     def _compute_table_cache(self):
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
         idx_repeated_seq = self.elements_repeated_sequence(_xpath_row, 'table:number-rows-repeated')
         self._tmap = _make_cache_map(idx_repeated_seq)
         idx_repeated_seq = self.elements_repeated_sequence(_xpath_column, 'table:number-columns-repeated')
@@ -1828,54 +2226,91 @@ class odf_table(odf_element):
 
 
     def __get_formatted_text_rst(self, context):
-        context['no_img_level'] += 1
-        # Strip the table => We must clone
-        table = self.clone()
-        table.rstrip(aggressive=True)
+        result = []
+        self.__write_rst(result.append, context)
+        return u''.join(result)
+
 
-        # Fill the rows
+    def __get_rst_texts(self, context, plain):
+        """Return the stripped texts of the cells as a list of (texts of a
+        row, repeated), the number of columns up to the last one not empty
+        and the size of the columns, in one pass over the cell elements,
+        neither cloned nor expanded. The repeated cells and rows are read
+        once, unless they contain elements. The empty cells at the end of the
+        rows are left out, the empty rows at the end of the table too.
+        """
         rows = []
+        height = 0
         cols_nb = 0
         cols_size = {}
-        for odf_row in table.traverse():
-            row = []
-            for i, cell in enumerate(odf_row.traverse()):
-                value = get_value(cell, try_get_text=False)
-                # None ?
-                if value is None:
+        for first, last, row in self._iter_row_spans():
+            for i in xrange(last - first + 1):
+                texts = []
+                shared = True
+                used = False
+                for cell_first, cell_last, cell in row._iter_cell_spans():
+                    repeated = cell_last - cell_first + 1
+                    value = get_value(cell, try_get_text=False)
+                    if value is not None:
+                        used = True
+                        texts.append((unicode(value).strip(), repeated))
+                        continue
                     # Try with get_formatted_text on the elements
-                    value = []
-                    for element in cell.get_children():
-                        value.append(element.get_formatted_text(context))
-                    value = u''.join(value)
-                else:
-                    value = unicode(value)
-                value = value.strip()
-                # Strip the empty columns
-                if value:
-                    cols_nb = max(cols_nb, i + 1)
-                # Compute the size of each columns (at least 2)
-                cols_size[i] = max(cols_size.get(i, 2), len(value))
-                # Append
-                row.append(value)
-            rows.append(row)
+                    children = cell.get_children()
+                    if not children:
+                        texts.append((u'', repeated))
+                        continue
+                    used = True
+                    shared = False
+                    for j in xrange(repeated):
+                        text = u''.join([child.get_formatted_text(context)
+                                         for child in children])
+                        texts.append((text.strip(), 1))
+                # The empty cells at the end are not expanded
+                while texts and not texts[-1][0]:
+                    texts.pop()
+                cells = []
+                for text, repeated in texts:
+                    if plain:
+                        text = text.replace(u'\n', u' ')
+                    cells.extend([text] * repeated)
+                # The size of each column (at least 2), without the empty ones
+                for x, text in enumerate(cells):
+                    if len(text) > cols_size.get(x, 2):
+                        cols_size[x] = len(text)
+                cols_nb = max(cols_nb, len(cells))
+                # The text of the row is the same for all the repetitions
+                repeated = (last - first + 1) if shared else 1
+                rows.append((cells, repeated))
+                if used:
+                    height = len(rows)
+                if shared:
+                    break
+        del rows[height:]
+        cols_size = [cols_size.get(x, 2) for x in xrange(cols_nb)]
+        return rows, cols_nb, cols_size
+
+
+    def __write_rst(self, write, context, plain=False):
+        """Write the table as a reStructuredText simple table, calling write
+        with the unicode text of the lines as they are made. Cells are wrapped
+        to keep the lines short, unless plain is True.
+        """
+        context['no_img_level'] += 1
+        rows, cols_nb, cols_size = self.__get_rst_texts(context, plain)
 
         # Nothing ?
         if cols_nb == 0:
-            return u''
-
-        # Prevent a crash with empty columns (by example with images)
-        for col, size in cols_size.iteritems():
-            if size == 0:
-                cols_size[col] = 1
+            context['no_img_level'] -= 1
+            return
 
         # Update cols_size
         LINE_MAX = 100
         COL_MIN = 16
 
         free_size = LINE_MAX - (cols_nb - 1) * 3 - 4
-        real_size = sum([ cols_size[i] for i in range(cols_nb) ])
-        if real_size > free_size:
+        real_size = sum(cols_size)
+        if real_size > free_size and not plain:
             factor = float(free_size) / real_size
 
             for i in range(cols_nb):
@@ -1891,68 +2326,19 @@ class odf_table(odf_element):
                     new_size = COL_MIN
                 cols_size[i] = new_size
 
-        # Convert !
-        result = [u'']
         # Construct the first/last line
-        line = []
-        for i in range(cols_nb):
-            line.append(u'=' * cols_size[i])
-            line.append(u' ')
-        line = u''.join(line)
+        line = u''.join([u'=' * size + u' ' for size in cols_size])
+        write(u'\n%s\n' % line)
 
         # Add the lines
-        result.append(line)
-        for row in rows:
-            # Wrap the row
-            wrapped_row = []
-            for i, value in enumerate(row[:cols_nb]):
-                wrapped_value = []
-                for part in value.split('\n'):
-                    # Hack to handle correctly the lists or the directives
-                    subsequent_indent = ''
-                    part_lstripped = part.lstrip()
-                    if (part_lstripped.startswith('-') or
-                        part_lstripped.startswith('..')):
-                        subsequent_indent = ' ' * (len(part) \
-                                                   - len(part.lstrip()) \
-                                                   + 2)
-                    wrapped_part = wrap(part, width=cols_size[i],
-                                        subsequent_indent=subsequent_indent)
-                    if wrapped_part:
-                        wrapped_value.extend(wrapped_part)
-                    else:
-                        wrapped_value.append('')
-                wrapped_row.append(wrapped_value)
-
-            # Append!
-            for j in range(max([1]+[len(values) for values in wrapped_row ])):
-                txt_row = []
-                for i in range(cols_nb):
-                    values = wrapped_row[i] if i < len(wrapped_row) else []
-
-                    # An empty cell ?
-                    if len(values) - 1 < j or not values[j]:
-                        if i == 0 and j == 0:
-                            txt_row.append(u'..')
-                            txt_row.append(u' ' * (cols_size[i] - 1))
-                        else:
-                            txt_row.append(u' ' * (cols_size[i] + 1))
-                        continue
-
-                    # Not empty
-                    value = values[j]
-                    txt_row.append(value)
-                    txt_row.append(u' ' * (cols_size[i] - len(value) + 1))
-                txt_row = u''.join(txt_row)
-                result.append(txt_row)
-
-        result.append(line)
-        result.append(u'')
-        result.append(u'')
-        result = u'\n'.join(result)
+        for cells, repeated in rows:
+            cells = cells + [u''] * (cols_nb - len(cells))
+            text = _make_rst_row(cells, cols_size, plain)
+            for i in xrange(repeated):
+                write(text)
 
+        write(u'%s\n\n' % line)
         context['no_img_level'] -= 1
-        return result
 
     #
     # Public API
@@ -2021,6 +2407,40 @@ class odf_table(odf_element):
         return self.get_width(), self.get_height()
 
 
+    def get_used_size(self):
+        """Get the width and height of the area of the table really
+        containing values, i.e. without the trailing empty rows and columns,
+        styled or not, that spreadsheet applications repeat up to the sheet
+        limits. Unlike rstrip, the table is not modified, and repetitions are
+        not expanded.
+
+        Return: (int, int)
+        """
+        width = height = 0
+        rows = self._get_rows()
+        for idx in xrange(len(rows) - 1, -1, -1):
+            row_width = rows[idx]._get_used_width()
+            if row_width:
+                if not height:
+                    height = self._tmap[idx] + 1
+                width = max(width, row_width)
+        return width, height
+
+
+    def __trim_area(self, x, y, z, t):
+        """Restrict the area to the used size of the table. Return None if
+        nothing is left.
+        """
+        width, height = self.get_used_size()
+        if z is None or z >= width:
+            z = width - 1
+        if t is None or t >= height:
+            t = height - 1
+        if z < (x or 0) or t < (y or 0):
+            return None
+        return x, y, z, t
+
+
     def get_name(self):
         """Return the name of the table.
         """
@@ -2096,7 +2516,7 @@ class odf_table(odf_element):
 
 
     def get_values(self, coord=None, cell_type=None, complete=True,
-                   get_type=False, flat=False):
+                   get_type=False, flat=False, trim=False, as_float=False):
         """Get a matrix of values of the table.
 
         Filter by coordinates will parse the area defined by the coordinates.
@@ -2116,6 +2536,13 @@ class odf_table(odf_element):
         If flat is True, the methods return a single list of all the values.
         By default, flat is False.
 
+        If trim is True, the area is restricted to the used size of the
+        table (see get_used_size), so the empty rows and columns repeated at
+        the end are not expanded.
+
+        If as_float is True, numbers are float instead of Decimal, which is
+        faster to decode.
+
         Arguments:
 
             coord -- str or tuple of int : coordinates of area
@@ -2127,29 +2554,18 @@ class odf_table(odf_element):
 
             get_type -- boolean
 
+            flat -- boolean
+
+            trim -- boolean
+
+            as_float -- boolean
+
         Return: list of lists of Python types
         """
-        if coord:
-            x, y, z, t = self._translate_table_coordinates(coord)
-        else:
-            x = y = z = t = None
         data = []
-        for row in self.traverse(start = y, end = t):
-            if z is None:
-                width = self.get_width()
-            else:
-                width = min(z + 1, self.get_width())
-            if x is not None:
-                width -= x
-            values = row.get_values((x, z), cell_type=cell_type,
-                                            complete=complete,
-                                                get_type=get_type)
-            # complete row to match request width
-            if complete:
-                if get_type:
-                    values.extend([(None, None)] * (width - len(values)))
-                else:
-                    values.extend([None] * (width - len(values)))
+        for values in self.iter_values(coord, cell_type=cell_type,
+                complete=complete, get_type=get_type, trim=trim,
+                as_float=as_float):
             if flat:
                 data.extend(values)
             else:
@@ -2158,12 +2574,14 @@ class odf_table(odf_element):
 
 
     def iter_values(self, coord=None, cell_type=None, complete=True,
-                    get_type=False):
+                    get_type=False, trim=False, as_float=False):
         """Iterate through lines of Python values of the table.
 
         Filter by coordinates will parse the area defined by the coordinates.
 
-        cell_type, complete, grt_type : see get_values()
+        cell_type, complete, grt_type, trim, as_float : see get_values()
+
+        The cells of a repeated row are decoded once.
 
 
 
@@ -2178,22 +2596,32 @@ class odf_table(odf_element):
 
             get_type -- boolean
 
+            trim -- boolean
+
+            as_float -- boolean
+
         Return: iterator of lists
         """
         if coord:
             x, y, z, t = self._translate_table_coordinates(coord)
         else:
             x = y = z = t = None
-        for row in self.traverse(start = y, end = t):
-            if z is None:
-                width = self.get_width()
-            else:
-                width = min(z + 1, self.get_width())
-            if x is not None:
-                width -= x
+        if trim:
+            area = self.__trim_area(x, y, z, t)
+            if area is None:
+                return
+            x, y, z, t = area
+        if z is None:
+            width = self.get_width()
+        else:
+            width = min(z + 1, self.get_width())
+        if x is not None:
+            width -= x
+        for first, last, row in self._iter_row_spans(y, t):
             values = row.get_values((x, z), cell_type=cell_type,
                                             complete=complete,
-                                                get_type=get_type)
+                                                get_type=get_type,
+                                                    as_float=as_float)
             # complete row to match column width
             if complete:
                 if get_type:
@@ -2201,6 +2629,8 @@ class odf_table(odf_element):
                 else:
                     values.extend([None] * (width - len(values)))
             yield values
+            for y in xrange(first, last):
+                yield list(values)
 
 
     def set_values(self, values, coord=None, style=None, cell_type=None,
@@ -2314,60 +2744,94 @@ class odf_table(odf_element):
         coordinates. Beware, if area is not square, some cells mays be over
         written during the process.
 
+        Repetitions are kept: a run of identical columns becomes a repeated
+        row. The cells of the whole table are moved, not copied.
+
         Arguments:
 
             coord -- str or tuple of int : coordinates of area
 
             start -- int or str
         """
-        data = []
         if coord is None:
-            for row in self.traverse():
-                data.append([cell for cell in row.traverse()])
-            transposed_data = map(None, *data)
-            self.clear()
-            new_rows = []
-            for row_cells in transposed_data:
-                if not isiterable(row_cells):
-                    row_cells = (row_cells,)
-                row = odf_create_row()
-                row.extend_cells(row_cells)
-                self.append_row(row, clone=False)
-            self._compute_table_cache()
-        else:
-            x, y, z, t = self._translate_table_coordinates(coord)
-            if x is None:
-                x = 0
-            else:
-                x = min(x, self.get_width() - 1)
-            if z is None:
-                z = self.get_width() - 1
-            else:
-                z = min(z, self.get_width() - 1)
-            if y is None:
-                y = 0
-            else:
-                y = min(y, self.get_height() - 1)
-            if t is None:
-                t = self.get_height() - 1
+            width = self.get_width()
+            spans = []
+            for first, last, row in self._iter_row_spans():
+                width = max(width, row.get_width())
+                spans.append((last - first + 1, row))
+            if not spans:
+                return
+            row_spans = [(repeated, list(row._iter_cell_spans(0, width - 1)))
+                         for repeated, row in spans]
+            rows = []
+            for repeated, cells in _transpose_spans(row_spans, width, False):
+                row = odf_create_row(repeated=repeated)
+                row.extend_cells(cells)
+                rows.append(row)
+            old_rows = self._get_rows()
+            column = odf_create_column(repeated=sum(r for r, _ in spans))
+            columns = self._get_columns()
+            if columns:
+                self.replace_element(columns[0], column)
+                for old_column in columns[1:]:
+                    self.delete(old_column)
             else:
-                t = min(t, self.get_height() - 1)
-            for row in self.traverse(start=y, end=t):
-                data.append([cell for cell in row.traverse(start=x, end=z)])
-            transposed_data = map(None, *data)
-            # clear locally
-            w = z - x + 1
-            h = t -y + 1
-            if w != h:
-                nones = [[None] * w for i in range(h)]
-                self.set_values(nones, coord=(x,y,z,t))
-            # put transposed
-            for idx, row_cells in enumerate(transposed_data):
-                if not isiterable(row_cells):
-                    row_cells = (row_cells,)
-                    transposed_data[idx] = row_cells
-            self.set_cells(transposed_data, (x, y, x + h - 1, y + w -1))
-            self._compute_table_cache()
+                old_rows[0].insert(column, xmlposition=PREV_SIBLING)
+            self.__replace_rows(old_rows, rows)
+            self._indexes['_cmap'] = {}
+            return
+        x, y, z, t = self._translate_table_coordinates(coord)
+        if x is None:
+            x = 0
+        else:
+            x = min(x, self.get_width() - 1)
+        if z is None:
+            z = self.get_width() - 1
+        else:
+            z = min(z, self.get_width() - 1)
+        if y is None:
+            y = 0
+        else:
+            y = min(y, self.get_height() - 1)
+        if t is None:
+            t = self.get_height() - 1
+        else:
+            t = min(t, self.get_height() - 1)
+        if z < x or t < y:
+            return
+        w = z - x + 1
+        h = t - y + 1
+        row_spans = []
+        for first, last, row in self._iter_row_spans(y, t):
+            cells = [(first_x - x, last_x - x, cell)
+                     for first_x, last_x, cell in row._iter_cell_spans(x, z)]
+            row_spans.append((last - first + 1, cells))
+        # The area is copied before writing over it
+        runs = _transpose_spans(row_spans, w, True)
+        if w < h:
+            runs.append((h - w, []))
+        i = 0
+        for count, cells in runs:
+            for repeat in xrange(count):
+                if i < h and w > h:
+                    # Clear the rest of the area
+                    cells_runs = cells + [odf_create_cell(repeated=w - h)]
+                elif not cells:
+                    cells_runs = [odf_create_cell(repeated=w)]
+                else:
+                    cells_runs = cells
+                # Plain cells in the area, its edges are split by the row
+                row_cells = []
+                for run in cells_runs:
+                    for j in xrange(run.get_repeated() or 1):
+                        cell = run.clone()
+                        cell._set_repeated(None)
+                        row_cells.append(cell)
+                row = self.get_row(y + i)
+                row._set_repeated(None)
+                row._replace_cells(x, row_cells)
+                self.set_row(y + i, row, clone=False)
+                i += 1
 
 
     def is_empty(self, aggressive=False):
@@ -2394,6 +2858,15 @@ class odf_table(odf_element):
         return self.get_elements(_xpath_row)
 
 
+    def _iter_row_spans(self, start=None, end=None):
+        """Yield (first y, last y, row) for the row elements covering the
+        positions from start to end. Rows are neither cloned nor expanded.
+        """
+        rows = self._get_rows()
+        for idx, first, last in _iter_map_spans(self._tmap, start, end):
+            yield first, last, rows[idx]
+
+
     def traverse(self, start=None, end=None):
         """Yield as many row elements as expected rows in the table, i.e.
         expand repetitions by returning the same row as many times as
@@ -2455,13 +2928,15 @@ class odf_table(odf_element):
                 repeated = juska - before
                 before = juska
                 for i in xrange(repeated or 1):
-                    if y <= end:
-                        row = row.clone()
-                        row.y = y
-                        y += 1
-                        if repeated > 1 or (y == start and start > 0):
-                            row.set_repeated(None)
-                        yield row
+                    if y > end:
+                        # Don't walk the repetitions after the end
+                        return
+                    row = row.clone()
+                    row.y = y
+                    y += 1
+                    if repeated > 1 or (y == start and start > 0):
+                        row.set_repeated(None)
+                    yield row
 
 
     def get_rows(self, coord=None, style=None, content=None):
@@ -2564,6 +3039,8 @@ class odf_table(odf_element):
             repeated = row.get_repeated() or 1
         y = self._translate_y_from_any(y)
         row.y = y
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
         # Outside the defined table ?
         diff = y - self.get_height()
         if diff == 0:
@@ -2600,6 +3077,8 @@ class odf_table(odf_element):
             row = odf_create_row()
             clone = False
         y = self._translate_y_from_any(y)
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
         diff = y - self.get_height()
         if diff < 0:
             row_back = _insert_item_in_vault(y, row, self, _xpath_row_idx, '_tmap')
@@ -2614,34 +3093,101 @@ class odf_table(odf_element):
         return row_back
 
 
-    def extend_rows(self, rows=[]):
-        """Append a list of rows at the end of the table.
+    def insert_rows(self, y, rows_or_count, clone=True):
+        """Insert the rows before the given "y" position, or as many empty
+        rows as the given count, in one pass: a repeated row at the position
+        is split once and the cache is updated once.
+
+        Position start at 0. So cell A4 is on row 3.
 
         Arguments:
 
-            rows -- list of odf_row
+            y -- int or str
 
-        """
-        self.extend(rows)
-        self._compute_table_cache()
-        # Update width if necessary
-        width = self.get_width()
-        for row in self.traverse():
-            if row.get_width() > width:
-                width = row.get_width()
-        diff = width - self.get_width()
-        if diff > 0:
-            self.append_column(odf_create_column(repeated=diff))
+            rows_or_count -- list of odf_row or int
 
+            clone -- boolean
 
-    def append_row(self, row=None, clone=True, _repeated=None):
-        """Append the row at the end of the table. If no row is given, an
-        empty one is created.
+        returns the list of inserted rows
+        """
+        y = self._translate_y_from_any(y)
+        if isinstance(rows_or_count, (int, long)):
+            if rows_or_count < 1:
+                return []
+            rows = [odf_create_row(repeated=rows_or_count)]
+        elif clone:
+            rows = [row.clone() for row in rows_or_count]
+        else:
+            rows = list(rows_or_count)
+        if not rows:
+            return []
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
+        diff = y - self.get_height()
+        if diff < 0:
+            _insert_items_in_vault(y, rows, self, _xpath_row_idx, '_tmap')
+        else:
+            if diff > 0:
+                self.append_row(odf_create_row(repeated=diff), _repeated=diff,
+                        clone=False)
+            for row in rows:
+                self._append(row)
+                self._tmap = _insert_map_once(self._tmap, len(self._tmap),
+                        row.get_repeated())
+        for row in rows:
+            row.y = y
+            y += row.get_repeated() or 1
+            # Update width if necessary
+            self.__update_width(row)
+        return rows
 
-        Position start at 0. So cell A4 is on row 3.
 
-        Note the columns are automatically created when the first row is
-        inserted in an empty table. So better insert a filled row.
+    def extend_rows(self, rows=[], clone=False):
+        """Append all the rows at the end of the table at once. Repeated
+        rows are accepted. The columns are created or added once for the
+        widest row.
+
+        Arguments:
+
+            rows -- iterable of odf_row
+
+            clone -- boolean, False to append the rows themselves
+        """
+        if clone:
+            rows = [row.clone() for row in rows]
+        else:
+            rows = list(rows)
+        if not rows:
+            return
+        self.extend(rows)
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
+        # Extend the cache
+        tmap = self._tmap
+        last = tmap[-1] if tmap else -1
+        width = 0
+        for row in rows:
+            last += row.get_repeated() or 1
+            tmap.append(last)
+            row.y = last
+            width = max(width, row.get_width())
+        # Initialize columns, or update width if necessary
+        if not self._cmap:
+            self.insert(odf_create_column(repeated=width), position=0)
+            self._cmap = _insert_map_once(self._cmap, 0, width)
+        elif width > self.get_width():
+            self.append_column(odf_create_column(
+                repeated=width - self.get_width()))
+
+
+    def append_row(self, row=None, clone=True, _repeated=None):
+        """Append the row at the end of the table. If no row is given, an
+        empty one is created.
+
+        Position start at 0. So cell A4 is on row 3.
+
+        Note the columns are automatically created when the first row is
+        inserted in an empty table. So better insert a filled row.
 
         Arguments:
 
@@ -2659,12 +3205,14 @@ class odf_table(odf_element):
         # Appending a repeated row accepted
         # Do not insert next to the last row because it could be in a group
         self._append(row)
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
         if _repeated is None:
             _repeated = row.get_repeated() or 1
         self._tmap = _insert_map_once(self._tmap, len(self._tmap), _repeated)
         row.y = self.get_height() - 1
         # Initialize columns
-        if not self._get_columns():
+        if not self._cmap:
             repeated = row.get_width()
             self.insert(odf_create_column(repeated=repeated),
                     position=0)
@@ -2689,6 +3237,31 @@ class odf_table(odf_element):
             return
         # Inside the defined table
         _delete_item_in_vault(y, self, _xpath_row_idx, '_tmap')
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
+
+
+    def delete_rows(self, start, end=None):
+        """Delete the rows from the "start" position to the "end" position
+        included, or to the end of the table, in one pass: repeated rows at
+        the boundaries are shortened and the cache is updated once.
+
+        Position start at 0. So cell A4 is on row 3.
+
+        Arguments:
+
+            start -- int or str
+
+            end -- int or str
+
+        Raise ValueError if "end" is before "start".
+        """
+        start = self._translate_y_from_any(start)
+        if end is not None:
+            end = self._translate_y_from_any(end)
+        _delete_items_in_vault(start, end, self, _xpath_row_range, '_tmap')
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
 
 
     def get_row_values(self, y, cell_type=None, complete=True,
@@ -2844,6 +3417,36 @@ class odf_table(odf_element):
     #get_cell_list = obsolete('get_cell_list', get_cells)
 
 
+    def iter_nonempty_cells(self, coord=None):
+        """Iterate through the cells having a value, as tuples (x, y,
+        value, ODF type of value). If 'coord' is None, parse the whole table,
+        else parse the area defined by 'coord'.
+
+        Unlike get_cells, nothing is cloned and repeated empty cells or rows
+        are skipped at once, so it is fast on sparse tables.
+
+        Arguments:
+
+            coord -- str or tuple of int : coordinates of area
+
+        Return: iterator of tuples
+        """
+        if coord:
+            x, y, z, t = self._translate_table_coordinates(coord)
+        else:
+            x = y = z = t = None
+        for first_y, last_y, row in self._iter_row_spans(y, t):
+            for first_x, last_x, cell in row._iter_cell_spans(x, z):
+                if cell.get_attribute('office:value-type') is None:
+                    continue
+                value, value_type = cell.get_value(get_type=True)
+                if value is None:
+                    continue
+                for cell_y in xrange(first_y, last_y + 1):
+                    for cell_x in xrange(first_x, last_x + 1):
+                        yield (cell_x, cell_y, value, value_type)
+
+
     def get_cell(self, coord, clone=True, keep_repeated=True):
         """Get the cell at the given coordinates.
 
@@ -2859,8 +3462,12 @@ class odf_table(odf_element):
         Return: odf_cell
         """
         x, y = self._translate_cell_coordinates(coord)
+        if self._batch is not None and x in self._batch.get(y, ()):
+            cell = self._batch[y][x]
+            if clone:
+                cell = cell.clone()
         # Outside the defined table
-        if y >= self.get_height():
+        elif y >= self.get_height():
             cell = odf_create_cell()
         else:
             # Inside the defined table
@@ -2891,6 +3498,8 @@ class odf_table(odf_element):
         Return: Python type
         """
         x, y = self._translate_cell_coordinates(coord)
+        if self._batch is not None and x in self._batch.get(y, ()):
+            return self._batch[y][x].get_value(get_type=get_type)
         # Outside the defined table
         if y >= self.get_height():
             if get_type:
@@ -2926,8 +3535,12 @@ class odf_table(odf_element):
             cell = odf_create_cell()
             clone = False
         x, y = self._translate_cell_coordinates(coord)
+        if self._batch is not None:
+            return self.__set_batch_cell(x, y, cell, clone)
         cell.x = x
         cell.y = y
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
         if y >= self.get_height():
             row = odf_create_row()
             cell_back = row.set_cell(x, cell, clone=clone)
@@ -3037,6 +3650,74 @@ class odf_table(odf_element):
 
             type -- 'spreadsheet' or 'text'
         """
+        type = self.__get_image_type(type)
+        x, y = self._translate_cell_coordinates(coord)
+        cell = self.get_cell((x, y))
+        # Remove any previous paragraph, frame, etc.
+        for child in cell.get_children():
+            cell.delete(child)
+        self.__put_cell_image(cell, x, y, image_frame, type, self.get_name())
+        self.set_cell(coord, cell)
+
+
+    def set_cell_images(self, images, type=None):
+        """Display each image at the coordinates given with it, as
+        ``set_cell_image`` does. The document type is tested once and the
+        rows of the images are written once, in a batch. The cells are not
+        cloned, they are replaced by new cells of the same attributes.
+
+        Arguments:
+
+            images -- iterable of (coord, odf_frame including an image)
+
+            type -- 'spreadsheet' or 'text'
+        """
+        type = self.__get_image_type(type)
+        name = self.get_name()
+        frames = {}
+        for coord, image_frame in images:
+            x, y = self._translate_cell_coordinates(coord)
+            frames.setdefault(y, {})[x] = image_frame
+        if not frames:
+            return
+        with self.batch():
+            for x, y, cell in self.__iter_cells_at(frames):
+                cell = _make_empty_cell(cell)
+                self.__put_cell_image(cell, x, y, frames[y][x], type, name)
+                self.set_cell((x, y), cell, clone=False)
+
+
+    def __iter_cells_at(self, positions):
+        """Yield (x, y, cell) for the positions given as {y: xs}, the cells
+        found in one pass over the rows, neither cloned nor expanded. Cells
+        kept aside by a batch are found first, cell is None out of the table.
+        """
+        batch = self._batch or {}
+        ys = sorted(positions)
+        i = 0
+        for first, last, row in self._iter_row_spans(ys[0], ys[-1]):
+            while i < len(ys) and ys[i] <= last:
+                y = ys[i]
+                i += 1
+                if y < first:
+                    continue
+                xs = sorted(positions[y])
+                j = 0
+                for x_first, x_last, cell in row._iter_cell_spans(xs[0],
+                                                                   xs[-1]):
+                    while j < len(xs) and xs[j] <= x_last:
+                        x = xs[j]
+                        j += 1
+                        if x >= x_first:
+                            yield x, y, batch.get(y, {}).get(x, cell)
+                for x in xs[j:]:
+                    yield x, y, batch.get(y, {}).get(x)
+        for y in ys[i:]:
+            for x in sorted(positions[y]):
+                yield x, y, batch.get(y, {}).get(x)
+
+
+    def __get_image_type(self, type):
         # Test document type
         if type is None:
             body = self.get_document_body()
@@ -3046,13 +3727,11 @@ class odf_table(odf_element):
                     'office:text': 'text'}.get(body.get_tag())
             if type is None:
                 raise ValueError, "document type not supported for images"
-        # We need the end address of the image
-        x, y = self._translate_cell_coordinates(coord)
-        cell = self.get_cell((x, y))
+        return type
+
+
+    def __put_cell_image(self, cell, x, y, image_frame, type, name):
         image_frame = image_frame.clone()
-        # Remove any previous paragraph, frame, etc.
-        for child in cell.get_children():
-            cell.delete(child)
         # Now it all depends on the document type
         if type == 'spreadsheet':
             image_frame.set_anchor_type(None)
@@ -3061,8 +3740,7 @@ class odf_table(odf_element):
             image_frame.set_attribute('table:end-x', width)
             image_frame.set_attribute('table:end-y', height)
             # FIXME what happens when the address changes?
-            address = u"%s.%s%s" % (self.get_name(),
-                    _digit_to_alpha(x), y + 1)
+            address = u"%s.%s%s" % (name, _digit_to_alpha(x), y + 1)
             image_frame.set_attribute('table:end-cell-address', address)
             # The frame is directly in the cell
             cell.append(image_frame)
@@ -3071,7 +3749,6 @@ class odf_table(odf_element):
             cell.set_value(u"")
             paragraph = cell.get_element('text:p')
             paragraph.append(image_frame)
-        self.set_cell(coord, cell)
 
 
     def insert_cell(self, coord, cell=None, clone=True):
@@ -3158,6 +3835,8 @@ class odf_table(odf_element):
         # Inside the defined table
         row = self._get_row2_base(y)
         row.delete_cell(x)
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
         #self.set_row(y, row)
 
 
@@ -3369,6 +4048,8 @@ class odf_table(odf_element):
         column_back.x = x
         # Repetitions are accepted
         repeated = column.get_repeated() or 1
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
         # Update width on every row
         for row in self._get_rows():
             if row.get_width() > x:
@@ -3378,6 +4059,45 @@ class odf_table(odf_element):
         return column_back
 
 
+    def insert_columns(self, x, count):
+        """Insert "count" empty columns before the given "x" position, and
+        their cells in every row, splitting the repetitions once per row.
+
+        Position start at 0. So cell C4 is on column 2. Alphabetical position
+        like "C" is accepted.
+
+        Arguments:
+
+            x -- int or str.isalpha()
+
+            count -- int
+
+        Return: odf_column
+        """
+        if count < 1:
+            return None
+        x = self._translate_x_from_any(x)
+        column = odf_create_column(repeated=count)
+        diff = x - self.get_width()
+        if diff < 0:
+            _insert_items_in_vault(x, [column], self, _xpath_column_idx,
+                    '_cmap')
+        else:
+            if diff > 0:
+                self.append_column(odf_create_column(repeated=diff),
+                        _repeated=diff)
+            column = self.append_column(column)
+        column.x = x
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
+        # Update width on every row
+        for row in self._get_rows():
+            if row.get_width() > x:
+                _insert_items_in_vault(x, [odf_create_cell(repeated=count)],
+                        row, _xpath_cell_idx, '_rmap')
+        return column
+
+
     def append_column(self, column=None, _repeated=None):
         """Append the column at the end of the table. If no column is given,
         an empty one is created.
@@ -3428,6 +4148,8 @@ class odf_table(odf_element):
             return
         # Inside the defined table
         _delete_item_in_vault(x, self, _xpath_column_idx, '_cmap')
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
         # Update width
         width = self.get_width()
         for row in self._get_rows():
@@ -3435,6 +4157,32 @@ class odf_table(odf_element):
                 row.delete_cell(x)
 
 
+    def delete_columns(self, start, end=None):
+        """Delete the columns from the "start" position to the "end" position
+        included, or to the end of the table, and their cells in every row.
+        Each row is updated in one pass.
+
+        Position start at 0. So cell C4 is on column 2. Alphabetical position
+        like "C" is accepted.
+
+        Arguments:
+
+            start -- int or str.isalpha()
+
+            end -- int or str.isalpha()
+
+        Raise ValueError if "end" is before "start".
+        """
+        start = self._translate_x_from_any(start)
+        if end is not None:
+            end = self._translate_x_from_any(end)
+        _delete_items_in_vault(start, end, self, _xpath_column_range, '_cmap')
+        self._indexes['_keys'] = None
+        self._indexes['_spans'] = None
+        for row in self._get_rows():
+            _delete_items_in_vault(start, end, row, _xpath_cell_range, '_rmap')
+
+
     def get_column_cells(self, x, style=None, content=None, cell_type=None,
                          complete=False):
         """Get the list of cells at the given position.
@@ -3466,35 +4214,51 @@ class odf_table(odf_element):
         if cell_type:
             cell_type = cell_type.lower().strip()
         cells = []
-        if not style and not content and not cell_type:
-            for row in self.traverse():
-                cells.append(row.get_cell(x, clone=True))
-            return cells
-        for row in self.traverse():
-            cell = row.get_cell(x, clone=True)
-        # Filter the cells by cell_type
-            if cell_type:
-                ctype = cell.get_type()
-                if not ctype or not (ctype == cell_type or cell_type == 'all'):
-                    if complete:
-                        cells.append(None)
-                    continue
-            # Filter the cells with the regex
-            if content and not cell.match(content):
-                if complete:
-                    cells.append(None)
-                continue
-            # Filter the cells with the style
-            if style and style != cell.get_style():
+        for first, last, cell in self._iter_column_spans(x):
+            # Filter once for all the repetitions of the row
+            if not self.__match_cell(cell, cell_type, content, style):
                 if complete:
-                    cells.append(None)
+                    cells.extend([None] * (last - first + 1))
                 continue
-            cells.append(cell)
+            for y in xrange(first, last + 1):
+                if cell is None:
+                    copy = odf_create_cell()
+                else:
+                    copy = cell.clone()
+                copy.x = x
+                copy.y = y
+                cells.append(copy)
         return cells
 
 
+    def _iter_column_spans(self, x, start=None, end=None):
+        """Yield (first y, last y, cell) for the cell at position x of each
+        row element, or None where the row is shorter. The cell is found with
+        the repetition map of the row, without cloning the row nor the cell.
+        """
+        for first, last, row in self._iter_row_spans(start, end):
+            yield first, last, row._get_cell2_base(x)
+
+
+    @staticmethod
+    def __match_cell(cell, cell_type, content, style):
+        if cell_type:
+            if cell is None:
+                return False
+            ctype = cell.get_type()
+            if not ctype or not (ctype == cell_type or cell_type == 'all'):
+                return False
+        if content:
+            if cell is None or not cell.match(content):
+                return False
+        if style:
+            if cell is None or style != cell.get_style():
+                return False
+        return True
+
+
     def get_column_values(self, x, cell_type=None, complete=True,
-                          get_type=False):
+                          get_type=False, as_float=False):
         """Shortcut to get the list of Python values for the cells at the
         given position.
 
@@ -3507,6 +4271,8 @@ class odf_table(odf_element):
 
         If get_type is True, returns a tuple (value, ODF type of value)
 
+        If as_float is True, numbers are float instead of Decimal.
+
         Arguments:
 
             x -- int or str.isalpha()
@@ -3518,39 +4284,73 @@ class odf_table(odf_element):
 
             get_type -- boolean
 
+            as_float -- boolean
+
         Return: list of Python types
         """
-        cells = self.get_column_cells(x, style=None, content=None,
-                                    cell_type=cell_type, complete=complete)
+        x = self._translate_x_from_any(x)
+        if cell_type:
+            cell_type = cell_type.lower().strip()
+        if get_type:
+            empty = (None, None)
+        else:
+            empty = None
         values = []
-        for cell in cells:
-            if cell is None:
+        for first, last, cell in self._iter_column_spans(x):
+            if not self.__match_cell(cell, cell_type, None, None):
                 if complete:
-                    if get_type:
-                        values.append((None, None))
-                    else:
-                        values.append(None)
+                    values.extend([empty] * (last - first + 1))
                 continue
-            if cell_type:
-                ctype = cell.get_type()
-                if not ctype or not (ctype == cell_type or cell_type == 'all'):
-                    if complete:
-                        if get_type:
-                            values.append((None, None))
-                        else:
-                            values.append(None)
-                    continue
-            values.append(cell.get_value(get_type=get_type))
+            if cell is None:
+                value = empty
+            else:
+                value = cell.get_value(get_type=get_type, as_float=as_float)
+            values.extend([value] * (last - first + 1))
         return values
 
 
+    def __set_column_runs(self, x, runs):
+        """Set the cells at position x from the list of (cell, number of
+        rows) runs, covering the height of the table. Repeated rows are only
+        split where the cell changes, and the cache is computed once.
+        """
+        runs = iter(runs)
+        left = 0
+        for first, last, row in list(self._iter_row_spans()):
+            height = last - first + 1
+            pieces = []
+            while height:
+                if not left:
+                    cell, left = runs.next()
+                count = min(height, left)
+                pieces.append((cell, count))
+                height -= count
+                left -= count
+            if len(pieces) == 1:
+                # Same cell for every repetition of the row
+                row.set_cell(x, pieces[0][0])
+                self.__update_width(row)
+                continue
+            for cell, count in pieces:
+                new_row = row.clone()
+                new_row._set_repeated(count)
+                new_row.set_cell(x, cell)
+                row.insert(new_row, xmlposition=PREV_SIBLING)
+                self.__update_width(new_row)
+            row.get_parent().delete(row)
+        self._indexes['_tmap'] = {}
+        self._compute_table_cache()
+
+
     def set_column_cells(self, x, cells):
         """Shortcut to set the list of cells at the given position.
 
         Position start at 0. So cell C4 is on column 2. Alphabetical position
         like "C" is accepted.
 
-        The list must have the same length than the table height.
+        The list must have the same length than the table height. The table
+        is updated in one pass, consecutive rows receiving the same cell
+        object keep sharing a repeated row.
 
         Arguments:
 
@@ -3561,10 +4361,14 @@ class odf_table(odf_element):
         height = self.get_height()
         if len(cells) != height:
             raise ValueError, "col mismatch: %s cells expected" % height
-        cells = iter(cells)
-        for y, row in enumerate(self.traverse()):
-            row.set_cell(x, cells.next())
-            self.set_row(y, row)
+        x = self._translate_x_from_any(x)
+        runs = []
+        for cell in cells:
+            if runs and runs[-1][0] is cell:
+                runs[-1][1] += 1
+            else:
+                runs.append([cell, 1])
+        self.__set_column_runs(x, runs)
 
 
     def set_column_values(self, x, values, cell_type=None, currency=None,
@@ -3581,7 +4385,7 @@ class odf_table(odf_element):
 
             x -- int or str.isalpha()
 
-            values -- list of Python types
+            values -- iterable of Python types
 
             cell_type -- 'boolean', 'currency', 'date', 'float', 'percentage',
                          'string' or 'time'
@@ -3590,9 +4394,24 @@ class odf_table(odf_element):
 
             style -- unicode
         """
-        cells = [odf_create_cell(value, cell_type=cell_type, currency=currency,
-                                 style=style) for value in values]
-        self.set_column_cells(x, cells)
+        height = self.get_height()
+        values = list(values)
+        if len(values) != height:
+            raise ValueError, "col mismatch: %s values expected" % height
+        x = self._translate_x_from_any(x)
+        # Same values in a row share a cell (and a repeated row)
+        runs = []
+        previous = None
+        for value in values:
+            key = (type(value), value)
+            if runs and key == previous:
+                runs[-1][1] += 1
+            else:
+                cell = odf_create_cell(value, cell_type=cell_type,
+                                       currency=currency, style=style)
+                runs.append([cell, 1])
+                previous = key
+        self.__set_column_runs(x, runs)
 
 
     def is_column_empty(self, x, aggressive=False):
@@ -3613,95 +4432,464 @@ class odf_table(odf_element):
 
 
     #
-    # Named Range
+    # Batch
     #
 
+    @contextmanager
+    def batch(self):
+        """Keep the cells written in the table aside until the end of the
+        "with" block, then rebuild each row written once:
 
-    def get_named_ranges(self, table_name=None):
-        """Returns the list of available Name Ranges of the spreadsheet. If
-        table_name is provided, limits the search to these tables.
-        Beware : named ranges are stored at the body level, thus do not call
-        this method on a cloned table.
-
-        Arguments:
-
-            table_names -- str or list of str, names of tables
+            with table.batch():
+                for y, values in enumerate(data):
+                    for x, value in enumerate(values):
+                        table.set_value((x, y), value)
 
-        Return : list of odf_table_range
+        Only ``set_cell`` and ``set_value`` are deferred, ``get_cell`` and
+        ``get_value`` find the cells kept aside, the other methods see the
+        table as it was before the block. Nothing is written if the block
+        raises an exception. Nested blocks are written with the outermost.
         """
-        body = self.get_document_body()
-        if not body:
-            return []
-        all_named_ranges = body.get_named_ranges()
-        if not table_name:
-            return all_named_ranges
-        filter = []
-        if isinstance(table_name, basestring):
-            filter.append(table_name)
-        elif isiterable(table_name):
-            filter.extend(table_name)
-        else:
-            raise ValueError, "table_name must be string or Iterable, not %s" % type(table_name)
-        return [nr for nr in all_named_ranges if nr.table_name in filter]
+        if self._batch is not None:
+            yield self
+            return
+        self._batch = {}
+        try:
+            yield self
+            batch = self._batch
+        finally:
+            self._batch = None
+        self.__commit_batch(batch)
 
 
-    def get_named_range(self, name):
-        """Returns the Name Ranges of the specified name. If
-        table_name is provided, limits the search to these tables.
-        Beware : named ranges are stored at the body level, thus do not call
-        this method on a cloned table.
+    def __set_batch_cell(self, x, y, cell, clone):
+        if clone:
+            cell = cell.clone()
+        repeated = cell.get_repeated() or 1
+        cells = self._batch.setdefault(y, {})
+        if repeated > 1:
+            cell._set_repeated(None)
+            for xx in xrange(x + 1, x + repeated):
+                cells[xx] = cell.clone()
+        cells[x] = cell
+        cell.x = x
+        cell.y = y
+        return cell
 
-        Arguments:
 
-            name -- str, name of the named range object
+    def __commit_batch(self, batch):
+        if not batch:
+            return
+        new_rows = []
 
-        Return : odf_named_range
-        """
-        body = self.get_document_body()
-        if not body:
-            raise ValueError, "Table is not inside a document"
-        return body.get_named_range(name)
+        def make_row(y, row):
+            if row is None:
+                row = odf_create_row()
+            else:
+                row = row.clone()
+                row._set_repeated(None)
+            cells = batch[y]
+            items = _merge_items(list(row._iter_cell_spans()), sorted(cells),
+                    lambda x, cell: cells[x],
+                    lambda repeated: odf_create_cell(repeated=repeated))
+            for cell in row._get_cells():
+                row.delete(cell)
+            row.extend(items)
+            row._compute_row_cache()
+            row.y = y
+            new_rows.append(row)
+            return row
 
+        rows = _merge_items(list(self._iter_row_spans()), sorted(batch),
+                make_row, lambda repeated: odf_create_row(repeated=repeated))
+        self.__replace_rows(self._get_rows(), rows)
+        widest = max(new_rows, key=odf_row.get_width)
+        self.__update_width(widest)
 
-    def set_named_range(self, name, crange, table_name=None, usage=None):
-        """Create a Named Range element and insert it in the document.
-        Beware : named ranges are stored at the body level, thus do not call
-        this method on a cloned table.
 
-        Arguments:
+    #
+    # Index
+    #
 
-            name -- str, name of the named range
+    def build_index(self, x=0):
+        """Index the rows of the table by the value of their cell at
+        position "x", so that ``lookup`` finds a row in constant time. When a
+        key appears several times, the first row is kept, as VLOOKUP does.
 
-            crange -- str or tuple of int, cell or area coordinate
+        The index is dropped by the changes made through the API of this
+        table object, and rebuilt at the next lookup. Changes made directly
+        to rows or cells got with "clone=False", or through another
+        odf_table object of the same table, are not detected: call
+        build_index again.
 
-            table_name -- str, name of the table
+        Position start at 0. So cell C4 is on column 2. Alphabetical position
+        like "C" is accepted.
 
-            uage -- None or 'print-range', 'filter', 'repeat-column', 'repeat-row'
+        Arguments:
+
+            x -- int or str.isalpha()
         """
-        body = self.get_document_body()
-        if not body:
-            raise ValueError, "Table is not inside a document"
-        if not name:
-            raise ValueError, "Name required."
-        if table_name is None:
-            table_name = self.get_name()
-        named_range = odf_create_named_range(name, crange, table_name, usage)
-        body.append_named_range(named_range)
+        x = self._translate_x_from_any(x)
+        index = {}
+        for first, last, cell in self._iter_column_spans(x):
+            if cell is None:
+                continue
+            key = cell.get_value()
+            if key is not None and key not in index:
+                index[key] = first
+        self._key_column = x
+        self._indexes['_keys'] = index
 
 
-    def delete_named_range(self, name):
-        """Delete the Named Range of specified name from the spreadsheet.
-        Beware : named ranges are stored at the body level, thus do not call
-        this method on a cloned table.
+    def lookup(self, key, get_values=False):
+        """Find the position of the first row whose cell in the column given
+        to ``build_index`` has the key as value, or its values if get_values
+        is True.
 
         Arguments:
 
-            name -- str
+            key -- Python type
+
+            get_values -- boolean
+
+        Return: int or list of Python types, or None if not found
         """
-        name = name.strip()
-        if not name:
-            raise ValueError, "Name required."
-        body = self.get_document_body()
+        index = self._indexes['_keys']
+        if index is None:
+            if self._key_column is None:
+                raise ValueError, "no index, call build_index first"
+            self.build_index(self._key_column)
+            index = self._indexes['_keys']
+        y = index.get(key)
+        if y is None or not get_values:
+            return y
+        return self.get_row_values(y)
+
+
+    #
+    # Sort and Filter
+    #
+
+    @staticmethod
+    def __sort_key(value):
+        """Order the values as spreadsheets do: numbers, then dates, then
+        durations, then text without case, then booleans.
+        """
+        if type(value) is bool:
+            return (4, value)
+        if isinstance(value, (int, long, float, Decimal)):
+            return (0, value)
+        if isinstance(value, datetime):
+            return (1, value)
+        if isinstance(value, date):
+            return (1, datetime(value.year, value.month, value.day))
+        if isinstance(value, timedelta):
+            return (2, value)
+        if isinstance(value, basestring):
+            return (3, value.lower())
+        return (5, value)
+
+
+    def __replace_rows(self, old_rows, rows):
+        """Replace the given last row elements of the table by the new ones,
+        moved in that order at the end of the table. Elements found after the
+        last row, like named expressions, are moved back after them.
+        """
+        if old_rows:
+            trailing = old_rows[-1].get_elements('following-sibling::*')
+        else:
+            trailing = []
+        for row in old_rows:
+            self.delete(row)
+        for row in rows:
+            self._append(row)
+        for element in trailing:
+            self._append(element)
+        self._compute_table_cache()
+        self._indexes['_tmap'] = {}
+
+
+    def __data_row_spans(self, header_rows):
+        header_rows = int(header_rows)
+        if header_rows < 0:
+            raise ValueError, "header_rows must be positive"
+        _split_item_in_vault(header_rows, self, _xpath_row_idx, '_tmap')
+        return list(self._iter_row_spans(header_rows))
+
+
+    def __data_row_blocks(self, header_rows):
+        """Return the (first, last, row) of the data rows, grouped in lists
+        so that the rows of a cell span over several rows stay together. A
+        cell span across the header and the data rows is refused.
+        """
+        spans = self.__data_row_spans(header_rows)
+        ends = {}
+        for areas in self.__get_span_index().itervalues():
+            for x, y, z, t in areas:
+                if t == y:
+                    continue
+                if y < header_rows <= t:
+                    raise ValueError, ("cell span %s%s crosses the header "
+                                       "rows" % (_digit_to_alpha(x), y + 1))
+                ends[y] = max(ends.get(y, y), t)
+        starts = sorted(ends.iteritems())
+        blocks = []
+        end = -1
+        i = 0
+        for first, last, row in spans:
+            if first <= end:
+                blocks[-1].append((first, last, row))
+            else:
+                blocks.append([(first, last, row)])
+            while i < len(starts) and starts[i][0] <= last:
+                end = max(end, starts[i][1])
+                i += 1
+        return blocks
+
+
+    def sort_rows(self, key_columns, reverse=False, header_rows=0):
+        """Sort the rows of the table in place, on the values of the given
+        columns. The sort is stable. Numbers come first, then dates, text
+        ignoring case, booleans, and empty cells are always put last.
+
+        Row elements are moved, not rebuilt: styles, repetitions and the
+        attributes of cells are kept. The first "header_rows" rows stay in
+        place. The rows of a cell span over several rows are moved together,
+        sorted on the values of the first one; a cell span across the header
+        and the other rows raises ValueError.
+
+        Arguments:
+
+            key_columns -- int or str.isalpha(), or list of them
+
+            reverse -- boolean
+
+            header_rows -- int
+        """
+        if not isiterable(key_columns):
+            key_columns = [key_columns]
+        columns = [self._translate_x_from_any(x) for x in key_columns]
+        if self.get_height() <= header_rows:
+            return
+        blocks = self.__data_row_blocks(header_rows)
+        if not blocks:
+            return
+        rows = []
+        for block in blocks:
+            row = block[0][2]
+            keys = []
+            for x in columns:
+                cell = row._get_cell2_base(x)
+                keys.append(cell.get_value() if cell is not None else None)
+            rows.append((keys, block))
+        # Empty cells last in both orders
+        empty = (-1,) if reverse else (6,)
+        sort_key = self.__sort_key
+        for i in xrange(len(columns) - 1, -1, -1):
+            rows.sort(key=lambda item: (empty if item[0][i] is None
+                                        else sort_key(item[0][i])),
+                      reverse=reverse)
+        self.__replace_rows([row for block in blocks
+                             for first, last, row in block],
+                            [row for keys, block in rows
+                             for first, last, row in block])
+
+
+    def filter_rows(self, predicate, header_rows=0):
+        """Keep only the rows for which the predicate returns True, given the
+        list of the values of the row. The predicate is called once for a
+        repeated row. The first "header_rows" rows are always kept. The rows
+        of a cell span over several rows are kept together if one of them is
+        accepted; a cell span across the header and the other rows raises
+        ValueError.
+
+        Arguments:
+
+            predicate -- function
+
+            header_rows -- int
+
+        Return: int, the number of rows deleted
+        """
+        if self.get_height() <= header_rows:
+            return 0
+        width = self.get_width()
+        deleted = 0
+        for block in self.__data_row_blocks(header_rows):
+            for first, last, row in block:
+                values = []
+                for cell_first, cell_last, cell in row._iter_cell_spans(0,
+                        width - 1):
+                    values.extend([cell.get_value()] *
+                                  (cell_last - cell_first + 1))
+                values.extend([None] * (width - len(values)))
+                if predicate(values):
+                    break
+            else:
+                for first, last, row in block:
+                    self.delete(row)
+                    deleted += last - first + 1
+        if deleted:
+            self._compute_table_cache()
+            self._indexes['_tmap'] = {}
+        return deleted
+
+
+    def group_rows(self, key_columns, aggregates, header_rows=0):
+        """Group the rows by the values of the given columns and aggregate
+        the values of other columns, like "GROUP BY" in SQL. The table is not
+        modified.
+
+        The aggregates are a list of (column, function) where the function is
+        called with the list of the non-empty values of the column in the
+        group, a repeated row counting as many times. E.g. sum, len, max.
+
+        Groups are returned in the order of their first row: a list of the
+        key values followed by the results of the aggregates.
+
+        Arguments:
+
+            key_columns -- int or str.isalpha(), or list of them
+
+            aggregates -- list of (int or str.isalpha(), function)
+
+            header_rows -- int
+
+        Return: list of lists of Python types
+        """
+        if not isiterable(key_columns):
+            key_columns = [key_columns]
+        columns = [self._translate_x_from_any(x) for x in key_columns]
+        aggregates = [(self._translate_x_from_any(x), function)
+                      for x, function in aggregates]
+        groups = {}
+        order = []
+        for first, last, row in self._iter_row_spans(header_rows):
+            repeated = last - first + 1
+            key = []
+            for x in columns:
+                cell = row._get_cell2_base(x)
+                key.append(cell.get_value() if cell is not None else None)
+            key = tuple(key)
+            if key not in groups:
+                groups[key] = [[] for aggregate in aggregates]
+                order.append(key)
+            lists = groups[key]
+            for i, (x, function) in enumerate(aggregates):
+                cell = row._get_cell2_base(x)
+                if cell is None:
+                    continue
+                value = cell.get_value()
+                if value is not None:
+                    lists[i].extend([value] * repeated)
+        result = []
+        for key in order:
+            lists = groups[key]
+            result.append(list(key) + [function(lists[i])
+                          for i, (x, function) in enumerate(aggregates)])
+        return result
+
+
+    #
+    # Named Range
+    #
+
+
+    def __get_body(self):
+        """Return the document body, keeping the registry of its named ranges
+        as long as the table.
+        """
+        body = self.get_document_body()
+        if body is not None:
+            self.__named_range_registry = body._get_named_range_registry()
+        return body
+
+
+    def get_named_ranges(self, table_name=None):
+        """Returns the list of available Name Ranges of the spreadsheet. If
+        table_name is provided, limits the search to these tables.
+        Beware : named ranges are stored at the body level, thus do not call
+        this method on a cloned table.
+
+        Arguments:
+
+            table_names -- str or list of str, names of tables
+
+        Return : list of odf_table_range
+        """
+        body = self.__get_body()
+        if not body:
+            return []
+        all_named_ranges = body.get_named_ranges()
+        if not table_name:
+            return all_named_ranges
+        filter = set()
+        if isinstance(table_name, basestring):
+            filter.add(table_name)
+        elif isiterable(table_name):
+            filter.update(table_name)
+        else:
+            raise ValueError, "table_name must be string or Iterable, not %s" % type(table_name)
+        return [nr for nr in all_named_ranges if nr.table_name in filter]
+
+
+    def get_named_range(self, name):
+        """Returns the Name Ranges of the specified name. If
+        table_name is provided, limits the search to these tables.
+        Beware : named ranges are stored at the body level, thus do not call
+        this method on a cloned table.
+
+        Arguments:
+
+            name -- str, name of the named range object
+
+        Return : odf_named_range
+        """
+        body = self.__get_body()
+        if not body:
+            raise ValueError, "Table is not inside a document"
+        return body.get_named_range(name)
+
+
+    def set_named_range(self, name, crange, table_name=None, usage=None):
+        """Create a Named Range element and insert it in the document.
+        Beware : named ranges are stored at the body level, thus do not call
+        this method on a cloned table.
+
+        Arguments:
+
+            name -- str, name of the named range
+
+            crange -- str or tuple of int, cell or area coordinate
+
+            table_name -- str, name of the table
+
+            uage -- None or 'print-range', 'filter', 'repeat-column', 'repeat-row'
+        """
+        body = self.__get_body()
+        if not body:
+            raise ValueError, "Table is not inside a document"
+        if not name:
+            raise ValueError, "Name required."
+        if table_name is None:
+            table_name = self.get_name()
+        named_range = odf_create_named_range(name, crange, table_name, usage)
+        body.append_named_range(named_range)
+
+
+    def delete_named_range(self, name):
+        """Delete the Named Range of specified name from the spreadsheet.
+        Beware : named ranges are stored at the body level, thus do not call
+        this method on a cloned table.
+
+        Arguments:
+
+            name -- str
+        """
+        name = name.strip()
+        if not name:
+            raise ValueError, "Name required."
+        body = self.__get_body()
         if not body:
             raise ValueError, "Table is not inside a document."
         body.delete_named_range(name)
@@ -3748,7 +4936,9 @@ class odf_table(odf_element):
             # one cell : do nothing
             return False
         # check for previous span
-        good = True
+        index = self.__get_span_index()
+        if _find_spans(index, (x, y, z, t)):
+            return False
         # Check boundaries and empty cells : need to crate non existent cells
         # so don't use get_cells directly, but get_cell
         cells = []
@@ -3758,15 +4948,6 @@ class odf_table(odf_element):
                 row_cells.append(self.get_cell((xx, yy),
                                         clone = True, keep_repeated = False))
             cells.append(row_cells)
-        for row in cells:
-            for cell in row:
-                if cell._is_spanned():
-                    good = False
-                    break
-            if not good:
-                break
-        if not good:
-            return False
         # Check boundaries
         #if z >= self.get_width() or t >= self.get_height():
         #    self.set_cell(coord = end)
@@ -3804,6 +4985,9 @@ class odf_table(odf_element):
                 cell._set_tag_raw('table:covered-table-cell')
         # replace cells in table
         self.set_cells(cells, coord = start, clone = False)
+        # the changes of cells dropped the index, it is still valid
+        _add_span(index, (x, y, z, t))
+        self._indexes['_spans'] = index
         return True
 
 
@@ -3828,20 +5012,20 @@ class odf_table(odf_element):
             x, y = digits
         start = x, y
         # check for previous span
-        cell0 = self.get_cell(start)
-        try:
-            nb_cols = int(cell0.get_attribute('table:number-columns-spanned'))
-        except (TypeError, ValueError):
-            return False
-        try:
-            nb_rows = int(cell0.get_attribute('table:number-rows-spanned'))
-        except (TypeError, ValueError):
+        index = self.__get_span_index()
+        for span in _find_spans(index, (x, y, x, y)):
+            if span[:2] == start:
+                break
+        else:
             return False
-        z = x + nb_cols - 1
-        t = y + nb_rows - 1
+        z, t = span[2:]
         cells = self.get_cells((x,y,z,t))
-        cells[0][0].del_attribute('table:number-columns-spanned')
-        cells[0][0].del_attribute('table:number-rows-spanned')
+        for name in ('table:number-columns-spanned',
+                     'table:number-rows-spanned'):
+            try:
+                cells[0][0].del_attribute(name)
+            except KeyError:
+                pass
         for cell in cells[0][1:]:
             cell._set_tag_raw('table:table-cell')
         for row in cells[1:]:
@@ -3849,20 +5033,102 @@ class odf_table(odf_element):
                 cell._set_tag_raw('table:table-cell')
         # replace cells in table
         self.set_cells(cells, coord = start, clone = False)
+        _remove_span(index, span)
+        self._indexes['_spans'] = index
         return True
 
 
+    def __get_span_index(self):
+        """Return the index of the cell spans, built at the first call after
+        a change of the table: a dict of the areas (x, y, z, t) spanned by
+        a cell, by row.
+        """
+        index = self._indexes['_spans']
+        if index is not None:
+            return index
+        index = {}
+        for y, _, row in self._iter_row_spans():
+            if not row.get_elements(_xpath_spanning_cell):
+                continue
+            for x, _, cell in row._iter_cell_spans():
+                columns = cell.get_attribute('table:number-columns-spanned')
+                rows = cell.get_attribute('table:number-rows-spanned')
+                if columns is None and rows is None:
+                    continue
+                columns = int(columns or 1)
+                rows = int(rows or 1)
+                if columns > 1 or rows > 1:
+                    _add_span(index, (x, y, x + columns - 1, y + rows - 1))
+        self._indexes['_spans'] = index
+        return index
+
+
+    def get_span_at(self, coord):
+        """Return the area of the cell span covering the cell at the given
+        coordinates, as a tuple (x, y, z, t), or None if the cell is not
+        spanned. The upper left cell of the area is the spanning cell, the
+        others are covered cells.
+
+        Arguments:
+
+            coord -- (int, int) or str
+
+        Return: tuple of int or None
+        """
+        x, y = self._translate_cell_coordinates(coord)
+        spans = _find_spans(self.__get_span_index(), (x, y, x, y))
+        if spans:
+            return spans[0]
+        return None
+
+
     #
     # Utilities
     #
 
-    def to_csv(self, path_or_file=None, delimiter=',', quotechar='"',
-            lineterminator='\n', encoding='utf-8'):
+    def get_view(self, coord=None):
+        """Return a read-only view of the table, or of the area given by
+        "coord". Nothing is copied: the view reads the rows and cells of the
+        table through its cache, so the table must not be modified while the
+        view is in use. See ``odf_table_view``.
+
+        Arguments:
+
+            coord -- str or tuple of int : coordinates of area
+
+        Return: odf_table_view
+        """
+        if coord:
+            x, y, z, t = self._translate_table_coordinates(coord)
+        else:
+            x = y = z = t = None
+        width, height = self.get_width(), self.get_height()
+        for row in self._get_rows():
+            width = max(width, row.get_width())
+        x = x or 0
+        y = y or 0
+        if z is None or z >= width:
+            z = width - 1
+        if t is None or t >= height:
+            t = height - 1
+        return odf_table_view(self, (x, y, z, t))
+
+
+    def to_csv(self, path_or_file=None, delimiter=None, quotechar=None,
+            lineterminator=None, encoding='utf-8', trim=False, dialect=None,
+            quoting=None):
         """
         Write the table as CSV in the file. If the file is a string, it is
         opened as a local path. Else a open file-like is expected; it will not
         be closed afterwards.
 
+        By default, fields are separated by commas and all quoted with double
+        quotes, lines end with "\\n". A dialect of the csv module can be
+        given instead, the other arguments overriding it.
+
+        If trim is True, the empty rows and columns at the end are not
+        written, without modifying the table like rstrip does.
+
         Arguments:
 
             path_or_file -- str or file-like
@@ -3874,7 +5140,31 @@ class odf_table(odf_element):
             lineterminator -- str
 
             encoding -- str
+
+            trim -- boolean
+
+            dialect -- str or csv.Dialect
+
+            quoting -- csv.QUOTE_ALL, QUOTE_MINIMAL, QUOTE_NONNUMERIC or
+                       QUOTE_NONE
         """
+        if dialect is None:
+            dialect = 'excel'
+            if delimiter is None:
+                delimiter = ','
+            if quotechar is None:
+                quotechar = '"'
+            if lineterminator is None:
+                lineterminator = '\n'
+            if quoting is None:
+                quoting = QUOTE_ALL
+        formats = {}
+        for key, value in (('delimiter', delimiter),
+                           ('quotechar', quotechar),
+                           ('lineterminator', lineterminator),
+                           ('quoting', quoting)):
+            if value is not None:
+                formats[key] = value
         close_after = False
         # In-memory
         if path_or_file is None:
@@ -3886,25 +5176,388 @@ class odf_table(odf_element):
         # Open file
         else:
             file = path_or_file
-        quoted = quotechar * 2
-        for values in self.iter_values():
-            line = []
-            for value in values:
-                # Also testing lxml.etree._ElementUnicodeResult
-                if type(value) is unicode:
-                    value = value.encode(encoding)
-                if type(value) is str:
-                    value = value.strip()
-                value = '' if value is None else str(value)
-                value = value.replace(quotechar, quoted)
-                line.append(quotechar + value + quotechar)
-            file.write(delimiter.join(line) + lineterminator)
+        csv = writer(file, dialect, **formats)
+        csv.writerows(self.__iter_csv_lines(encoding, trim))
+        if path_or_file is None:
+            return file.getvalue()
+        if close_after:
+            file.close()
+
+
+    def to_rst(self, path_or_file=None, context=None, plain=False,
+               encoding='utf-8'):
+        """Write the table as a reStructuredText simple table in the file, as
+        get_formatted_text does in rst mode, each row being written once
+        made. If the file is a string, it is opened as a local path. Else a
+        open file-like is expected; it will not be closed afterwards.
+
+        The context of get_formatted_text collects the notes and images of
+        the cells; a new one is used by default.
+
+        If plain is True, the cells are not wrapped to keep the lines short:
+        each cell holds on one line, for programs to read the table faster.
+
+        Arguments:
+
+            path_or_file -- str or file-like
+
+            context -- dict
+
+            plain -- boolean
+
+            encoding -- str
+
+        Return: str if no file is given
+        """
+        if context is None:
+            context = {'document': None,
+                       'footnotes': [],
+                       'endnotes': [],
+                       'annotations': [],
+                       'rst_mode': True,
+                       'img_counter': 0,
+                       'images': [],
+                       'no_img_level': 0}
+        close_after = False
+        # In-memory
+        if path_or_file is None:
+            file = StringIO()
+        # Path
+        elif type(path_or_file) is str or type(path_or_file) is unicode:
+            file = open(path_or_file, 'wb')
+            close_after = True
+        # Open file
+        else:
+            file = path_or_file
+        self.__write_rst(lambda text: file.write(text.encode(encoding)),
+                         context, plain)
         if path_or_file is None:
             return file.getvalue()
         if close_after:
             file.close()
 
 
+    def __iter_csv_lines(self, encoding, trim):
+        for values in self.iter_values(trim=trim):
+            line = []
+            for value in values:
+                # Also testing lxml.etree._ElementUnicodeResult
+                if isinstance(value, unicode):
+                    value = value.encode(encoding).strip()
+                elif isinstance(value, str):
+                    value = value.strip()
+                line.append(value)
+            yield line
+
+
+    def to_sqlite(self, connection, table_name, coord=None, header=True):
+        """Copy the values of the table, or of the area given by "coord", in
+        a new table of the SQLite database. Without coordinates, the empty
+        rows and columns at the end are not copied.
+
+        The SQL type of the columns is inferred from the ODF types of their
+        cells: numbers are INTEGER or REAL, booleans INTEGER, and text, dates
+        and durations TEXT, in ISO format. A column mixing types gets no type.
+
+        Rows are read one at a time and fed to "executemany". The transaction
+        is not committed.
+
+        Arguments:
+
+            connection -- sqlite3.Connection or Cursor
+
+            table_name -- unicode
+
+            coord -- str or tuple of int : coordinates of area
+
+            header -- boolean, True if the first row holds the column names
+        """
+        trim = coord is None
+        rows = self.iter_values(coord=coord, get_type=True, trim=trim)
+        names = None
+        if header:
+            for values in rows:
+                names = [value for value, value_type in values]
+                break
+        # First pass: infer the SQL types
+        sql_types = None
+        for values in rows:
+            if sql_types is None:
+                sql_types = [set() for value in values]
+            for i, (value, value_type) in enumerate(values):
+                if value is None:
+                    continue
+                sql_type = _sqlite_types[value_type]
+                if sql_type == 'REAL' and int(value) == value:
+                    sql_type = 'INTEGER'
+                sql_types[i].add(sql_type)
+        if names is None and sql_types is None:
+            return
+        width = len(names) if names is not None else len(sql_types)
+        if sql_types is None:
+            sql_types = [set() for i in xrange(width)]
+        # Unique column names
+        columns = []
+        for i in xrange(width):
+            name = names[i] if names is not None else None
+            if name is None or unicode(name) in columns:
+                name = _digit_to_alpha(i)
+            columns.append(unicode(name))
+        definitions = []
+        for name, types in zip(columns, sql_types):
+            if types == set(['INTEGER', 'REAL']):
+                types = set(['REAL'])
+            sql_type = types.pop() if len(types) == 1 else u""
+            definitions.append((u"%s %s" % (_sqlite_quote(name),
+                                            sql_type)).strip())
+        connection.execute(u"CREATE TABLE %s (%s)" % (
+            _sqlite_quote(table_name), u", ".join(definitions)))
+        # Second pass: insert the values
+        rows = self.iter_values(coord=coord, trim=trim)
+        if header:
+            for values in rows:
+                break
+        query = u"INSERT INTO %s VALUES (%s)" % (_sqlite_quote(table_name),
+                u", ".join([u"?"] * width))
+        connection.executemany(query, (map(_sqlite_value, values)
+                                       for values in rows))
+
+
+    def __get_columns_values(self, x, y, z, t):
+        """Return the lists of values of the columns from x to z, on the
+        rows from y to t. Cells are neither cloned nor expanded: a value is
+        decoded once for all the repetitions of its cell and row. Numbers are
+        float or int.
+        """
+        columns = [[] for i in xrange(z - x + 1)]
+        for first, last, row in self._iter_row_spans(y, t):
+            repeated = last - first + 1
+            end = x
+            for cell_first, cell_last, cell in row._iter_cell_spans(x, z):
+                values = [cell.get_value(as_float=True)] * repeated
+                for i in xrange(cell_first - x, cell_last - x + 1):
+                    columns[i].extend(values)
+                end = cell_last + 1
+            # The row is shorter than the area
+            for i in xrange(end - x, z - x + 1):
+                columns[i].extend([None] * repeated)
+        for values in columns:
+            values.extend([None] * (t - y + 1 - len(values)))
+        return columns
+
+
+    def to_dataframe(self, coord=None, header=True, index_col=None):
+        """Return the values of the table, or of the area given by "coord",
+        as a pandas DataFrame. Without coordinates, the empty rows and
+        columns at the end are left out. pandas must be installed.
+
+        The values are read by column. Numbers, currencies and percentages
+        become floats or integers, dates datetime64. Missing values are
+        NaN or NaT.
+
+        Arguments:
+
+            coord -- str or tuple of int : coordinates of area
+
+            header -- boolean, True if the first row holds the column names
+
+            index_col -- int or unicode, the column to use as index
+
+        Return: pandas.DataFrame
+        """
+        from pandas import DataFrame
+
+        if coord is None:
+            area = self.__trim_area(0, 0, None, None)
+            if area is None:
+                return DataFrame()
+            x, y, z, t = area
+        else:
+            x, y, z, t = self._translate_table_coordinates(coord)
+            x = x or 0
+            y = y or 0
+            if z is None:
+                z = self.get_width() - 1
+            if t is None:
+                t = self.get_height() - 1
+            if z < x or t < y:
+                return DataFrame()
+        columns = self.__get_columns_values(x, y, z, t)
+        names = []
+        for i, values in enumerate(columns):
+            name = values.pop(0) if header else None
+            if name is None or name in names:
+                name = _digit_to_alpha(x + i)
+            names.append(name)
+        frame = DataFrame(dict(enumerate(columns)),
+                          columns=range(len(columns)))
+        frame.columns = names
+        if index_col is not None:
+            if isinstance(index_col, (int, long)):
+                index_col = names[index_col]
+            frame = frame.set_index(index_col)
+        return frame
+
+
+
+class odf_table_view(object):
+    """Read-only view of an area of a table, given by odf_table.get_view.
+    The cells are read in place, neither cloned nor expanded, so a view is
+    cheap to make and to trim, unlike a clone. Use ``clone`` to get a table
+    to modify.
+    """
+
+    def __init__(self, table, area):
+        self.__table = table
+        self.__area = area
+
+
+    def get_table(self):
+        """Return the table seen.
+
+        Return: odf_table
+        """
+        return self.__table
+
+
+    def get_area(self):
+        """Return the coordinates of the area seen, as (x, y, z, t).
+
+        Return: tuple of int
+        """
+        return self.__area
+
+
+    def get_size(self):
+        """Get the width and height of the area.
+
+        Return: (int, int)
+        """
+        x, y, z, t = self.__area
+        if z < x or t < y:
+            return 0, 0
+        return z - x + 1, t - y + 1
+
+
+    def traverse(self):
+        """Yield the list of the cells of each row of the area. Repetitions
+        are expanded by giving the same cell element, and the same list for
+        a repeated row. The cells are not copies: don't modify them.
+        """
+        x, y, z, t = self.__area
+        width, height = self.get_size()
+        if not width:
+            return
+        empty = None
+        for first, last, row in self.__table._iter_row_spans(y, t):
+            cells = []
+            for cell_first, cell_last, cell in row._iter_cell_spans(x, z):
+                cells.extend([cell] * (cell_last - cell_first + 1))
+            # The row is shorter than the area
+            if len(cells) < width:
+                if empty is None:
+                    empty = odf_create_cell()
+                cells.extend([empty] * (width - len(cells)))
+            for i in xrange(last - first + 1):
+                yield cells
+
+
+    def iter_values(self, cell_type=None, complete=True, get_type=False,
+                    as_float=False):
+        """Iterate through lines of Python values of the area.
+
+        See ``odf_table.get_values``.
+
+        Return: iterator of lists
+        """
+        if self.get_size() == (0, 0):
+            return iter(())
+        return self.__table.iter_values(coord=self.__area,
+                cell_type=cell_type, complete=complete, get_type=get_type,
+                as_float=as_float)
+
+
+    def get_values(self, cell_type=None, complete=True, get_type=False,
+                   as_float=False):
+        """Get the list of lists of Python values of the area.
+
+        See ``odf_table.get_values``.
+
+        Return: list of lists
+        """
+        return list(self.iter_values(cell_type=cell_type, complete=complete,
+                get_type=get_type, as_float=as_float))
+
+
+    def rstrip(self, aggressive=False):
+        """Return the view without the empty rows below and the empty cells
+        at the right of the area, as ``odf_table.rstrip`` would leave them,
+        without changing the table.
+
+        Arguments:
+
+            aggressive -- bool
+
+        Return: odf_table_view
+        """
+        x, y, z, t = self.__area
+        width = height = 0
+        if self.get_size() != (0, 0):
+            for first, last, row in self.__table._iter_row_spans(y, t):
+                spans = list(row._iter_cell_spans(x, z))
+                for cell_first, cell_last, cell in reversed(spans):
+                    if not cell.is_empty(aggressive=aggressive):
+                        height = last - y + 1
+                        width = max(width, cell_last - x + 1)
+                        break
+        return odf_table_view(self.__table,
+                              (x, y, x + width - 1, y + height - 1))
+
+
+    def clone(self):
+        """Return a new table with a copy of the area only, with the
+        attributes of the table, and the columns and rows of the area.
+
+        Repetitions are copied as they are, not expanded, and nothing outside
+        the area is copied. But the cells of the area are copied: lxml
+        elements cannot belong to two trees, so the new table cannot share
+        them with the table. A large area costs as much as cloning it.
+
+        Return: odf_table
+        """
+        table = self.__table
+        x, y, z, t = self.__area
+        copy = odf_create_element('table:table', ([], []))
+        for name, value in table.get_attributes().iteritems():
+            copy.set_attribute(name, value)
+        if self.get_size() == (0, 0):
+            return copy
+        columns = table._get_columns()
+        new_columns = []
+        for idx, first, last in _iter_map_spans(table._cmap, x, z):
+            column = columns[idx].clone()
+            column._set_repeated(last - first + 1)
+            new_columns.append(column)
+        copy.extend(new_columns)
+        copy._compute_table_cache()
+        rows = []
+        for first, last, row in table._iter_row_spans(y, t):
+            # Copy the attributes of the row and the cells of the area only
+            new_row = odf_create_row()
+            for name, value in row.get_attributes().iteritems():
+                new_row.set_attribute(name, value)
+            cells = []
+            for cell_first, cell_last, cell in row._iter_cell_spans(x, z):
+                cell = cell.clone()
+                cell._set_repeated(cell_last - cell_first + 1)
+                cells.append(cell)
+            new_row.extend_cells(cells)
+            new_row._set_repeated(last - first + 1)
+            rows.append(new_row)
+        copy.extend_rows(rows)
+        return copy
+
+
 
 class odf_named_range(odf_element):
     """ODF Named Range. Identifies inside the spreadsheet a range of cells of a
@@ -4081,15 +5734,22 @@ class odf_named_range(odf_element):
                                     self.end[1] + 1)
 
 
+    def _get_table(self):
+        """Return the table of the named range, resolved through the registry
+        of the body.
+        """
+        body = self.get_document_body()
+        if not body:
+            raise ValueError, "Table is not inside a document."
+        return body._get_named_range_registry().get_table(self.table_name)
+
+
     def get_values(self, cell_type=None, complete=True,
                    get_type=False, flat=False):
         """Shortcut to retrieve the values of the cells of the named range. See
         table.get_values() for the arguments description and return format.
         """
-        body = self.get_document_body()
-        if not body:
-            raise ValueError, "Table is not inside a document."
-        table = body.get_table(name = self.table_name)
+        table = self._get_table()
         return table.get_values(self.crange, cell_type, complete,
                    get_type, flat)
 
@@ -4098,10 +5758,7 @@ class odf_named_range(odf_element):
         """Shortcut to retrieve the value of the first cell of the named range.
         See table.get_value() for the arguments description and return format.
         """
-        body = self.get_document_body()
-        if not body:
-            raise ValueError, "Table is not inside a document."
-        table = body.get_table(name = self.table_name)
+        table = self._get_table()
         return table.get_value(self.start, get_type)
 
 
@@ -4110,10 +5767,7 @@ class odf_named_range(odf_element):
         """Shortcut to set the values of the cells of the named range.
         See table.set_values() for the arguments description.
         """
-        body = self.get_document_body()
-        if not body:
-            raise ValueError, "Table is not inside a document."
-        table = body.get_table(name = self.table_name)
+        table = self._get_table()
         return table.set_values(values, coord=self.crange, style=style,
                    cell_type=cell_type, currency=currency)
 
@@ -4123,25 +5777,98 @@ class odf_named_range(odf_element):
         """Shortcut to set the value of the first cell of the named range.
         See table.set_value() for the arguments description.
         """
-        body = self.get_document_body()
-        if not body:
-            raise ValueError, "Table is not inside a document."
-        table = body.get_table(name = self.table_name)
+        table = self._get_table()
         return table.set_value(coord=self.start, value=value,
                                cell_type=cell_type,
                                currency=currency, style=style)
 
 
 
+_diff_kinds = ('value', 'type', 'formula', 'style')
+
+
+
+_sqlite_types = {'float': 'REAL', 'percentage': 'REAL', 'currency': 'REAL',
+                 'boolean': 'INTEGER', 'date': 'TEXT', 'time': 'TEXT',
+                 'string': 'TEXT'}
+
+
+
+def _sqlite_quote(name):
+    """Quote the identifier for SQLite.
+    """
+    return u'"%s"' % unicode(name).replace(u'"', u'""')
+
+
+
+def _sqlite_value(value):
+    """Convert the Python value of a cell to a value SQLite accepts.
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return DateTime.encode(value)
+    if isinstance(value, date):
+        return Date.encode(value)
+    if isinstance(value, timedelta):
+        return Duration.encode(value)
+    return value
+
+
+
+def _make_row_from_values(values):
+    """Make a row of typed cells, consecutive empty values being merged in
+    a repeated cell.
+    """
+    row = odf_create_row()
+    empty = 0
+    for value in values:
+        if value is None or isinstance(value, buffer):
+            empty += 1
+            continue
+        if empty:
+            row.append_cell(odf_create_cell(repeated=empty), clone=False)
+            empty = 0
+        row.append_cell(odf_create_cell(value), clone=False)
+    if empty:
+        row.append_cell(odf_create_cell(repeated=empty), clone=False)
+    return row
+
+
+
+def _iter_csv_lines(file, size=65536):
+    """Yield the lines of the file, ending with "\\n", "\\r" or "\\r\\n"
+    as str.splitlines(True) cuts them, reading the file by chunks.
+    """
+    rest = ''
+    while True:
+        data = file.read(size)
+        if not data:
+            break
+        # The last line may go on, or end with "\r" before a "\n"
+        lines = (rest + data).splitlines(True)
+        rest = lines.pop()
+        for line in lines:
+            yield line
+    if rest:
+        yield rest
+
+
+
 def import_from_csv(path_or_file, name, style=None, delimiter=None,
         quotechar=None, lineterminator=None, encoding='utf-8'):
     """Convert the CSV file to an odf_table. If the file is a string, it is
-    opened as a local path. Else a open file-like is expected; it will not be
-    closed afterwards.
+    opened as a local path. Else a open file-like is expected; it will not
+    be closed afterwards.
 
     CSV format can be autodetected to a certain limit, but encoding is
     important.
 
+    The file is read line by line. The type of each column is guessed from
+    the first lines, and the values not fitting it are guessed one by one.
+    So a column of numbers with decimals gives floats only. The values of a
+    column of text in the first lines are all guessed one by one.
+
     Arguments:
 
       path_or_file -- str or file-like
@@ -4158,43 +5885,573 @@ def import_from_csv(path_or_file, name, style=None, delimiter=None,
 
       encoding -- str
     """
-
-    # Load the data
-    # XXX Load the entire file in memory
-    # Alternative: a file-wrapper returning the sample then the rest
     if type(path_or_file) is str:
         file = open(path_or_file, 'rb')
-        data = file.read().splitlines(True)
-        file.close()
     else:
         # Leave the file we were given open
-        data = path_or_file.read().splitlines(True)
-    # Sniff the dialect
-    sample = ''.join(data[:100])
-    dialect = Sniffer().sniff(sample)
-    # We can overload the result
-    if delimiter is not None:
-        dialect.delimiter = delimiter
-    if quotechar is not None:
-        dialect.quotechar = quotechar
-    if lineterminator is not None:
-        dialect.lineterminator = lineterminator
-    # Make the rows
-    csv = reader(data, dialect)
+        file = path_or_file
+    try:
+        # Sniff the dialect from the first lines only
+        lines = _iter_csv_lines(file)
+        sample = []
+        for line in lines:
+            sample.append(line)
+            if len(sample) == _CSV_SAMPLE_LINES:
+                break
+        dialect = Sniffer().sniff(''.join(sample))
+        # We can overload the result
+        if delimiter is not None:
+            dialect.delimiter = delimiter
+        if quotechar is not None:
+            dialect.quotechar = quotechar
+        if lineterminator is not None:
+            dialect.lineterminator = lineterminator
+        table = odf_create_table(name, style=style)
+        lines = reader(chain(sample, lines), dialect)
+        # Guess the column types from the sample, the first line is likely
+        # a header
+        head = [[unicode(value, encoding) for value in line]
+                for line in islice(reader(sample, dialect), 1, None)]
+        if not head:
+            head = [[unicode(value, encoding) for value in line]
+                    for line in reader(sample, dialect)]
+        decoders = []
+        for values in head:
+            for x, value in enumerate(values):
+                if not value:
+                    continue
+                decoder = _get_python_type(value)
+                if decoder is None:
+                    # Text: guess each value
+                    decoder = _get_python_value
+                if x >= len(decoders):
+                    decoders.extend([False] * (x + 1 - len(decoders)))
+                if decoders[x] is False:
+                    decoders[x] = decoder
+                elif set([decoders[x], decoder]) == set([int, float]):
+                    decoders[x] = float
+                elif decoders[x] is not decoder:
+                    # Mixed types: guess each value
+                    decoders[x] = _get_python_value
+        # Make the rows
+        width = 0
+        rows = []
+        for line in lines:
+            # rstrip line
+            while line and not line[-1].strip():
+                line.pop()
+            cells = []
+            for x, value in enumerate(line):
+                decoder = decoders[x] if x < len(decoders) else False
+                if not value:
+                    value = unicode(value, encoding)
+                elif decoder is False or decoder is _get_python_value:
+                    value = _get_python_value(value, encoding)
+                else:
+                    try:
+                        value = decoder(unicode(value, encoding))
+                    except ValueError:
+                        value = _get_python_value(value, encoding)
+                cells.append(odf_create_cell(value))
+            row = odf_create_row()
+            row.extend(cells)
+            rows.append(row)
+            width = max(width, len(cells))
+            if len(rows) == _CSV_CHUNK_ROWS:
+                table.extend(rows)
+                rows = []
+        table.extend(rows)
+    finally:
+        if file is not path_or_file:
+            file.close()
+    if width:
+        table.insert(odf_create_column(repeated=width), position=0)
+    table._compute_table_cache()
+    return table
+
+
+
+def _get_row_runs(table):
+    """Return the list of (key, first y, last y, row) for the row elements of
+    the table, the key being a digest of the row and its repetition.
+    """
+    runs = []
+    for first, last, row in table._iter_row_spans():
+        runs.append((md5(row.serialize()).digest(), first, last, row))
+    return runs
+
+
+
+def _iter_run_rows(runs):
+    for key, first, last, row in runs:
+        for y in xrange(first, last + 1):
+            yield y, row
+
+
+
+def _get_cell_state(cell):
+    if cell is None:
+        return (None, None, None, None)
+    return (cell.get_value(), cell.get_type(), cell.get_formula(),
+            cell.get_style())
+
+
+
+def _diff_rows(row1, y1, row2, y2, changes):
+    """Append to the changes the differences between the two rows, cell by
+    cell. Repeated cells are compared once for each overlapping run.
+    """
+    style1 = row1.get_style()
+    style2 = row2.get_style()
+    if style1 != style2:
+        changes.append(('row-style', (None, y1), (None, y2), style1, style2))
+    spans1 = [(first, last, _get_cell_state(cell))
+              for first, last, cell in row1._iter_cell_spans()]
+    spans2 = [(first, last, _get_cell_state(cell))
+              for first, last, cell in row2._iter_cell_spans()]
+    empty = _get_cell_state(None)
+    width = max(row1.get_width(), row2.get_width())
+    i = j = x = 0
+    while x < width:
+        if i < len(spans1):
+            end1, state1 = spans1[i][1], spans1[i][2]
+        else:
+            end1, state1 = width - 1, empty
+        if j < len(spans2):
+            end2, state2 = spans2[j][1], spans2[j][2]
+        else:
+            end2, state2 = width - 1, empty
+        end = min(end1, end2)
+        if state1 != state2:
+            for kind, old, new in zip(_diff_kinds, state1, state2):
+                if old == new:
+                    continue
+                for position in xrange(x, end + 1):
+                    changes.append((kind, (position, y1), (position, y2),
+                                    old, new))
+        x = end + 1
+        if end1 < x:
+            i += 1
+        if end2 < x:
+            j += 1
+
+
+
+def diff_tables(table1, table2):
+    """Compare the two tables cell by cell. Rows are aligned on a digest of
+    their content, a repeated row counting once, so unchanged regions are
+    skipped cheaply. Aligned rows that differ are compared cell by cell.
+
+    Return the list of changes as (kind, old position, new position, old,
+    new) tuples, where positions are (x, y) tuples starting from 0, and kind
+    is one of:
+
+        'value', 'type', 'formula', 'style' -- the given attribute of the
+            cell changed
+
+        'row-style' -- the style of the row changed, x is None
+
+        'row-deleted' -- the row was removed, x is None and new position
+            is None
+
+        'row-inserted' -- the row was added, x is None and old position is
+            None
+
+    Arguments:
+
+        table1 -- odf_table
+
+        table2 -- odf_table
+
+    Return: list of tuples
+    """
+    runs1 = _get_row_runs(table1)
+    runs2 = _get_row_runs(table2)
+    # Skip the common head and tail before matching the rest
+    head = 0
+    size = min(len(runs1), len(runs2))
+    while head < size and runs1[head][0] == runs2[head][0]:
+        head += 1
+    tail = 0
+    while (tail < size - head
+           and runs1[-1 - tail][0] == runs2[-1 - tail][0]):
+        tail += 1
+    runs1 = runs1[head:len(runs1) - tail]
+    runs2 = runs2[head:len(runs2) - tail]
+    changes = []
+    matcher = SequenceMatcher(None, [run[0] for run in runs1],
+                              [run[0] for run in runs2], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        rows1 = _iter_run_rows(runs1[i1:i2])
+        rows2 = _iter_run_rows(runs2[j1:j2])
+        for old, new in izip_longest(rows1, rows2):
+            if new is None:
+                changes.append(('row-deleted', (None, old[0]), None, None,
+                                None))
+            elif old is None:
+                changes.append(('row-inserted', None, (None, new[0]), None,
+                                None))
+            else:
+                _diff_rows(old[1], old[0], new[1], new[0], changes)
+    return changes
+
+
+
+def _clark_name(qname):
+    prefix, name = qname.split(':')
+    return '{%s}%s' % (ODF_NAMESPACES[prefix], name)
+
+
+
+# Names of the elements and attributes built by import_from_records
+_row_tag = _clark_name('table:table-row')
+_cell_tag = _clark_name('table:table-cell')
+_paragraph_tag = _clark_name('text:p')
+_style_name = _clark_name('table:style-name')
+_record_names = dict((qname, _clark_name(qname)) for qname in (
+    'office:value-type', 'office:boolean-value', 'office:value',
+    'office:currency', 'office:date-value', 'office:string-value',
+    'office:time-value'))
+_record_value_names = {
+    'boolean': _record_names['office:boolean-value'],
+    'currency': _record_names['office:value'],
+    'date': _record_names['office:date-value'],
+    'float': _record_names['office:value'],
+    'percentage': _record_names['office:value'],
+    'string': _record_names['office:string-value'],
+    'time': _record_names['office:time-value']}
+
+# Built by set_cell_images
+_repeated_name = _clark_name('table:number-columns-repeated')
+
+
+
+def _make_empty_cell(cell=None):
+    """Return a new cell of the attributes of the given cell, if any, but
+    not repeated and without content, not copying the content as a clone
+    would.
+    """
+    root = Element('ROOT', nsmap=ODF_NAMESPACES)
+    if cell is None:
+        return odf_cell(SubElement(root, _cell_tag))
+    native = SubElement(root, _cell_tag, cell._get_native().attrib)
+    native.attrib.pop(_repeated_name, None)
+    return odf_cell(native)
+
+
+
+def _encode_record_number(value):
+    return str(value), unicode(value)
+
+
+
+def _encode_record_percentage(value):
+    return str(value), u"%d %%" % int(value * 100)
+
+
+
+def _encode_record_boolean(value):
+    return Boolean.encode(value), (u"true" if value else u"false")
+
+
+
+def _encode_record_date(value):
+    if type(value) is datetime:
+        value = DateTime.encode(value)
+    else:
+        value = Date.encode(value)
+    return value, unicode(value)
+
+
+
+def _encode_record_duration(value):
+    value = Duration.encode(value)
+    return value, unicode(value)
+
+
+
+def _encode_record_text(value):
+    return value, unicode(value)
+
+
+
+# Encoders of the typed columns to (attribute value, displayed text)
+_record_encoders = {
+    'boolean': _encode_record_boolean,
+    'currency': _encode_record_number,
+    'date': _encode_record_date,
+    'float': _encode_record_number,
+    'percentage': _encode_record_percentage,
+    'string': _encode_record_text,
+    'time': _encode_record_duration}
+
+
+
+def _prepare_record_column(spec):
+    """Return the attributes shared by the cells of the column, the name of
+    the value attribute, the encoder and the format, the name and encoder
+    being None to guess the type of each value.
+    """
+    attributes = {}
+    style = spec.get('style')
+    if style is not None:
+        attributes[_style_name] = style
+    cell_type = spec.get('type')
+    if cell_type is None:
+        return attributes, None, None, spec.get('format')
+    if cell_type not in _record_encoders:
+        raise ValueError, 'unknown cell type "%s"' % cell_type
+    attributes[_record_names['office:value-type']] = cell_type
+    if cell_type == 'currency':
+        currency = spec.get('currency')
+        if currency is None:
+            raise ValueError, 'currency required for a "currency" column'
+        attributes[_record_names['office:currency']] = currency
+    return (attributes, _record_value_names[cell_type],
+            _record_encoders[cell_type], spec.get('format'))
+
+
+
+def import_from_records(records, name, columns, header=False, style=None):
+    """Build an odf_table from an iterable of records, i.e. sequences of
+    Python values in the order of the columns. Each column is described by
+    a dict with the optional keys:
+
+      'name' -- unicode, the title of the column for the header
+
+      'type' -- 'boolean', 'currency', 'date', 'float', 'percentage',
+                'string' or 'time', guessed from each value if missing
+
+      'currency' -- three-letter str, required for the 'currency' type
+
+      'style' -- unicode, the style of the cells
+
+      'format' -- unicode, the displayed text is format % value
+
+    The cells are built straight with lxml from the attributes prepared
+    for each column, a lot faster than with odf_create_cell. None values
+    give empty cells, with the style of the column.
+
+    Arguments:
+
+      records -- iterable of sequences
+
+      name -- unicode
+
+      columns -- list of dict
+
+      header -- boolean, True to write the names of the columns first
+
+      style -- str
+
+    Return: odf_table
+    """
+    prepared = [_prepare_record_column(spec) for spec in columns]
+    empty_attributes = [attributes.get(_style_name) for attributes, _, _, _
+                         in prepared]
+    empty_attributes = [{_style_name: cell_style} if cell_style else {}
+                        for cell_style in empty_attributes]
     table = odf_create_table(name, style=style)
-    for line in csv:
-        row = odf_create_row()
-        # rstrip line
-        while line and not line[-1].strip():
-            line.pop()
-        for value in line:
-            cell = odf_create_cell(_get_python_value(value, encoding))
-            row.append_cell(cell, clone=False)
-        table.append_row(row, clone=False)
+    native = table._get_native()
+    if header:
+        string_attributes = {_record_names['office:value-type']: 'string'}
+        row = SubElement(native, _row_tag)
+        for spec in columns:
+            title = spec.get('name')
+            if title is None:
+                SubElement(row, _cell_tag)
+                continue
+            string_attributes[_record_names['office:string-value']] = title
+            cell = SubElement(row, _cell_tag, string_attributes)
+            SubElement(cell, _paragraph_tag).text = title
+    value_type_name = _record_names['office:value-type']
+    for record in records:
+        row = SubElement(native, _row_tag)
+        for value, column, empty in izip(record, prepared, empty_attributes):
+            if value is None:
+                SubElement(row, _cell_tag, empty)
+                continue
+            attributes, value_name, encoder, format = column
+            if encoder is None:
+                pairs, text = _encode_value_and_type(value)
+                attributes = attributes.copy()
+                for qname, encoded in pairs:
+                    attributes[_record_names[qname]] = encoded
+            else:
+                attributes[value_name], text = encoder(value)
+            if format is not None:
+                text = format % value
+            cell = SubElement(row, _cell_tag, attributes)
+            SubElement(cell, _paragraph_tag).text = text
+    if columns:
+        table.insert(odf_create_column(repeated=len(columns)), position=0)
+    table._compute_table_cache()
     return table
 
 
 
+def import_from_dataframe(frame, name, styles=None, index=False,
+                          style=None):
+    """Convert a pandas DataFrame to an odf_table, the names of the columns
+    in the first row. The cells are built by import_from_records, typed by
+    the dtypes of the columns: numbers are floats, datetime64 dates and bool
+    booleans, the type of the other values is guessed. NaN, NaT and None
+    give empty cells.
+
+    Arguments:
+
+      frame -- pandas.DataFrame
+
+      name -- unicode
+
+      styles -- dict, the cell style of the columns by column name
+
+      index -- boolean, True to write the index as first column
+
+      style -- str
+
+    Return: odf_table
+    """
+    from pandas import isnull
+
+    if index:
+        frame = frame.reset_index()
+    if styles is None:
+        styles = {}
+    columns = []
+    values = []
+    for column_name in frame.columns:
+        series = frame[column_name]
+        spec = {'name': unicode(column_name)}
+        kind = series.dtype.kind
+        if kind in 'iuf':
+            spec['type'] = 'float'
+        elif kind == 'b':
+            spec['type'] = 'boolean'
+        elif kind == 'M':
+            spec['type'] = 'date'
+        if column_name in styles:
+            spec['style'] = styles[column_name]
+        columns.append(spec)
+        column_values = series.tolist()
+        for i, value in enumerate(column_values):
+            if isnull(value):
+                column_values[i] = None
+            elif kind == 'M':
+                column_values[i] = value.to_pydatetime()
+        values.append(column_values)
+    return import_from_records(izip(*values), name, columns, header=True,
+                               style=style)
+
+
+
+def import_from_sqlite(cursor_or_query, name, connection=None,
+        parameters=(), header=True, style=None):
+    """Convert the result of the SQL query to an odf_table. A cursor on which
+    the query was executed can be given instead of the query, with no need
+    of the connection.
+
+    Numbers, text and, if the connection converts them, dates become typed
+    cells. NULL values and BLOBs become empty cells, merged as repeated
+    cells.
+
+    Arguments:
+
+      cursor_or_query -- sqlite3.Cursor or unicode
+
+      name -- unicode
+
+      connection -- sqlite3.Connection, required with a query
+
+      parameters -- tuple or dict, the parameters of the query
+
+      header -- boolean, True to write the column names in the first row
+
+      style -- str
+
+    Return: odf_table
+    """
+    if isinstance(cursor_or_query, basestring):
+        if connection is None:
+            raise ValueError, "connection required to execute the query"
+        cursor = connection.execute(cursor_or_query, parameters)
+    else:
+        cursor = cursor_or_query
+    table = odf_create_table(name, style=style)
+    rows = []
+    if header and cursor.description is not None:
+        names = [description[0] for description in cursor.description]
+        rows.append(_make_row_from_values(names))
+    rows.extend(_make_row_from_values(values) for values in cursor)
+    table.extend_rows(rows)
+    return table
+
+
+
+def _map_table(job):
+    """Run in a worker process: parse the table and call the function.
+    """
+    data, function, args, kwargs = job
+    table = odf_create_element(data)
+    if isinstance(function, basestring):
+        return getattr(table, function)(*args, **kwargs)
+    return function(table, *args, **kwargs)
+
+
+
+def map_tables(tables, function, args=(), kwargs=None, processes=None):
+    """Call the function on each table across a pool of processes and
+    return the list of the results, in the order of the tables. The
+    function is either the name of an odf_table method, e.g. "get_values"
+    or "to_csv", or a function defined at the top of a module, called with
+    the table as first argument.
+
+    Each worker parses only the XML of its table. The arguments and the
+    results are pickled between processes: return values, text or any
+    other Python object, not elements. Changes to the tables are lost,
+    unless a single process is used, where the function is called on the
+    tables given.
+
+    Arguments:
+
+      tables -- list of odf_table, e.g. body.get_tables()
+
+      function -- str or function
+
+      args -- tuple, more positional arguments for the function
+
+      kwargs -- dict, keyword arguments for the function
+
+      processes -- int, the number of processes, one per CPU by default
+
+    Return: list
+    """
+    if kwargs is None:
+        kwargs = {}
+    if processes is None:
+        processes = cpu_count()
+    processes = min(processes, len(tables))
+    if processes <= 1:
+        results = []
+        for table in tables:
+            if isinstance(function, basestring):
+                results.append(getattr(table, function)(*args, **kwargs))
+            else:
+                results.append(function(table, *args, **kwargs))
+        return results
+    jobs = [(table.serialize(with_ns=True), function, args, kwargs)
+            for table in tables]
+    pool = Pool(processes)
+    try:
+        return pool.map(_map_table, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+
 # Register
 register_element_class('table:table-cell', odf_cell)
 register_element_class('table:covered-table-cell', odf_cell)
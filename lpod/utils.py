@@ -36,7 +36,7 @@ from sys import _getframe, modules
 from warnings import warn
 
 # Import from lpod
-from datatype import Boolean, Date, DateTime, Duration
+from datatype import Boolean, Date, DateTime, Duration, _decode_date_value
 
 
 CELL_TYPES = ('boolean', 'currency', 'date', 'float', 'percentage', 'string',
@@ -51,6 +51,12 @@ STYLE_FAMILIES = ('paragraph', 'text', 'section', 'table', 'table-column',
 NOTE_CLASSES = ('footnote', 'endnote')
 
 
+# The attributes read by get_value
+_office = '{urn:oasis:names:tc:opendocument:xmlns:office:1.0}'
+_value_attributes = [_office + name for name in ('value-type', 'value',
+    'boolean-value', 'date-value', 'string-value', 'time-value')]
+
+
 # This DPI is computed to have:
 # 640 px (width of your wiki) <==> 17 cm (width of a normal ODT page)
 DPI = 640 * dec('2.54') / 17
@@ -316,23 +322,13 @@ def _get_element(context, element_name, position, **kw):
 
 
 
-def _set_value_and_type(element, value=None, value_type=None, text=None,
+def _encode_value_and_type(value, value_type=None, text=None,
         currency=None):
-    # Remove possible previous value and type
-    for name in ('office:value-type', 'office:boolean-value',
-            'office:value', 'office:date-value', 'office:string-value',
-            'office:time-value', 'table:formula'):
-        try:
-            element.del_attribute('office:currency')
-        except KeyError:
-            pass
-    if value is None:
-        try:
-            element.del_attribute(name)
-        except KeyError:
-            pass
-        element._erase_text_content()
-        return text
+    """Compute the ODF attributes standing for the given Python value, and
+    the text to display, without touching any element.
+
+    Return: (list of (qname, unicode) pairs, unicode or None)
+    """
     if type(value) is bool:
         if value_type is None:
             value_type = 'boolean'
@@ -340,7 +336,7 @@ def _set_value_and_type(element, value=None, value_type=None, text=None,
             text = u'true' if value else u'false'
         value = Boolean.encode(value)
     elif isinstance(value, (int, float, long, dec)):
-        if value_type is 'percentage':
+        if value_type == 'percentage':
             text = "%d %%" % int(value * 100)
         if value_type is None:
             value_type = 'float'
@@ -378,23 +374,49 @@ def _set_value_and_type(element, value=None, value_type=None, text=None,
     elif value is not None:
         raise TypeError, 'type "%s" is unknown' % type(value)
 
+    attributes = []
     if value_type is not None:
-        element.set_attribute('office:value-type', value_type)
+        attributes.append(('office:value-type', value_type))
 
     if value_type == 'boolean':
-        element.set_attribute('office:boolean-value', value)
+        attributes.append(('office:boolean-value', value))
     elif value_type == 'currency':
-        element.set_attribute('office:value', value)
-        element.set_attribute('office:currency', currency)
+        attributes.append(('office:value', value))
+        attributes.append(('office:currency', currency))
     elif value_type == 'date':
-        element.set_attribute('office:date-value', value)
+        attributes.append(('office:date-value', value))
     elif value_type in ('float', 'percentage'):
-        element.set_attribute('office:value', value)
+        attributes.append(('office:value', value))
     elif value_type == 'string':
-        element.set_attribute('office:string-value', value)
+        attributes.append(('office:string-value', value))
     elif value_type == 'time':
-        element.set_attribute('office:time-value', value)
+        attributes.append(('office:time-value', value))
+
+    return attributes, text
+
 
+
+def _set_value_and_type(element, value=None, value_type=None, text=None,
+        currency=None):
+    # Remove possible previous value and type
+    for name in ('office:value-type', 'office:boolean-value',
+            'office:value', 'office:date-value', 'office:string-value',
+            'office:time-value', 'table:formula'):
+        try:
+            element.del_attribute('office:currency')
+        except KeyError:
+            pass
+    if value is None:
+        try:
+            element.del_attribute(name)
+        except KeyError:
+            pass
+        element._erase_text_content()
+        return text
+    attributes, text = _encode_value_and_type(value, value_type=value_type,
+            text=text, currency=currency)
+    for name, value in attributes:
+        element.set_attribute(name, value)
     return text
 
 
@@ -402,18 +424,32 @@ def _set_value_and_type(element, value=None, value_type=None, text=None,
 ######################################################################
 # Public API
 ######################################################################
-def get_value(element, value_type=None, try_get_text=True, get_type=False):
+def get_value(element, value_type=None, try_get_text=True, get_type=False,
+        as_float=False):
     """Only for "with office:value-type" elements, not for meta fields
+
+    The value attributes are read in one pass. If as_float is True, numbers
+    are float instead of Decimal, still int if possible.
     """
+    (_value_type, office_value, boolean_value, date_value, string_value,
+            time_value) = element._get_attribute_values(_value_attributes)
     if value_type is None:
-        value_type = element.get_attribute('office:value-type')
+        value_type = _value_type
     if value_type == 'boolean':
-        value = element.get_attribute('office:boolean-value')
+        value = boolean_value
+        if value is not None:
+            if value in ('true', 'false'):
+                value = Boolean.decode(value)
+            else:
+                value = unicode(value)
         if get_type:
             return (value, value_type)
-        return value  # value is already decoded by get_attribute for booleans
+        return value
     elif value_type in  ('float', 'percentage', 'currency'):
-        value = dec(element.get_attribute('office:value'))
+        if as_float:
+            value = float(office_value)
+        else:
+            value = dec(office_value)
         # Return 3 instead of 3.0 if possible
         if int(value) == value:
             if get_type:
@@ -423,17 +459,12 @@ def get_value(element, value_type=None, try_get_text=True, get_type=False):
                 return (value, value_type)
         return value
     elif value_type == 'date':
-        value = element.get_attribute('office:date-value')
-        if 'T' in value:
-            if get_type:
-                return (DateTime.decode(value), value_type)
-            return DateTime.decode(value)
-        else:
-            if get_type:
-                return (Date.decode(value), value_type)
-            return Date.decode(value)
+        value = _decode_date_value(date_value)
+        if get_type:
+            return (value, value_type)
+        return value
     elif value_type == 'string':
-        value = element.get_attribute('office:string-value')
+        value = string_value
         if value is not None:
             if get_type:
                 return (unicode(value), value_type)
@@ -450,7 +481,7 @@ def get_value(element, value_type=None, try_get_text=True, get_type=False):
             return (None, value_type)
         return None
     elif value_type == 'time':
-        value = Duration.decode(element.get_attribute('office:time-value'))
+        value = Duration.decode(time_value)
         if get_type:
             return (value, value_type)
         return value
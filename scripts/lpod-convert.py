@@ -49,12 +49,12 @@ def spreadsheet_to_text(indoc, outdoc):
     outbody = outdoc.get_body()
     # Copy tables
     for intable in inbody.get_tables():
-        # clone/rstrip the table
-        clone = intable.clone()
-        clone.rstrip(aggressive=True)
+        # Copy the table without the empty rows and columns at the end
+        view = intable.get_view().rstrip(aggressive=True)
         # Skip empty table
-        if clone.get_size() == (0, 0):
+        if view.get_size() == (0, 0):
             continue
+        clone = view.clone()
         # At least OOo Writer doesn't like formulas referencing merged
         # cells, so expand
         outtable = odf_create_table(clone.get_name(),
@@ -101,16 +101,12 @@ def spreadsheet_to_csv(indoc, outdoc):
         return
     table = tables[0]
 
-    # clone/rstrip the table
-    table = table.clone()
-    table.rstrip(aggressive=True)
-
     # Skip empty table
-    if table.get_size() == (0, 0):
+    if table.get_used_size() == (0, 0):
         return
 
-    # And save
-    table.to_csv(outdoc)
+    # And save, without the empty rows and columns at the end
+    table.to_csv(outdoc, trim=True)
 
 
 
@@ -128,12 +124,8 @@ def spreadsheet_to_rst(indoc, outdoc):
 
     # Convert tables
     for table in inbody.get_tables():
-        # clone/rstrip the table
-        table = table.clone()
-        table.rstrip(aggressive=True)
-
         # Skip empty table
-        if table.get_size() == (0, 0):
+        if table.get_view().rstrip(aggressive=True).get_size() == (0, 0):
             continue
 
         name = table.get_name().encode('utf-8')
@@ -141,7 +133,7 @@ def spreadsheet_to_rst(indoc, outdoc):
         outdoc.write('\n')
         outdoc.write('=' * len(name))
         outdoc.write('\n')
-        outdoc.write(table.get_formatted_text(context).encode('utf-8'))
+        table.to_rst(outdoc, context)
         outdoc.write('\n\n')
 
 
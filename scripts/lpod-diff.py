@@ -35,14 +35,58 @@ from os import stat
 # Import from lpod
 from lpod import __version__
 from lpod.document import odf_get_document
+from lpod.table import diff_tables, _digit_to_alpha
+
+
+
+def format_position(position):
+    x, y = position
+    if x is None:
+        return u"row %d" % (y + 1)
+    return u"%s%d" % (_digit_to_alpha(x), y + 1)
+
+
+
+def diff_spreadsheets(doc1, doc2):
+    """Yield the lines describing the changes between the tables of the two
+    spreadsheets, matched by name.
+    """
+    tables1 = doc1.get_body().get_tables()
+    tables2 = doc2.get_body().get_tables()
+    names2 = [table.get_name() for table in tables2]
+    names1 = [table.get_name() for table in tables1]
+    for table in tables1:
+        name = table.get_name()
+        if name not in names2:
+            yield u'- table "%s"\n' % name
+            continue
+        other = tables2[names2.index(name)]
+        changes = diff_tables(table, other)
+        if not changes:
+            continue
+        yield u'@@ table "%s" @@\n' % name
+        for kind, old_position, new_position, old, new in changes:
+            if kind == 'row-deleted':
+                yield u"- %s\n" % format_position(old_position)
+            elif kind == 'row-inserted':
+                yield u"+ %s\n" % format_position(new_position)
+            else:
+                position = format_position(old_position)
+                if new_position != old_position:
+                    position += u" -> %s" % format_position(new_position)
+                yield u"! %s %s: %r -> %r\n" % (position, kind, old, new)
+    for name in names2:
+        if name not in names1:
+            yield u'+ table "%s"\n' % name
 
 
 
 if  __name__ == '__main__':
 
     # Options initialisation
-    usage = "%prog <doc1.odt> <doc2.odt>"
-    description = "Show a diff between doc1.odt and doc2.odt"
+    usage = "%prog <doc1.odt> <doc2.odt>\n       %prog <doc1.ods> <doc2.ods>"
+    description = ("Show a diff between doc1.odt and doc2.odt, or the "
+                   "changes of cells between doc1.ods and doc2.ods")
     parser = OptionParser(usage, version=__version__, description=description)
 
     # --ndiff
@@ -57,25 +101,29 @@ if  __name__ == '__main__':
         parser.print_help()
         exit(1)
 
-    # Open the 2 documents, diff only for ODT
+    # Open the 2 documents, diff only for ODT or ODS
     doc1 = odf_get_document(args[0])
     doc2 = odf_get_document(args[1])
-    if doc1.get_type() != 'text' or doc2.get_type() != 'text':
+    types = (doc1.get_type(), doc2.get_type())
+    if types not in (('text', 'text'), ('spreadsheet', 'spreadsheet')):
         parser.print_help()
         exit(1)
 
-    # Convert in text before the diff
-    text1 = doc1.get_formatted_text(True).splitlines(True)
-    text2 = doc2.get_formatted_text(True).splitlines(True)
-
     # Make the diff !
-    if options.ndiff:
-        result = ndiff(text1, text2, None, None)
-        result = [ line for line in result if not line.startswith(u' ') ]
+    if types[0] == 'spreadsheet':
+        result = diff_spreadsheets(doc1, doc2)
     else:
-        fromdate = ctime(stat(args[0]).st_mtime)
-        todate = ctime(stat(args[1]).st_mtime)
-        result = unified_diff(text1, text2, args[0], args[1], fromdate, todate)
+        # Convert in text before the diff
+        text1 = doc1.get_formatted_text(True).splitlines(True)
+        text2 = doc2.get_formatted_text(True).splitlines(True)
+        if options.ndiff:
+            result = ndiff(text1, text2, None, None)
+            result = [ line for line in result if not line.startswith(u' ') ]
+        else:
+            fromdate = ctime(stat(args[0]).st_mtime)
+            todate = ctime(stat(args[1]).st_mtime)
+            result = unified_diff(text1, text2, args[0], args[1], fromdate,
+                    todate)
     result = u''.join(result)
     encoding = stdout.encoding if stdout.encoding is not None else 'utf-8'
     result = result.encode(encoding)
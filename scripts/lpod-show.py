@@ -85,8 +85,7 @@ def spreadsheet_to_stdout(document):
         encoding = 'utf-8'
     body = document.get_body()
     for table in body.get_tables():
-        table.rstrip(aggressive=True)
-        table.to_csv(stdout, encoding=encoding)
+        table.to_csv(stdout, encoding=encoding, trim=True)
         stdout.write("\n")
     stdout.flush()
 
@@ -98,9 +97,7 @@ def spreadsheet_to_csv(document, target):
         name = table.get_name()
         filename = clean_filename(name) + '.csv'
         csv_file = open(join(target, filename), 'wb')
-
-        table.rstrip(aggressive=True)
-        table.to_csv(csv_file)
+        table.to_csv(csv_file, trim=True)
         csv_file.close()
 
 
@@ -36,6 +36,7 @@ import test_datatype
 import test_document
 import test_draw_page
 import test_element
+import test_formula
 import test_frame
 import test_heading
 import test_image
@@ -48,6 +49,7 @@ import test_reference
 import test_section
 import test_shapes
 import test_span
+import test_streaming
 import test_style
 import test_styles
 import test_table
@@ -65,6 +67,7 @@ test_modules = [test_bookmark,
                 test_document,
                 test_draw_page,
                 test_element,
+                test_formula,
                 test_frame,
                 test_heading,
                 test_image,
@@ -77,6 +80,7 @@ test_modules = [test_bookmark,
                 test_section,
                 test_shapes,
                 test_span,
+                test_streaming,
                 test_style,
                 test_styles,
                 test_table,
@@ -139,6 +139,18 @@ class ContainerTestCase(TestCase):
         self.assert_('<office:document-content' in content)
 
 
+    def test_open_part(self):
+        container = odf_get_container('samples/example.odt')
+        content = container.open_part(ODF_CONTENT).read()
+        self.assertEqual(content, container.get_part(ODF_CONTENT))
+
+
+    def test_open_part_xml(self):
+        container = odf_get_container('samples/example.xml')
+        content = container.open_part('content').read()
+        self.assert_('<office:document-content' in content)
+
+
     def test_get_part_mimetype(self):
         container = odf_get_container('samples/example.odt')
         mimetype = container.get_part('mimetype')
@@ -240,6 +252,17 @@ class ContainerSaveTestCase(TestCase):
         self.assertRaises(ValueError, new_container.get_part, path)
 
 
+    def test_open_part_folder(self):
+        container = odf_get_container('samples/example.odt')
+        container.save('trash/example_f.odt', packaging='folder')
+        new_container = odf_get_container('trash/example_f.odt.folder')
+        data = '<office:document-content/>'
+        new_container.set_part(ODF_CONTENT, data)
+        self.assertEqual(new_container.open_part(ODF_CONTENT).read(), data)
+        new_container.del_part(ODF_CONTENT)
+        self.assertRaises(ValueError, new_container.open_part, ODF_CONTENT)
+
+
 
     # XXX We must implement the flat xml part
     def xtest_save_flat(self):
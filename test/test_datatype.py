@@ -31,6 +31,7 @@ from unittest import TestCase, main
 
 # Import from lpod
 from lpod.datatype import DateTime, Duration, Boolean, Unit
+from lpod.datatype import _decode_date_value
 
 
 class DateTimeTestCase(TestCase):
@@ -47,6 +48,19 @@ class DateTimeTestCase(TestCase):
         self.assertEqual(DateTime.decode(date), expected)
 
 
+    def test_decode_date_value(self):
+        self.assertEqual(_decode_date_value('2009-06-29'),
+                datetime(2009, 6, 29))
+        self.assertEqual(_decode_date_value('2009-06-29T14:33:21'),
+                datetime(2009, 6, 29, 14, 33, 21))
+        self.assertEqual(_decode_date_value('2009-06-29T14:33:21.5Z'),
+                datetime(2009, 6, 29, 14, 33, 21, 500000))
+        # Not the canonical format, still decoded as strptime does
+        self.assertEqual(_decode_date_value('2009-6-29'),
+                datetime(2009, 6, 29))
+        self.assertRaises(ValueError, _decode_date_value, '2009-13-29')
+
+
 
 class DurationTestCase(TestCase):
 
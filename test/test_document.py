@@ -191,6 +191,22 @@ class DocumentTestCase(TestCase):
         self.assertEqual(generator, u"toto")
 
 
+    def test_add_files(self):
+        document = self.document.clone()
+        paths = document.add_files(['samples/image.png',
+                                    'samples/image2.jpg',
+                                    'samples/image.png'])
+        self.assertEqual(paths[:2], ['Pictures/image.png',
+                                     'Pictures/image2.jpg'])
+        self.assertNotEqual(paths[2], paths[0])
+        manifest = document.get_part(ODF_MANIFEST)
+        self.assertEqual(manifest.get_media_type(paths[1]), 'image/jpeg')
+        self.assertEqual(manifest.get_media_type(paths[2]), 'image/png')
+        self.assertEqual(document.get_part(paths[2]),
+                         open('samples/image.png', 'rb').read())
+        self.assertEqual(manifest.get_paths().count('Pictures/'), 1)
+
+
 
 class TestStyle(TestCase):
 
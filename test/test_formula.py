@@ -0,0 +1,159 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2009-2013 Ars Aperta, Itaapy, Pierlis, Talend.
+#
+# This file is part of Lpod (see: http://lpod-project.net).
+# Lpod is free software; you can redistribute it and/or modify it under
+# the terms of either:
+#
+# a) the GNU General Public License as published by the Free Software
+#    Foundation, either version 3 of the License, or (at your option)
+#    any later version.
+#    Lpod is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#    You should have received a copy of the GNU General Public License
+#    along with Lpod.  If not, see <http://www.gnu.org/licenses/>.
+#
+# b) the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+
+# Import from the Standard Library
+from decimal import Decimal
+from unittest import TestCase, main
+
+# Import from lpod
+from lpod.document import odf_new_document
+from lpod.formula import odf_formula_engine, parse_formula
+from lpod.table import odf_create_table, odf_create_cell
+from lpod.table import odf_create_named_range
+
+
+class TestParseFormula(TestCase):
+
+    def test_precedence(self):
+        self.assertEqual(parse_formula(u"of:=1+2*3"),
+                ('op', u'+', ('value', Decimal(1)),
+                    ('op', u'*', ('value', Decimal(2)), ('value', Decimal(3)))))
+
+
+    def test_references(self):
+        self.assertEqual(parse_formula(u"of:=[.B3]"), ('ref', None, 1, 2))
+        self.assertEqual(parse_formula(u"of:=[$'It''s'.$A$1:.B2]"),
+                ('range', u"It's", 0, 0, 1, 1))
+
+
+    def test_oooc(self):
+        self.assertEqual(parse_formula(u"oooc:=SUM([.A1:.A2])"),
+                ('call', 'SUM', [('range', None, 0, 0, 0, 1)]))
+
+
+    def test_unsupported(self):
+        self.assertRaises(ValueError, parse_formula, u"msoxl:=A1")
+        self.assertRaises(ValueError, parse_formula, u"of:=FOO(1)")
+        self.assertRaises(ValueError, parse_formula, u"of:=1+")
+
+
+
+class TestFormulaEngine(TestCase):
+
+    def setUp(self):
+        document = odf_new_document('spreadsheet')
+        body = document.get_body()
+        body.append(odf_create_table(u"Input", width=4, height=4))
+        body.append(odf_create_table(u"Other sheet", width=2, height=2))
+        table = body.get_table(name=u"Input")
+        table.set_values([[1, 2, 3], [4, 5, 6], [u"a", u"b", u"c"]])
+        formulas = {'D1': u"of:=SUM([.A1:.C2])",
+                    'D2': u"of:=[.D1]*2+['Other sheet'.A1]",
+                    'D3': u'of:=IF([.D2]>40;"big";"small")&"!"',
+                    'D4': u"of:=VLOOKUP(4;[.A1:.C2];3;0)"}
+        for coord, formula in formulas.iteritems():
+            table.set_cell(coord, odf_create_cell(formula=formula))
+        other = body.get_table(name=u"Other sheet")
+        other.set_value('A1', 1)
+        other.set_cell('B1', odf_create_cell(formula=u"of:=AVERAGE(Data)"))
+        body.append_named_range(odf_create_named_range(u"Data", 'A1:C1',
+            u"Input"))
+        self.document = document
+        self.table = table
+        self.other = other
+
+
+    def test_recalculate(self):
+        engine = odf_formula_engine(self.document)
+        engine.recalculate()
+        self.assertEqual(self.table.get_column_values(3),
+                [21, 43, u"big!", 6])
+        self.assertEqual(self.other.get_value('B1'), 2)
+        cell = self.table.get_cell('D1')
+        self.assertEqual(cell.get_formula(), u"of:=SUM([.A1:.C2])")
+        self.assertEqual(cell.get_type(), 'float')
+
+
+    def test_set_value(self):
+        engine = odf_formula_engine(self.document)
+        engine.recalculate()
+        updated = engine.set_value(u"Other sheet", 'A1', 10)
+        self.assertEqual(updated, [(u"Input", 3, 1), (u"Input", 3, 2)])
+        self.assertEqual(self.table.get_column_values(3),
+                [21, 52, u"big!", 6])
+
+
+    def test_dependents(self):
+        engine = odf_formula_engine(self.document)
+        self.assertEqual(engine.get_dependents(u"Input", 'B1'),
+                [(u"Input", 3, 0), (u"Input", 3, 1), (u"Input", 3, 2),
+                 (u"Input", 3, 3), (u"Other sheet", 1, 0)])
+        self.assertEqual(engine.get_dependents(u"Input", 'A3'), [])
+
+
+    def test_set_formula(self):
+        engine = odf_formula_engine(self.document)
+        engine.recalculate()
+        engine.set_formula(u"Input", 'A1', u"of:=[.B1]/4")
+        self.assertEqual(self.table.get_value('A1'), Decimal('0.5'))
+        self.assertEqual(self.table.get_value('D1'), 20.5)
+        value = self.other.get_value('B1')
+        self.assertEqual(value.quantize(Decimal('0.0001')), Decimal('1.8333'))
+
+
+    def test_errors(self):
+        engine = odf_formula_engine(self.document)
+        engine.set_formula(u"Input", 'A4', u"of:=[.A1]/0")
+        engine.set_formula(u"Input", 'B4', u"of:=VLOOKUP(7;[.A1:.C2];2;0)")
+        self.assertEqual(self.table.get_value('A4'), u"#DIV/0!")
+        self.assertEqual(self.table.get_value('B4'), u"#N/A")
+
+
+    def test_compare_empty(self):
+        engine = odf_formula_engine(self.document)
+        engine.set_formula(u"Input", 'A4', u'of:=IF([.B4]="";"empty";"full")')
+        engine.set_formula(u"Input", 'C4', u'of:=IF([.B4]=0;"zero";"other")')
+        self.assertEqual(self.table.get_value('A4'), u"empty")
+        self.assertEqual(self.table.get_value('C4'), u"zero")
+
+
+    def test_circular(self):
+        engine = odf_formula_engine(self.document)
+        engine.set_formula(u"Input", 'A4', u"of:=[.B4]+1")
+        engine.set_formula(u"Input", 'B4', u"of:=[.A4]+1")
+        self.assertEqual(self.table.get_value('A4'), u"Err:522")
+        self.assertEqual(self.table.get_value('B4'), u"Err:522")
+
+
+    def test_unsupported(self):
+        self.table.set_cell('C4', odf_create_cell(3, formula=u"of:=FOO()"))
+        engine = odf_formula_engine(self.document)
+        engine.recalculate()
+        self.assertEqual(engine.get_unsupported_cells(), [(u"Input", 2, 3)])
+        self.assertEqual(self.table.get_value('C4'), 3)
+
+
+
+if __name__ == '__main__':
+    main()
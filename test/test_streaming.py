@@ -0,0 +1,206 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2009-2013 Ars Aperta, Itaapy, Pierlis, Talend.
+#
+# This file is part of Lpod (see: http://lpod-project.net).
+# Lpod is free software; you can redistribute it and/or modify it under
+# the terms of either:
+#
+# a) the GNU General Public License as published by the Free Software
+#    Foundation, either version 3 of the License, or (at your option)
+#    any later version.
+#    Lpod is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#    You should have received a copy of the GNU General Public License
+#    along with Lpod.  If not, see <http://www.gnu.org/licenses/>.
+#
+# b) the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+
+
+# Import from the Standard Library
+from cStringIO import StringIO
+from datetime import date
+from unittest import TestCase, main
+from zipfile import ZipFile, ZIP_STORED
+
+# Import from lpod
+from lpod.const import ODF_CONTENT, ODF_MANIFEST
+from lpod.document import odf_get_document
+from lpod.streaming import odf_spreadsheet_writer
+from lpod.table import odf_create_cell, odf_create_column
+
+
+class TestSpreadsheetWriter(TestCase):
+
+    def _read(self, output):
+        output.seek(0)
+        return odf_get_document(output)
+
+
+    def test_append_row(self):
+        output = StringIO()
+        writer = odf_spreadsheet_writer(output)
+        table = writer.add_table(u"Data")
+        table.append_row([1, u"a < b", date(1975, 5, 7), True])
+        table.append_row([2.5, None, None, u"end"])
+        writer.close()
+        table = self._read(output).get_body().get_table(name=u"Data")
+        self.assertEqual(table.get_size(), (4, 2))
+        values = table.get_values()
+        self.assertEqual(values[0][:2], [1, u"a < b"])
+        self.assertEqual(values[0][2].date(), date(1975, 5, 7))
+        self.assertEqual(values[0][3], True)
+        self.assertEqual(values[1], [2.5, None, None, u"end"])
+
+
+    def test_append_row_iterable(self):
+        output = StringIO()
+        writer = odf_spreadsheet_writer(output)
+        table = writer.add_table(u"Data")
+        table.append_row(x * 2 for x in xrange(3))
+        table.extend_rows(iter([xrange(3)]))
+        self.assertEqual(table.width, 3)
+        writer.close()
+        table = self._read(output).get_body().get_table(0)
+        self.assertEqual(table.get_values(), [[0, 2, 4], [0, 1, 2]])
+
+
+    def test_package(self):
+        output = StringIO()
+        writer = odf_spreadsheet_writer(output)
+        writer.add_table(u"Data").append_row([1])
+        writer.close()
+        filezip = ZipFile(output)
+        infos = filezip.infolist()
+        self.assertEqual(infos[0].filename, 'mimetype')
+        self.assertEqual(infos[0].compress_type, ZIP_STORED)
+        self.assertEqual(infos[-1].filename, ODF_MANIFEST)
+        self.assert_(ODF_CONTENT in filezip.namelist())
+
+
+    def test_repeated_empty_cells(self):
+        output = StringIO()
+        writer = odf_spreadsheet_writer(output)
+        writer.add_table(u"Data").append_row([None, None, None, 1])
+        writer.close()
+        table = self._read(output).get_body().get_table(0)
+        row = table.get_row(0)
+        self.assertEqual(len(row.get_elements('table:table-cell')), 2)
+        self.assertEqual(row.get_values(), [None, None, None, 1])
+
+
+    def test_repeated_row_and_cell(self):
+        output = StringIO()
+        writer = odf_spreadsheet_writer(output)
+        table = writer.add_table(u"Data", columns=odf_create_column(
+            style=u"co1", repeated=2))
+        table.append_row([odf_create_cell(u"x", style=u"ce1"), 3],
+                repeated=3)
+        self.assertEqual(table.height, 3)
+        writer.close()
+        table = self._read(output).get_body().get_table(0)
+        self.assertEqual(table.get_values(), [[u"x", 3]] * 3)
+        self.assertEqual(table.get_cell('A3').get_style(), u"ce1")
+        self.assertEqual(table.get_column(1).get_style(), u"co1")
+
+
+    def test_several_tables(self):
+        output = StringIO()
+        with odf_spreadsheet_writer(output) as writer:
+            writer.add_table(u"First").extend_rows([[1], [2]])
+            writer.add_table(u"Empty")
+            writer.add_table(u"Last").append_row([u"last"])
+        tables = self._read(output).get_body().get_tables()
+        self.assertEqual([t.get_name() for t in tables],
+                [u"First", u"Empty", u"Last"])
+        self.assertEqual(tables[0].get_values(), [[1], [2]])
+        self.assertEqual(tables[1].get_height(), 0)
+        self.assertEqual(tables[2].get_values(), [[u"last"]])
+
+
+    def test_closed_table(self):
+        writer = odf_spreadsheet_writer(StringIO())
+        first = writer.add_table(u"First")
+        writer.add_table(u"Second")
+        self.assertRaises(ValueError, first.append_row, [1])
+        writer.close()
+
+
+
+
+class TestIterTableValues(TestCase):
+
+    def setUp(self):
+        self.document = odf_get_document('samples/simple_table.ods')
+        reference = odf_get_document('samples/simple_table.ods')
+        self.table = reference.get_body().get_table(name=u"Example1")
+
+
+    def test_iter_values(self):
+        values = list(self.document.iter_table_values(u"Example1"))
+        self.assertEqual(values, self.table.get_values())
+
+
+    def test_iter_values_index(self):
+        values = list(self.document.iter_table_values(0, get_type=True))
+        self.assertEqual(values, self.table.get_values(get_type=True))
+
+
+    def test_iter_values_coord(self):
+        values = list(self.document.iter_table_values(0, coord='B2:D3'))
+        self.assertEqual(values, self.table.get_values('B2:D3'))
+        values = list(self.document.iter_table_values(0, coord=(2, 3)))
+        self.assertEqual(values, self.table.get_values((2, 3)))
+
+
+    def test_iter_values_not_expanded(self):
+        rows = list(self.document.iter_table_values(0, coord='A1:E1',
+            expand=False))
+        self.assertEqual(rows, [([(1, 3), (2, 1), (3, 1)], 1)])
+
+
+    def test_repeated_rows(self):
+        output = StringIO()
+        writer = odf_spreadsheet_writer(output)
+        writer.add_table(u"Data").append_row([1, None], repeated=1000000)
+        writer.close()
+        output.seek(0)
+        document = odf_get_document(output)
+        rows = list(document.iter_table_values(0, expand=False))
+        self.assertEqual(rows, [([(1, 1), (None, 1)], 1000000)])
+        rows = list(document.iter_table_values(0, coord=(5, 6)))
+        self.assertEqual(rows, [[1, None], [1, None]])
+
+
+    def test_not_found(self):
+        iterator = self.document.iter_table_values(u"Missing")
+        self.assertRaises(ValueError, list, iterator)
+
+
+    def test_loaded_content(self):
+        table = self.document.get_body().get_table(0)
+        table.set_value('A1', u"changed")
+        values = list(self.document.iter_table_values(0))
+        self.assertEqual(values[0][0], u"changed")
+        self.assertEqual(values[1:], self.table.get_values()[1:])
+
+
+    def test_loaded_content_not_expanded(self):
+        expected = list(self.document.iter_table_values(0, expand=False))
+        self.document.get_body()
+        rows = list(self.document.iter_table_values(0, expand=False))
+        self.assertEqual(rows, expected)
+        rows = list(self.document.iter_table_values(0, coord='A1:E1',
+            expand=False))
+        self.assertEqual(rows, [([(1, 3), (2, 1), (3, 1)], 1)])
+
+
+
+if __name__ == '__main__':
+    main()
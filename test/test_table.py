@@ -28,24 +28,44 @@
 #
 
 # Import from the Standard Library
+import gc
+import re
 from datetime import date, datetime, timedelta
 from decimal import Decimal as dec
 from cStringIO import StringIO
-from unittest import TestCase, main
+from csv import QUOTE_MINIMAL
+from sqlite3 import connect
+from unittest import TestCase, main, skipIf
+
+# Import from pandas, optional
+try:
+    from pandas import DataFrame
+except ImportError:
+    DataFrame = None
 
 # Import from lpod
 from lpod.document import odf_get_document
+from lpod.element import odf_create_element
+from lpod.frame import odf_create_image_frame
 from lpod.table import _alpha_to_digit, _digit_to_alpha
 from lpod.table import _convert_coordinates, odf_cell, odf_row
 from lpod.table import odf_create_cell, odf_create_row, odf_create_column
 from lpod.table import odf_create_table, import_from_csv, odf_column
 from lpod.table import odf_create_named_range, import_from_csv, odf_column
+from lpod.table import import_from_sqlite, diff_tables, map_tables
+from lpod.table import import_from_records, import_from_dataframe
 
 
 csv_data = '"A float","3.14"\n"A date","1975-05-07"\n'
 
 
 
+def _get_table_name(table, suffix):
+    # Called in another process by map_tables
+    return table.get_name() + suffix
+
+
+
 class TestCoordinates(TestCase):
 
     def test_digit_to_alpha_to_digit(self):
@@ -1025,6 +1045,16 @@ class TestRowCell(TestCase):
         self.assertEqual(cell.y, 1)
 
 
+    def test_extend_cells(self):
+        row = self.row.clone()
+        row.extend_cells([odf_create_cell(u"A"),
+                          odf_create_cell(u"B", repeated=2)])
+        self.assertEqual(row.get_values(),
+                [1, 1, 1, 2, 3, 3, 3, u"A", u"B", u"B"])
+        self.assertEqual(row.get_width(), 10)
+        self.assertEqual(row.get_value(9), u"B")
+
+
     def test_delete_cell(self):
         row = self.row.clone()
         row.delete_cell(3)
@@ -2056,6 +2086,38 @@ class TestTable(TestCase):
                 [1, 2, 3, 4, 5, None, 7,   None]])
 
 
+    def test_table_transpose_repeated_edge(self):
+        table = odf_create_table(u"Table")
+        table.set_values([[1, 2, 8, 9], [3, 4, 8, 9]])
+        row = odf_create_row()
+        row.append_cell(odf_create_cell(5))
+        # Repeated cell across the right edge of the area
+        row.append_cell(odf_create_cell(repeated=2))
+        row.append_cell(odf_create_cell(7))
+        table.append_row(row)
+        table.transpose('A1:B3')
+        self.assertEqual(table.get_values(),
+                [[1, 3, 5, 9], [2, 4, None, 9], [None, None, None, 7]])
+
+
+    def test_table_transpose_repeated(self):
+        table = odf_create_table(u"Table")
+        row = odf_create_row(repeated=1000)
+        row.append_cell(odf_create_cell(repeated=500))
+        table.append_row(row)
+        table.set_value('B3', 5)
+        table.set_span('C1:D2')
+        table.transpose()
+        self.assertEqual(table.get_name(), u"Table")
+        self.assertEqual(table.get_size(), (1000, 500))
+        self.assertEqual(table.get_value('C2'), 5)
+        self.assertEqual(table.get_span_at('B4'), (0, 2, 1, 3))
+        # Runs of columns are kept as repeated rows
+        self.assertEqual(len(table._get_rows()), 5)
+        self.assertEqual(table.get_row(4).get_repeated(), 496)
+        self.assertEqual(len(table._get_columns()), 1)
+
+
 
 class TestTableCellSpan(TestCase):
     # simpletable :
@@ -2668,6 +2730,32 @@ class TestTableCellSpan(TestCase):
                  [False,  False,  False, False, False, False, False, False, False],
                  [False,  False,  False, False, False, False, False, False, False]])
 
+    def test_get_span_at(self):
+        table = self.table.clone()
+        self.assertEqual(table.get_span_at('b2'), None)
+        table.set_span('b2:c3')
+        table.set_span((4, 0, 5, 0))
+        self.assertEqual(table.get_span_at('b2'), (1, 1, 2, 2))
+        self.assertEqual(table.get_span_at('c3'), (1, 1, 2, 2))
+        self.assertEqual(table.get_span_at((5, 0)), (4, 0, 5, 0))
+        self.assertEqual(table.get_span_at('a2'), None)
+        self.assertEqual(table.get_span_at('d3'), None)
+        self.assertEqual(table.set_span('c1:d2'), False)
+        table.del_span('b2')
+        self.assertEqual(table.get_span_at('c3'), None)
+        self.assertEqual(table.get_span_at('f1'), (4, 0, 5, 0))
+
+
+    def test_get_span_at_loaded(self):
+        table = self.table.clone()
+        table.set_span('a3:b4')
+        # The index is built from the XML of the new table object
+        copy = table.clone()
+        self.assertEqual(copy.get_span_at('b4'), (0, 2, 1, 3))
+        copy.insert_row(0)
+        self.assertEqual(copy.get_span_at('b5'), (0, 3, 1, 4))
+
+
 
 
 class TestTableGetValues(TestCase):
@@ -3007,6 +3095,100 @@ class TestTableGetValues(TestCase):
        [ [ ], [(u'bob', u'string'), (u'bob2', u'string'), ]] )
 
 
+    def _make_padded_table(self):
+        # Like desktop applications: empty styled tail up to the limits
+        table = odf_create_table(u"Padded", width=1024)
+        table.set_values([[1, None, u"a"], [None, 2]])
+        row = odf_create_row(width=1024, repeated=1048570)
+        row.set_value(1000, None, style=u"ce1")
+        table.append_row(row)
+        return table
+
+
+    def test_get_used_size(self):
+        table = self._make_padded_table()
+        self.assertEqual(table.get_size(), (1024, 1048572))
+        self.assertEqual(table.get_used_size(), (3, 2))
+        self.assertEqual(self.table.get_used_size(), self.table.get_size())
+
+
+    def test_get_used_size_empty(self):
+        table = odf_create_table(u"Empty", width=10, height=10)
+        self.assertEqual(table.get_used_size(), (0, 0))
+        self.assertEqual(table.get_values(trim=True), [])
+
+
+    def test_get_values_as_float(self):
+        table = odf_create_table(u"Float")
+        table.set_values([[dec('2.5'), 3, u"text"],
+                          [datetime(2012, 1, 2), None, dec('0.1')]])
+        values = table.get_values(as_float=True)
+        self.assertEqual(values, [[2.5, 3, u"text"],
+                                  [datetime(2012, 1, 2), None, 0.1]])
+        self.assertEqual(type(values[0][0]), float)
+        self.assertEqual(type(values[0][1]), int)
+        self.assertEqual(list(table.iter_values(as_float=True)), values)
+        self.assertEqual(table.get_column_values(2, as_float=True),
+                [u"text", 0.1])
+        self.assertEqual(type(table.get_values()[0][0]), dec)
+
+
+    def test_get_values_repeated_rows(self):
+        table = odf_create_table(u"Repeated")
+        row = odf_create_row()
+        row.set_values([1, u"a"])
+        row.set_repeated(3)
+        table.append_row(row)
+        values = table.get_values()
+        self.assertEqual(values, [[1, u"a"]] * 3)
+        # Rows are distinct lists
+        values[0].append(2)
+        self.assertEqual(values[1], [1, u"a"])
+
+
+    def test_get_values_trim(self):
+        table = self._make_padded_table()
+        self.assertEqual(table.get_values(trim=True),
+                [[1, None, u"a"], [None, 2, None]])
+        self.assertEqual(table.get_values('B1:Z10', trim=True),
+                [[None, u"a"], [2, None]])
+        self.assertEqual(table.get_values('D1:D2', trim=True), [])
+        self.assertEqual(table.get_size(), (1024, 1048572))
+
+
+    def test_iter_values_trim(self):
+        table = self._make_padded_table()
+        self.assertEqual(list(table.iter_values(trim=True)),
+                [[1, None, u"a"], [None, 2, None]])
+
+
+    def test_to_csv_trim(self):
+        table = self._make_padded_table()
+        self.assertEqual(table.to_csv(trim=True),
+                '"1","","a"\n"","2",""\n')
+
+
+    def test_iter_nonempty_cells(self):
+        table = self._make_padded_table()
+        self.assertEqual(list(table.iter_nonempty_cells()),
+                [(0, 0, 1, 'float'), (2, 0, u"a", 'string'),
+                 (1, 1, 2, 'float')])
+
+
+    def test_iter_nonempty_cells_repeated(self):
+        cells = list(self.table.iter_nonempty_cells())
+        self.assertEqual(len(cells), 28)
+        self.assertEqual(cells[:4], [(0, 0, 1, 'float'), (1, 0, 1, 'float'),
+            (2, 0, 1, 'float'), (3, 0, 2, 'float')])
+        self.assertEqual(cells[-1], (6, 3, 7, 'float'))
+
+
+    def test_iter_nonempty_cells_coord(self):
+        cells = list(self.table.iter_nonempty_cells('C3:D4'))
+        self.assertEqual(cells, [(2, 2, 1, 'float'), (3, 2, 2, 'float'),
+            (2, 3, 3, 'float'), (3, 3, 4, 'float')])
+
+
 
 class TestTableCache(TestCase):
 
@@ -3306,6 +3488,24 @@ class TestTableRow(TestCase):
         self.assertEqual(table.get_height(), 5)
 
 
+    def test_extend_rows(self):
+        table = self.table.clone()
+        row = table.get_row(0)
+        table.extend_rows([row, odf_create_row(width=9, repeated=2)],
+                          clone=True)
+        self.assertEqual(table.get_size(), (9, 7))
+        self.assertEqual(table.get_row_values(4),
+                         [1, 1, 1, 2, 3, 3, 3, None, None])
+        self.assertEqual(table.get_row(6).get_width(), 9)
+
+
+    def test_extend_rows_empty_table(self):
+        table = odf_create_table(u"Table")
+        table.extend_rows(odf_create_row(width=3) for i in xrange(2))
+        self.assertEqual(table.get_size(), (3, 2))
+        self.assertEqual(len(table._get_columns()), 1)
+
+
     def test_delete_row(self):
         table = self.table.clone()
         table.delete_row(2)
@@ -3332,6 +3532,60 @@ class TestTableRow(TestCase):
         self.assertEqual(table.get_width(), 7)
 
 
+    def test_delete_rows(self):
+        table = self.table.clone()
+        table.get_elements('table:table-row')[2].set_repeated(3)
+        table.delete_rows(1, 3)
+        self.assertEqual(table.get_values(),
+                [[1, 1, 1, 2, 3, 3, 3],
+                 [1, 1, 1, 2, 3, 3, 3],
+                 [1, 2, 3, 4, 5, 6, 7]])
+        self.assertEqual(table.get_height(), 3)
+        table.delete_rows('2')
+        self.assertEqual(table.get_height(), 1)
+
+
+    def test_delete_rows_inside_repeat(self):
+        table = odf_create_table(u"Big")
+        table.append_row(odf_create_row(width=2, repeated=100000))
+        table.set_value('A100000', u"last")
+        table.delete_rows(10000, 59999)
+        self.assertEqual(table.get_height(), 50000)
+        self.assertEqual(table.get_value('A50000'), u"last")
+        self.assertEqual(len(table.get_elements('table:table-row')), 2)
+
+
+    def test_delete_rows_end_before_start(self):
+        table = odf_create_table(u"Table")
+        table.append_row(odf_create_row(width=2, repeated=10))
+        self.assertRaises(ValueError, table.delete_rows, 5, 2)
+        self.assertEqual(table.get_height(), 10)
+
+
+    def test_insert_rows(self):
+        table = self.table.clone()
+        table.get_elements('table:table-row')[2].set_repeated(3)
+        rows = table.insert_rows(3, [odf_create_row(width=1),
+                                     odf_create_row(width=2)])
+        self.assertEqual([row.y for row in rows], [3, 4])
+        table.set_value('A4', u"a")
+        table.set_value('B5', u"b")
+        self.assertEqual(table.get_height(), 8)
+        self.assertEqual(table.get_column_values(0),
+                [1, 1, 1, u"a", None, 1, 1, 1])
+        self.assertEqual(table.get_value('B5'), u"b")
+
+
+    def test_insert_rows_count(self):
+        table = self.table.clone()
+        table.insert_rows(0, 1000)
+        table.insert_rows(1005, 2)
+        self.assertEqual(table.get_height(), 1007)
+        self.assertEqual(table.get_row_values(1003),
+                [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(table.get_row_values(1006), [None] * 7)
+
+
     def test_is_row_empty(self):
         table = odf_create_table(u"Empty", width=10, height=20)
         for y in xrange(20):
@@ -3460,6 +3714,35 @@ class TestTableCell(TestCase):
         self.assertEqual(table.get_width(), 7)
 
 
+    def test_set_cell_images(self):
+        table = self.table
+        expected = table.clone()
+        frame = odf_create_image_frame('Pictures/image.png',
+                                       size=('2cm', '1cm'))
+        expected.set_cell_image('D3', frame, type='spreadsheet')
+        expected.set_cell_image((1, 5), frame, type='spreadsheet')
+        table.set_cell_images([('D3', frame), ((1, 5), frame)],
+                              type='spreadsheet')
+        # The cells written at once keep no indentation
+        strip = lambda table: re.sub(r'>\s+<', '><', table.serialize())
+        self.assertEqual(strip(table), strip(expected))
+        cell = table.get_cell('D3')
+        self.assertEqual(cell.get_style(), u"ce1")
+        frame = cell.get_element('draw:frame')
+        self.assertEqual(frame.get_attribute('table:end-cell-address'),
+                         u"Example1.D3")
+        self.assertEqual(table.get_height(), 6)
+
+
+    def test_set_cell_images_text(self):
+        frame = odf_create_image_frame('Pictures/image.png')
+        self.table.set_cell_images([('A1', frame)], type='text')
+        cell = self.table.get_cell('A1')
+        self.assertEqual(cell.get_value(), u"")
+        self.assertNotEqual(cell.get_element('text:p/draw:frame'), None)
+        self.assertEqual(self.table.get_value('B1'), 1)
+
+
 
 class TestTableNamedRange(TestCase):
 
@@ -3844,6 +4127,66 @@ class TestTableNamedRange(TestCase):
         self.assertEqual(back_nr.end, (5, 3))
         self.assertEqual(back_nr.crange, (3, 2, 5, 3))
         self.assertEqual(back_nr.usage, 'print-range')
+        self.assertEqual(back_nr.get_value(), 2)
+
+
+    def test_body_registry_shared(self):
+        nr = self.body2.get_named_range('nr_6')
+        self.assertTrue(self.table2.get_named_range('nr_6') is nr)
+        self.table2.set_named_range("new", "A1:c2")
+        self.assertEqual([nr.name for nr in self.body2.get_named_ranges()],
+                         ['nr_1', 'nr_6', 'new'])
+
+
+    def test_body_registry_kept_by_document(self):
+        document = odf_get_document('samples/simple_table_named_range.ods')
+        table = document.get_body().get_table(name=u"Example1")
+        table.get_named_range('nr_6')
+        body = table.get_document_body()
+        ranges = body._get_named_range_registry().ranges
+        del table, body
+        gc.collect()
+        # Another wrapper reuses the index
+        table = document.get_body().get_table(name=u"Example1")
+        registry = table.get_document_body()._get_named_range_registry()
+        self.assertTrue(registry.ranges is ranges)
+        self.assertEqual(table.get_named_range('nr_6').name, 'nr_6')
+
+
+    def test_body_registry_outside_changes(self):
+        self.table2.get_named_ranges()
+        # Changes not made through the named range API
+        self.body2.get_named_range('nr_1').delete()
+        nr = odf_create_named_range('other', 'A1', u"Example1")
+        self.body2.get_element('table:named-expressions').append(nr)
+        result = [ nr.name for nr in self.table2.get_named_ranges()]
+        self.assertEqual(result, ['nr_6', 'other'])
+        self.assertEqual(self.table2.get_named_range('nr_1'), None)
+        self.assertEqual(self.table2.get_named_range('other').get_value(), 1)
+
+
+    def test_body_registry_new_named_expressions(self):
+        self.body2.get_named_ranges()
+        # A table merged in with its own named expressions
+        expressions = odf_create_element('table:named-expressions')
+        expressions.append(odf_create_named_range(u"myrange", 'B2',
+                                                  u"Example1"))
+        self.table2.append(expressions)
+        self.assertEqual(self.body2.get_named_range(u"myrange").get_value(),
+                         1)
+        result = [nr.name for nr in self.body2.get_named_ranges()]
+        self.assertEqual(result, ['myrange', 'nr_1', 'nr_6'])
+
+
+    def test_body_registry_replaced(self):
+        self.body2.get_named_ranges()
+        # Same number of named ranges, other names
+        nr = self.body2.get_named_range('nr_1')
+        nr.get_parent().replace_element(nr,
+                odf_create_named_range('other', 'A1', u"Example1"))
+        self.assertEqual(self.body2.get_named_range('other').name, 'other')
+        result = [nr.name for nr in self.body2.get_named_ranges()]
+        self.assertEqual(result, ['other', 'nr_6'])
 
 
 
@@ -3928,6 +4271,35 @@ class TestTableColumn(TestCase):
         self.assertEqual(table.get_row(0).get_width(), 6)
 
 
+    def test_delete_columns(self):
+        table = self.table.clone()
+        table.delete_columns('C', 'E')
+        self.assertEqual(table.get_width(), 4)
+        self.assertEqual(table.get_values(),
+                [[1, 1, 3, 3],
+                 [1, 1, 3, 3],
+                 [1, 1, 3, 3],
+                 [1, 2, 6, 7]])
+
+
+    def test_delete_columns_end_before_start(self):
+        table = self.table.clone()
+        self.assertRaises(ValueError, table.delete_columns, 'E', 'C')
+        self.assertEqual(table.get_width(), 7)
+        self.assertEqual(table.get_row_values(3), [1, 2, 3, 4, 5, 6, 7])
+
+
+    def test_insert_columns(self):
+        table = self.table.clone()
+        column = table.insert_columns(1, 2)
+        self.assertEqual(column.x, 1)
+        self.assertEqual(table.get_width(), 9)
+        self.assertEqual(table.get_row_values(3),
+                [1, None, None, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(table.get_row_values(0),
+                [1, None, None, 1, 1, 2, 3, 3, 3])
+
+
     def test_get_column_cell_values(self):
         self.assertEqual(self.table.get_column_values(3), [2, 2, 2, 4])
 
@@ -3942,6 +4314,64 @@ class TestTableColumn(TestCase):
                  [1, 2, 3, 4, 5, u"d", 7]])
 
 
+    def test_get_column_cells(self):
+        cells = self.table.get_column_cells(3)
+        self.assertEqual([cell.get_value() for cell in cells], [2, 2, 2, 4])
+        self.assertEqual([cell.y for cell in cells], [0, 1, 2, 3])
+        # Copies are returned
+        cells[0].set_value(u"changed")
+        self.assertEqual(self.table.get_value('D1'), 2)
+
+
+    def test_get_column_cells_filter(self):
+        table = self.table.clone()
+        table.set_value('B3', u"text")
+        cells = table.get_column_cells(1, cell_type='string', complete=True)
+        self.assertEqual([cell and cell.get_value() for cell in cells],
+                [None, None, u"text", None])
+        self.assertEqual(table.get_column_values(1, cell_type='float',
+            complete=False), [1, 1, 2])
+
+
+    def test_get_column_values_repeated_rows(self):
+        table = odf_create_table(u"Table", width=3, height=1000)
+        table.set_value('B1000', 4)
+        values = table.get_column_values(1)
+        self.assertEqual(values, [None] * 999 + [4])
+        self.assertEqual(table.get_column_values(5), [None] * 1000)
+
+
+    def test_set_column_values_repeated_rows(self):
+        table = odf_create_table(u"Table")
+        table.append_column(odf_create_column(repeated=3))
+        table.append_row(odf_create_row(width=3, repeated=1000))
+        table.set_column_values(1, [7] * 500 + [u"a"] * 499 + [8])
+        self.assertEqual(table.get_size(), (3, 1000))
+        # Repeated rows are split only where the value changes
+        self.assertEqual(len(table.get_elements('table:table-row')), 3)
+        self.assertEqual(table.get_column_values(1),
+                [7] * 500 + [u"a"] * 499 + [8])
+        self.assertEqual(table.get_row_values(999), [None, 8, None])
+
+
+    def test_set_column_values_wider(self):
+        table = self.table.clone()
+        table.set_column_values(8, [1, 2, 3, 4])
+        self.assertEqual(table.get_width(), 9)
+        self.assertEqual(table.get_column_values(8), [1, 2, 3, 4])
+        self.assertEqual(table.get_values('D1:D4'), [[2], [2], [2], [4]])
+
+
+    def test_set_column_values_generator(self):
+        table = self.table.clone()
+        table.set_column_values('B', (x * 10 for x in xrange(4)))
+        self.assertEqual(table.get_column_values(1), [0, 10, 20, 30])
+
+
+    def test_set_column_values_bad_length(self):
+        self.assertRaises(ValueError, self.table.set_column_values, 0, [1])
+
+
     def test_is_column_empty(self):
         table = odf_create_table(u"Empty", width=10, height=20)
         for x in xrange(10):
@@ -3955,6 +4385,287 @@ class TestTableColumn(TestCase):
 
 
 
+class TestTableBatch(TestCase):
+
+    def setUp(self):
+        document = odf_get_document('samples/simple_table.ods')
+        body = document.get_body()
+        self.table = body.get_table(name=u"Example1").clone()
+
+
+    def test_batch(self):
+        table = self.table
+        expected = table.clone()
+        for coord, value in (('D3', u"Changed"), ('A1', 0), ('G4', 8),
+                             ('B2', 9), ('I6', 10), ('C3', 11)):
+            expected.set_value(coord, value)
+        with table.batch():
+            table.set_value('D3', u"Changed")
+            table.set_value('I6', 10)
+            table.set_value('A1', 0)
+            table.set_value('B2', 9)
+            table.set_value('C3', 11)
+            table.set_value('G4', 8)
+            self.assertEqual(table.get_value('B2'), 9)
+            self.assertEqual(table.get_cell('I6').get_value(), 10)
+            # Not written yet
+            self.assertEqual(table.get_size(), (7, 4))
+        self.assertEqual(table.get_values(), expected.get_values())
+        self.assertEqual(table.get_size(), (9, 6))
+        self.assertEqual(table.get_cell('D3').get_style(), None)
+
+
+    def test_batch_repeated_cell(self):
+        table = self.table
+        with table.batch():
+            table.set_cell('B2', odf_create_cell(u"x", repeated=2))
+        self.assertEqual(table.get_row_values(1),
+                         [1, u"x", u"x", 2, 3, 3, 3])
+
+
+    def test_batch_error(self):
+        table = self.table
+        expected = table.get_values()
+        try:
+            with table.batch():
+                table.set_value('A1', 0)
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(table.get_values(), expected)
+        table.set_value('A1', 0)
+        self.assertEqual(table.get_value('A1'), 0)
+
+
+
+class TestTableView(TestCase):
+
+    def setUp(self):
+        document = odf_get_document('samples/simple_table.ods')
+        body = document.get_body()
+        table = body.get_table(name=u"Example1").clone()
+        table.append_row(odf_create_row(width=9, repeated=3))
+        self.table = table
+
+
+    def test_get_view(self):
+        view = self.table.get_view('B2:C5')
+        self.assertEqual(view.get_size(), (2, 4))
+        self.assertEqual(view.get_values(),
+                         [[1, 1], [1, 1], [2, 3], [None, None]])
+        cells = list(view.traverse())
+        self.assertEqual(len(cells), 4)
+        self.assertEqual([cell.get_value() for cell in cells[2]], [2, 3])
+
+
+    def test_rstrip(self):
+        table = self.table
+        expected = table.clone()
+        expected.rstrip()
+        view = table.get_view().rstrip()
+        self.assertEqual(view.get_size(), expected.get_size())
+        self.assertEqual(view.get_values(), expected.get_values())
+        # The table is untouched
+        self.assertEqual(table.get_size(), (9, 7))
+
+
+    def test_rstrip_empty(self):
+        view = odf_create_table(u"Empty", width=3, height=2).get_view()
+        self.assertEqual(view.rstrip().get_size(), (0, 0))
+        self.assertEqual(view.rstrip().get_values(), [])
+        self.assertEqual(list(view.rstrip().traverse()), [])
+
+
+    def test_clone(self):
+        table = self.table
+        table.set_value('E2', u"E2")
+        copy = table.get_view('C2:E4').clone()
+        self.assertEqual(copy.get_name(), u"Example1")
+        self.assertEqual(copy.get_size(), (3, 3))
+        self.assertEqual(copy.get_values(), table.get_values('C2:E4'))
+        copy.set_value('A1', 0)
+        self.assertEqual(table.get_value('C2'), 1)
+
+
+    def test_clone_repeated(self):
+        table = odf_create_table(u"Table")
+        table.append_row(odf_create_row(width=1000, repeated=1000,
+                                        style=u"ro1"))
+        table.set_value('B2', 5)
+        copy = table.get_view('B1:C500').clone()
+        self.assertEqual(copy.get_size(), (2, 500))
+        self.assertEqual(copy.get_value('A2'), 5)
+        rows = copy._get_rows()
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[2].get_repeated(), 498)
+        self.assertEqual(rows[2].get_style(), u"ro1")
+        self.assertEqual(len(rows[0]._get_cells()), 2)
+
+
+
+class TestTableIndex(TestCase):
+
+    def setUp(self):
+        table = odf_create_table(u"Reference")
+        table.set_values([[u"key", u"label"],
+                          [u"fr", u"France"],
+                          [u"de", u"Germany"],
+                          [u"fr", u"Duplicate"],
+                          [3, u"Three"]])
+        table.append_row(odf_create_row(width=2, repeated=100))
+        self.table = table
+
+
+    def test_lookup(self):
+        table = self.table
+        table.build_index(0)
+        self.assertEqual(table.lookup(u"de"), 2)
+        self.assertEqual(table.lookup(u"fr"), 1)
+        self.assertEqual(table.lookup(3), 4)
+        self.assertEqual(table.lookup(u"it"), None)
+
+
+    def test_lookup_values(self):
+        table = self.table
+        table.build_index('A')
+        self.assertEqual(table.lookup(u"de", get_values=True),
+                [u"de", u"Germany"])
+        self.assertEqual(table.lookup(u"it", get_values=True), None)
+
+
+    def test_lookup_without_index(self):
+        self.assertRaises(ValueError, self.table.lookup, u"fr")
+
+
+    def test_lookup_after_set_value(self):
+        table = self.table
+        table.build_index(0)
+        table.set_value('A3', u"it")
+        table.set_value('A50', u"es")
+        self.assertEqual(table.lookup(u"de"), None)
+        self.assertEqual(table.lookup(u"it"), 2)
+        self.assertEqual(table.lookup(u"es"), 49)
+
+
+    def test_lookup_after_rows_change(self):
+        table = self.table
+        table.build_index(1)
+        table.insert_row(0, odf_create_row())
+        self.assertEqual(table.lookup(u"France"), 2)
+        table.delete_row(0)
+        table.delete_row(0)
+        self.assertEqual(table.lookup(u"France"), 0)
+        table.set_row_values(1, [u"nl", u"Netherlands"])
+        self.assertEqual(table.lookup(u"Netherlands"), 1)
+
+
+
+class TestTableSortFilter(TestCase):
+
+    def setUp(self):
+        table = odf_create_table(u"Sales")
+        table.set_values([[u"region", u"amount"],
+                          [u"West", 10],
+                          [u"east", 5],
+                          [None, 7],
+                          [u"West", 1],
+                          [u"East", 20]])
+        table.set_cell('B2', odf_create_cell(10, style=u"ce1"))
+        self.table = table
+
+
+    def test_sort_rows(self):
+        table = self.table
+        table.sort_rows(1, header_rows=1)
+        self.assertEqual(table.get_column_values(1), [u"amount", 1, 5, 7, 10,
+                                                      20])
+        self.assertEqual(table.get_cell('B5').get_style(), u"ce1")
+
+
+    def test_sort_rows_reverse(self):
+        table = self.table
+        table.sort_rows('B', reverse=True, header_rows=1)
+        self.assertEqual(table.get_column_values(1), [u"amount", 20, 10, 7, 5,
+                                                      1])
+
+
+    def test_sort_rows_text_empty_last(self):
+        table = self.table
+        table.sort_rows(['A', 'B'], header_rows=1)
+        self.assertEqual(table.get_values(), [[u"region", u"amount"],
+                                              [u"east", 5],
+                                              [u"East", 20],
+                                              [u"West", 1],
+                                              [u"West", 10],
+                                              [None, 7]])
+        table.sort_rows(0, reverse=True, header_rows=1)
+        self.assertEqual(table.get_column_values(0), [u"region", u"West",
+            u"West", u"east", u"East", None])
+
+
+    def test_sort_rows_repeated(self):
+        table = odf_create_table(u"Repeated")
+        table.append_row(odf_create_row(width=1, repeated=3))
+        table.append_row()
+        table.set_value('A4', 2)
+        table.set_value('A5', 1)
+        table.sort_rows(0, header_rows=1)
+        self.assertEqual(table.get_height(), 5)
+        self.assertEqual(table.get_column_values(0), [None, 1, 2, None,
+                                                      None])
+        self.assertEqual(len(table.get_elements('table:table-row')), 4)
+
+
+    def test_sort_rows_span(self):
+        table = self.table
+        table.set_value('C3', u"both")
+        table.set_span('C3:C4')
+        table.sort_rows(1, reverse=True, header_rows=1)
+        # The rows of the span moved together, sorted on the first one
+        self.assertEqual(table.get_column_values(1), [u"amount", 20, 10, 5, 7,
+                                                      1])
+        self.assertEqual(table.get_span_at('C5'), (2, 3, 2, 4))
+        self.assertEqual(table.get_value('C4'), u"both")
+        self.assertEqual(table.get_cell('C5').get_tag(),
+                         'table:covered-table-cell')
+        table.set_span('D1:D2')
+        self.assertRaises(ValueError, table.sort_rows, 1, header_rows=1)
+
+
+    def test_filter_rows_span(self):
+        table = self.table
+        table.set_span('C3:C4')
+        deleted = table.filter_rows(lambda values: values[1] > 6,
+                header_rows=1)
+        self.assertEqual(deleted, 1)
+        self.assertEqual(table.get_column_values(1), [u"amount", 10, 5, 7,
+                                                      20])
+        self.assertEqual(table.get_span_at('C4'), (2, 2, 2, 3))
+
+
+    def test_filter_rows(self):
+        table = self.table
+        deleted = table.filter_rows(lambda values: values[1] > 6,
+                header_rows=1)
+        self.assertEqual(deleted, 2)
+        self.assertEqual(table.get_values(), [[u"region", u"amount"],
+                                              [u"West", 10],
+                                              [None, 7],
+                                              [u"East", 20]])
+        self.assertEqual(table.get_height(), 4)
+
+
+    def test_group_rows(self):
+        table = self.table
+        table.append_row(odf_create_row(width=2, repeated=10))
+        result = table.group_rows(0, [(1, sum), ('B', len)], header_rows=1)
+        self.assertEqual(result, [[u"West", 11, 2],
+                                  [u"east", 5, 1],
+                                  [None, 7, 1],
+                                  [u"East", 20, 1]])
+
+
+
 class TestCSV(TestCase):
 
     def setUp(self):
@@ -3989,8 +4700,334 @@ class TestCSV(TestCase):
         self.assertEqual(self.table.serialize(), expected)
 
 
-    def _test_export_to_csv(self):
-        raise NotImplementedError
+    def test_import_from_csv_types(self):
+        data = ('name;age;price;day;note;code\r\n'
+                'a;31;2.5;2012-01-02;x;AB\r\n'
+                'b;32;3;2012-01-03 10:00:00;12;EF\r\n'
+                'c;n/a;4.25;;;CD\r\n'
+                'd;33;5;;;10\r\n')
+        table = import_from_csv(StringIO(data), u"Types")
+        self.assertEqual(table.get_size(), (6, 5))
+        self.assertEqual(table.get_values(),
+                [[u"name", u"age", u"price", u"day", u"note", u"code"],
+                 [u"a", 31, dec('2.5'), datetime(2012, 1, 2), u"x", u"AB"],
+                 [u"b", 32, 3, datetime(2012, 1, 3, 10), 12, u"EF"],
+                 [u"c", u"n/a", dec('4.25'), u"", u"", u"CD"],
+                 [u"d", 33, 5, u"", u"", 10]])
+        # Floats in a column of floats
+        self.assertEqual(table.get_cell('C3').get_attribute('office:value'),
+                u"3.0")
+
+
+    def test_import_from_csv_text_column(self):
+        data = 'code,count\n' + 'A,1\n' * 200 + '10,2.5\n'
+        table = import_from_csv(StringIO(data), u"Text")
+        # The values of a column of text are still guessed one by one
+        self.assertEqual(table.get_row_values(201), [10, dec('2.5')])
+
+
+    def test_import_from_csv_cr(self):
+        data = 'name,count\r' + 'A,1\r' * 2 + '"B\rC",5\r'
+        table = import_from_csv(StringIO(data), u"CR")
+        self.assertEqual(table.get_values(),
+                [[u"name", u"count"], [u"A", 1], [u"A", 1], [u"B\rC", 5]])
+
+
+    def test_import_from_csv_path(self):
+        table = import_from_csv('samples/text1.csv', u"From file")
+        self.assertEqual(table.get_height(), len(open(
+                'samples/text1.csv').read().splitlines()))
+
+
+    def test_export_to_csv(self):
+        table = self.table
+        table.set_value('A3', u'Say "hi", \xe9t\xe9 ')
+        self.assertEqual(table.to_csv(),
+                '"A float","3.14"\n'
+                '"A date","1975-05-07 00:00:00"\n'
+                '"Say ""hi"", \xc3\xa9t\xc3\xa9",""\n')
+
+
+    def test_export_to_csv_dialect(self):
+        self.assertEqual(self.table.to_csv(quoting=QUOTE_MINIMAL,
+                delimiter=';'),
+                'A float;3.14\nA date;1975-05-07 00:00:00\n')
+        self.assertEqual(self.table.to_csv(dialect='excel-tab'),
+                'A float\t3.14\r\nA date\t1975-05-07 00:00:00\r\n')
+
+
+    def test_export_to_rst(self):
+        table = self.table
+        table.set_value('A4', u'\xe9t\xe9')
+        table.append_row(odf_create_row(width=2, repeated=1000))
+        self.assertEqual(table.to_rst(),
+                '\n======= =================== \n'
+                'A float 3.14                \n'
+                'A date  1975-05-07 00:00:00 \n'
+                '..                          \n'
+                '\xc3\xa9t\xc3\xa9                         \n'
+                '======= =================== \n\n')
+        self.assertEqual(table.to_rst().decode('utf-8'),
+                         table.get_formatted_text({'rst_mode': True,
+                                                   'no_img_level': 0}))
+
+
+    def test_export_to_rst_plain(self):
+        table = odf_create_table(u"Text")
+        table.set_value('A1', u"word " * 30 + u"\nend")
+        table.set_value('B1', 1)
+        table.set_value('B2', 2)
+        self.assertEqual(len(table.to_rst().splitlines()), 8)
+        self.assertEqual(table.to_rst(plain=True).splitlines(),
+                ['', "=" * 154 + " == ",
+                 "word " * 30 + " end 1  ",
+                 ".." + " " * 153 + "2  ",
+                 "=" * 154 + " == ", ''])
+
+
+
+class TestDiffTables(TestCase):
+
+    def setUp(self):
+        table = odf_create_table(u"Table")
+        table.set_values([[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+        table.append_row(odf_create_row(width=3, repeated=1000))
+        table.set_value('A1004', u"end")
+        self.table = table
+
+
+    def test_no_change(self):
+        self.assertEqual(diff_tables(self.table, self.table.clone()), [])
+
+
+    def test_cell_changes(self):
+        other = self.table.clone()
+        other.set_value('B2', 50)
+        other.set_cell('C3', odf_create_cell(9, style=u"ce1",
+                formula=u"of:=3*3"))
+        self.assertEqual(diff_tables(self.table, other),
+                [('value', (1, 1), (1, 1), 5, 50),
+                 ('formula', (2, 2), (2, 2), None, u"of:=3*3"),
+                 ('style', (2, 2), (2, 2), None, u"ce1")])
+
+
+    def test_type_change(self):
+        other = self.table.clone()
+        other.set_value('A1', u"1")
+        self.assertEqual(diff_tables(self.table, other),
+                [('value', (0, 0), (0, 0), 1, u"1"),
+                 ('type', (0, 0), (0, 0), 'float', 'string')])
+
+
+    def test_rows_inserted_deleted(self):
+        other = self.table.clone()
+        other.delete_row(0)
+        other.insert_row(2, odf_create_row(width=3))
+        other.set_row_values(2, [0, 0, 0])
+        self.assertEqual(diff_tables(self.table, other),
+                [('row-deleted', (None, 0), None, None, None),
+                 ('row-inserted', None, (None, 2), None, None)])
+
+
+    def test_repeated_rows(self):
+        other = self.table.clone()
+        other.insert_row(500, odf_create_row(width=3))
+        changes = diff_tables(self.table, other)
+        self.assertEqual(changes,
+                [('row-inserted', None, (None, 1003), None, None)])
+
+
+
+class TestSQLite(TestCase):
+
+    def setUp(self):
+        table = odf_create_table(u"People")
+        table.set_values([[u"name", u"age", u"score", u"born"],
+                          [u"Ann", 31, dec('2.5'), date(1981, 3, 4)],
+                          [u"Bob", None, 3, None]])
+        table.append_row(odf_create_row(width=6, repeated=100))
+        self.table = table
+        self.connection = connect(':memory:')
+
+
+    def test_to_sqlite(self):
+        self.table.to_sqlite(self.connection, u"people")
+        cursor = self.connection.execute(u'SELECT * FROM "people"')
+        self.assertEqual([d[0] for d in cursor.description],
+                [u"name", u"age", u"score", u"born"])
+        self.assertEqual(cursor.fetchall(),
+                [(u"Ann", 31, 2.5, u"1981-03-04T00:00:00"),
+                 (u"Bob", None, 3.0, None)])
+        cursor = self.connection.execute(u"PRAGMA table_info(people)")
+        self.assertEqual([row[2] for row in cursor],
+                [u"TEXT", u"INTEGER", u"REAL", u"TEXT"])
+
+
+    def test_to_sqlite_coord_no_header(self):
+        self.table.to_sqlite(self.connection, u'my "table"', coord='A2:B3',
+                header=False)
+        cursor = self.connection.execute(u'SELECT * FROM "my ""table"""')
+        self.assertEqual([d[0] for d in cursor.description], [u"A", u"B"])
+        self.assertEqual(cursor.fetchall(), [(u"Ann", 31), (u"Bob", None)])
+
+
+    def test_import_from_sqlite(self):
+        self.table.to_sqlite(self.connection, u"people")
+        table = import_from_sqlite(u"SELECT * FROM people WHERE age > ?",
+                u"Result", connection=self.connection, parameters=(30,))
+        self.assertEqual(table.get_values(),
+                [[u"name", u"age", u"score", u"born"],
+                 [u"Ann", 31, dec('2.5'),
+                  u"1981-03-04T00:00:00"]])
+
+
+    def test_import_from_sqlite_cursor(self):
+        cursor = self.connection.execute(
+                u"SELECT 1 AS a, NULL AS b, NULL AS c, 'x' AS d")
+        table = import_from_sqlite(cursor, u"Result", header=False)
+        self.assertEqual(table.get_values(), [[1, None, None, u"x"]])
+        row = table.get_row(0)
+        self.assertEqual(len(row.get_elements('table:table-cell')), 3)
+
+
+    def test_import_from_sqlite_no_connection(self):
+        self.assertRaises(ValueError, import_from_sqlite, u"SELECT 1",
+                u"Result")
+
+
+
+class TestMapTables(TestCase):
+
+    def setUp(self):
+        document = odf_get_document('samples/simple_table.ods')
+        self.tables = document.get_body().get_tables()
+
+
+    def test_map_tables_method(self):
+        expected = [table.get_values() for table in self.tables]
+        self.assertEqual(map_tables(self.tables, 'get_values', processes=2),
+                         expected)
+
+
+    def test_map_tables_function(self):
+        self.assertEqual(map_tables(self.tables, _get_table_name, (u"!",),
+                                    processes=2),
+                         [u"Example1!", u"Example2!", u"Example3!"])
+
+
+    def test_map_tables_kwargs(self):
+        self.assertEqual(map_tables(self.tables[2:], 'to_csv',
+                                    kwargs={'trim': True}),
+                         ['"A float","3.14"\n'
+                          '"A date","1975-05-07 00:00:00"\n'])
+
+
+    def test_map_tables_one_process(self):
+        self.assertEqual(map_tables(self.tables, 'get_size', processes=1),
+                         [(7, 4), (1, 1), (2, 2)])
+
+
+
+class TestImportFromRecords(TestCase):
+
+    def setUp(self):
+        self.columns = [{'name': u"name", 'type': 'string',
+                         'style': u"ce1"},
+                        {'name': u"price", 'type': 'currency',
+                         'currency': 'EUR', 'format': u"%.2f EUR"},
+                        {'name': u"rate", 'type': 'percentage'},
+                        {}]
+        self.records = [(u"Ann", 2.5, 0.5, date(2012, 3, 4)),
+                        (None, 3, 0.25, True)]
+
+
+    def test_import_from_records(self):
+        table = import_from_records(self.records, u"Records", self.columns,
+                                    header=True)
+        self.assertEqual(table.get_name(), u"Records")
+        self.assertEqual(table.get_size(), (4, 3))
+        self.assertEqual(table.get_row_values(0),
+                         [u"name", u"price", u"rate", None])
+        self.assertEqual(table.get_row_values(2, get_type=True),
+                         [(None, None), (3, 'currency'),
+                          (dec('0.25'), 'percentage'), (True, 'boolean')])
+
+
+    def test_import_from_records_cells(self):
+        table = import_from_records(self.records, u"Records", self.columns)
+        expected = odf_create_cell(2.5, text=u"2.50 EUR",
+                                   cell_type='currency', currency='EUR')
+        cell = table.get_cell('B1')
+        self.assertEqual(cell.get_value(get_type=True), (dec('2.5'),
+                                                         'currency'))
+        self.assertEqual(cell.get_attributes(), expected.get_attributes())
+        self.assertEqual(cell.get_text_content(), u"2.50 EUR")
+        self.assertEqual(table.get_cell('C1').get_text_content(), u"50 %")
+        self.assertEqual(table.get_cell('A1').get_style(), u"ce1")
+        # Empty cells keep the style of the column
+        self.assertEqual(table.get_cell('A2').get_style(), u"ce1")
+        self.assertEqual(table.get_value('A2'), None)
+
+
+    def test_import_from_records_bad_type(self):
+        self.assertRaises(ValueError, import_from_records, [], u"Records",
+                          [{'type': 'decimal'}])
+
+
+
+@skipIf(DataFrame is None, "pandas is not installed")
+class TestDataFrame(TestCase):
+
+    def setUp(self):
+        self.document = odf_get_document('samples/simple_table.ods')
+        body = self.document.get_body()
+        self.table = body.get_table(name=u"Example1")
+
+
+    def test_to_dataframe(self):
+        frame = self.table.to_dataframe(header=False)
+        self.assertEqual(list(frame.columns), list(u"ABCDEFG"))
+        self.assertEqual(frame.values.tolist(), self.table.get_values())
+
+
+    def test_to_dataframe_coord(self):
+        frame = self.table.to_dataframe('B3:D4', index_col=0)
+        self.assertEqual(frame.index.name, 1)
+        self.assertEqual(list(frame.columns), [u"C", 2])
+        self.assertEqual(frame.values.tolist(), [[3, 4]])
+
+
+    def test_to_dataframe_types(self):
+        table = odf_create_table(u"Table")
+        table.set_values([[u"price", u"date"],
+                          [None, None],
+                          [dec('2.5'), datetime(2012, 3, 4)]])
+        frame = table.to_dataframe()
+        self.assertEqual(frame['price'].dtype.kind, 'f')
+        self.assertEqual(frame['date'].dtype.kind, 'M')
+        self.assert_(frame['price'].isnull()[0])
+        self.assertEqual(frame['price'][1], 2.5)
+
+
+    def test_import_from_dataframe(self):
+        frame = DataFrame({'a': [1.5, None], 'b': [u"x", None],
+                           'c': [datetime(2012, 3, 4), None]},
+                          columns=['a', 'b', 'c'])
+        table = import_from_dataframe(frame, u"Frame", styles={'b': u"ce1"})
+        self.assertEqual(table.get_values(),
+                [[u"a", u"b", u"c"],
+                 [dec('1.5'), u"x", datetime(2012, 3, 4)],
+                 [None, None, None]])
+        self.assertEqual(table.get_cell('B3').get_style(), u"ce1")
+        self.assertEqual(table.to_dataframe()['c'].dtype.kind, 'M')
+
+
+    def test_read_sheets(self):
+        sheets = self.document.read_sheets()
+        self.assertEqual(sheets.keys(), [u"Example1", u"Example2",
+                                         u"Example3"])
+        self.assertEqual(sheets[u"Example1"].shape, (3, 7))
+        self.assertEqual(sheets[u"Example2"].shape, (0, 0))
 
 
 
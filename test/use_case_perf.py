@@ -136,6 +136,24 @@ def test_random_set_value(D):
     print "-" * 50
     return table
 
+def test_random_set_value_batch(D):
+    print "Test random set_value in batch", D.lines, "rows", D.cols, "cols"
+    table = odf_create_table(u"Table")
+    cpt = 0
+    C = chrono()
+    with table.batch():
+        for line in D.rnd_line:
+            for col in range(D.cols):
+                table.set_value((col, line), cpt)
+                cpt += 1
+    C.delta()
+    print cpt, "values entered"
+    print "Size of table :", table.get_size()
+    if DEBUG:
+        print table.to_csv()
+    print "-" * 50
+    return table
+
 def test_random_get_value(D, table_ini):
     print "Test read random get_value", D.lines, "rows", D.cols, "cols"
     vals = []
@@ -183,6 +201,8 @@ if __name__=="__main__":
         ##cProfile.run('t = test_random_set_value(D)')
         t = test_random_set_value(D)
         test_random_get_value(D, t)
+        t = test_random_set_value_batch(D)
+        test_random_get_value(D, t)
         test_repeated(D)
     print "Total",
     total.delta()